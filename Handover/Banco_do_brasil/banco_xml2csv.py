@@ -24,9 +24,35 @@ and optional keyword arguments, in mutually exclusive groups, as follows:
     * -warn         Display warnings (default)
     * -no-warn      Supress warnings
 
+    * -report {sink}    Write a JSON run report, one line, to {sink}: - for the console (in place of the transaction
+                        counts printed otherwise) or the path of a file it is appended to (default no report)
+
+The run report holds the input file (or folder) & its size in bytes, the output file, the numbers of Tx blocks, NEWT &
+CANC rows & Tx blocks filtered out, the seconds spent parsing, mapping & writing and in total, the peak memory in MB
+(none on Windows) and the output rows per second.
+
+An XML file that can't be converted gets an INVALID_XML output file at {out_CSV_path} instead, the header row & one
+diagnostic row. The first six columns of that row hold the diagnostics, not the fields their headers name:
+
+    report_status       INVALID_XML
+    trans_ref_no        an excerpt of the XML, at most 400 bytes around the first parse error, or from the start of
+                        the Tx block at fault (from the start of the file if neither is known)
+    trans_id_code       the error message
+    entity_id_code      the line of the parse error or of the start of the Tx block at fault
+    cover_201465eu      the column of the parse error or of the start of the Tx block at fault
+    buy_acct_id_type    the number of the Tx block at fault
+
+and the other columns are empty. The XML file is streamed to find the parse error, so a bad file of any size is
+reported without reading it into memory.
+
 Any command line argument containing spaces, hyphens, or commas (and, depending on the OS,
 other reserved characters) must be quoted. If in doubt, quote the argument!
 
+The script can also be imported & run in-process (as by banco_wrapper.py), which saves starting a second
+interpreter for each file:
+
+    convert(in_XML_path, out_CSV_path)
+
 """
 
 import codecs
@@ -35,19 +61,24 @@ import csv
 import re
 import os
 import xml.etree.ElementTree as ElemTree
+from xml.parsers import expat
 import datetime
+import json
+import mmap
+import sys
 import time
 
 parser = argparse.ArgumentParser(description="UnaVista MIFID 2 XML to CSV column converter")
 parser.add_argument('-in-xml', help='pathname of input XML text file (single mode) or folder (multi mode)')
 parser.add_argument('-out-csv', help='path of output CSV text file (no name, this is auto set')
+parser.add_argument('-report', help='where to write a JSON run report, - for the console or a file to append to')
 
 parser_warn = parser.add_mutually_exclusive_group(required=False)
 parser_warn.add_argument('-warn', dest='warn', help='Display warnings (default)', action='store_true')
 parser_warn.add_argument('-no-warn', dest='warn', help='Suppress warnings', action='store_false')
 parser.set_defaults(warn=True)
 
-args = parser.parse_args()
+args = None  # options of the conversion, set by convert() from the command line or its arguments
 
 '''
 Background Info
@@ -2221,6 +2252,79 @@ def xml_findall(xml_ref, in_str):
     return xml_ref.findall(xml_namespace_tag + in_str)
 
 
+xml_precheck_bytes = 1 << 16  # bytes scanned at the start & at the end of an XML file by xml_precheck
+
+# the XML declaration, comments, processing instructions & a DOCTYPE before the root block, then the root block's name
+xml_precheck_root = re.compile(r'(?:\s|<\?.*?\?>|<!--.*?-->|<!DOCTYPE[^>]*>)*<(?=[\w.-])', re.S)
+# a start or end tag: whether it's an end tag, its name & the rest of it (quoted attribute values may hold a '>')
+xml_precheck_tag = re.compile(r'<(/?)([\w.:-]+)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>')
+# a namespace declaration: its prefix (None for the default namespace) & its URI, in double or single quotes
+xml_precheck_xmlns = re.compile(r'xmlns(?::([\w.-]+))?\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+# checks an XML file looks like a UnaVista file by scanning the raw bytes at its start & end, without building a tree.
+# Returns the namespace tag of the UVMiFIRDocument root block, the namespace tag of the first urn:iso... Document
+# block (None if there isn't one near the start, when it's looked for in the parsed tree instead) and an error message,
+# None if the file passes. The file is memory mapped, so only the pages scanned are read from disk.
+# NOTE: a file that passes can still fail to parse, only a file that can't be a UnaVista file is rejected here
+def xml_precheck(xml_file):
+
+    with open(xml_file, 'rb') as in_xml_file:
+        if os.fstat(in_xml_file.fileno()).st_size == 0:
+            return None, None, 'Unrecognised XML'
+        xml_bytes = mmap.mmap(in_xml_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with xml_bytes:
+        encoding = {codecs.BOM_UTF16_LE: 'utf-16-le', codecs.BOM_UTF16_BE: 'utf-16-be'}.get(xml_bytes[:2], 'utf-8')
+        xml_head = xml_bytes[:xml_precheck_bytes].decode(encoding, 'replace').lstrip('\ufeff')
+        xml_tail = xml_bytes[max(0, len(xml_bytes) - xml_precheck_bytes) & ~1:].decode(encoding, 'replace')
+
+    mm = xml_precheck_root.match(xml_head)
+    if mm is None:
+        return None, None, 'Unrecognised XML'
+
+    # walk the tags from the root block down, keeping the namespaces declared in each open block
+    namespaces = [{}]
+    root_name = None
+    uv_namespace_tag = None
+    iso_namespace_tag = None
+
+    for mm in xml_precheck_tag.finditer(xml_head, mm.end() - 1):
+        if mm[1]:
+            if len(namespaces) > 1:
+                namespaces.pop()
+            continue
+
+        block_namespaces = dict(namespaces[-1])
+        for ns in xml_precheck_xmlns.finditer(mm[3]):
+            block_namespaces[ns[1] or ''] = ns[2] if ns[2] is not None else ns[3]
+
+        prefix, _, local_name = mm[2].rpartition(':')
+        namespace_uri = block_namespaces.get(prefix)
+
+        if root_name is None:
+            if local_name != 'UVMiFIRDocument' or not namespace_uri:
+                return None, None, 'Unrecognised XML'
+            root_name = mm[2]
+            uv_namespace_tag = '{' + namespace_uri + '}'
+
+        elif local_name.startswith('Document') and namespace_uri and namespace_uri.startswith('urn:iso'):
+            iso_namespace_tag = '{' + namespace_uri + '}'
+            break
+
+        if not mm[3].endswith('/'):
+            namespaces.append(block_namespaces)
+
+    if root_name is None:
+        return None, None, 'Unrecognised XML'
+
+    # only white space, comments & processing instructions may follow the end of the root block
+    if re.search(r'</' + re.escape(root_name) + r'\s*>(?:\s|<!--.*?-->|<\?.*?\?>)*\Z', xml_tail, re.S) is None:
+        return uv_namespace_tag, iso_namespace_tag, 'XML file ends before its UVMiFIRDocument block does'
+
+    return uv_namespace_tag, iso_namespace_tag, None
+
+
 # filter out external manager trades
 def filter_ext_trades(xml_new):
     filter_lei = ['571474TGEMMWANRLN572', '5493006KMX1VFTPYPW14', 'HPFHU0OQ28E4N0NFVK49', 'MAES062Z21O4RZ2U7M96']
@@ -3438,14 +3542,110 @@ def get_output_row_cxl(xml_tx_cxl):
     return
 
 
-def output_bad_xml():
+xml_excerpt_bytes = 400  # most bytes of the XML file written to the INVALID_XML row
+xml_excerpt_chunk = 1 << 20  # bytes searched for line breaks at a time, finding the line of a parse error
+
+
+# raised by xml_diagnose's start block handler at the start of the Tx block it's looking for, with its (line, column)
+class XmlTxFound(Exception):
+    pass
+
+
+# streams an XML file up to its first parse error with expat (the parser under ElementTree, so the errors are the
+# same), building no blocks at all so memory use does not grow with the file size. Returns the parse error message &
+# its (line, column), or None & (None, None) if the file parses, and the number of the last FinInstrmRptgTxRpt/Tx
+# block started before the error (or in the file if it parses). With stop_tx_no it stops at the start of that Tx
+# block instead, returning None, the (line, column) the block starts at & stop_tx_no.
+def xml_diagnose(xml_file, stop_tx_no=None):
+
+    xml_parser = expat.ParserCreate(namespace_separator='}')
+    xml_path = []  # tags of the open blocks (without their namespace), from the root down to the current one
+    tx_no = 0
+
+    def start_block(tag, attributes):
+
+        nonlocal tx_no
+
+        tag = tag.rpartition('}')[2]
+        if tag == 'Tx' and len(xml_path) > 0 and xml_path[-1] == 'FinInstrmRptgTxRpt':
+            tx_no += 1
+            if tx_no == stop_tx_no:
+                raise XmlTxFound(xml_parser.CurrentLineNumber, xml_parser.CurrentColumnNumber)
+        xml_path.append(tag)
+
+    def end_block(tag):
+
+        xml_path.pop()
+
+    xml_parser.StartElementHandler = start_block
+    xml_parser.EndElementHandler = end_block
+
+    try:
+        with open(xml_file, 'rb') as in_xml_file:
+            xml_parser.ParseFile(in_xml_file)
+
+    except expat.ExpatError as error:
+        return str(error), (error.lineno, error.offset), tx_no
+    except XmlTxFound as tx_found:
+        return None, tx_found.args, tx_no
+
+    return None, (None, None), tx_no
+
+
+# returns up to xml_excerpt_bytes of an XML file from before bytes before column (from 0) of line (from 1), as a parse
+# error gives them (centred on them by default), or from the start of the file if line is None, with each run of white
+# space & line breaks made one space
+def xml_excerpt(xml_file, line=None, column=0, before=xml_excerpt_bytes // 2):
+
+    with open(xml_file, 'rb') as in_xml_file:
+        if os.fstat(in_xml_file.fileno()).st_size == 0:
+            return ''
+        xml_bytes = mmap.mmap(in_xml_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with xml_bytes:
+        offset = 0
+
+        if line is not None:
+            # skip whole chunks of lines before the line, then the lines left in the chunk it starts in
+            lines_left = line - 1
+            while lines_left > 0 and offset < len(xml_bytes):
+                chunk_lines = xml_bytes[offset:offset + xml_excerpt_chunk].count(b'\n')
+                if chunk_lines < lines_left:
+                    lines_left -= chunk_lines
+                    offset += xml_excerpt_chunk
+                    continue
+
+                for _ in range(lines_left):
+                    offset = xml_bytes.find(b'\n', offset) + 1
+                lines_left = 0
+
+            offset = max(0, min(offset + column, len(xml_bytes)) - before)
+
+        xml_excerpt_text = xml_bytes[offset:offset + xml_excerpt_bytes].decode('utf-8', 'replace')
+
+    return ' '.join(xml_excerpt_text.split())
+
+
+# writes the INVALID_XML output file for an XML file that can't be converted, with the header row & one diagnostic
+# row (its layout is in the docstring at the top): INVALID_XML, an excerpt of the XML around its first parse error (or
+# from the start of the Tx block at fault, or of the file), the error message, the line & column of the parse error or
+# of the Tx block and the number of the Tx block at fault. error_tx_no is the number of the Tx block at fault if it's
+# known, otherwise the file is streamed to find its first parse error, so a bad file never has to fit into memory.
+# Returns the error message written, error with the parse error's message added.
+def output_bad_xml(xml_file, error, error_tx_no=None):
 
     global output_csv_file
     global out_row
 
-    # Slurp in XML file
-    with codecs.open(args.in_xml, 'r', 'utf-8') as in_xml_file:
-        xml_single_line = ''.join(line.strip() for line in in_xml_file)
+    if error_tx_no is None:
+        parse_error, (line, column), error_tx_no = xml_diagnose(xml_file)
+        if parse_error is not None:
+            error += ': ' + parse_error
+        excerpt = xml_excerpt(xml_file, line, column or 0)
+    else:
+        # the file parses as far as the Tx block at fault, so the excerpt starts where that block does
+        parse_error, (line, column), _ = xml_diagnose(xml_file, error_tx_no)
+        excerpt = xml_excerpt(xml_file, line, column or 0, 0 if parse_error is None else xml_excerpt_bytes // 2)
 
     # Write output CSV file
     if output_csv_file is not None:
@@ -3459,96 +3659,143 @@ def output_bad_xml():
 
     output_csv_rows.writerow(out_row)
 
+    out_row = [''] * number_of_columns
     out_row[0] = 'INVALID_XML'
-    out_row[1] = xml_single_line
+    out_row[1] = excerpt
+    out_row[2] = error
+    out_row[3] = '' if line is None else str(line)
+    out_row[4] = '' if column is None else str(column)
+    out_row[5] = str(error_tx_no) if error_tx_no else ''
 
     output_csv_rows.writerow(out_row)
     output_csv_file.close()
 
+    return error
+
 
 # run code specific to the client - read from the configuration table input
 client_mode = 'banco do brasil'
-mode = 'single'
-counter = 0
-filter_counter = 0
-
-# Create output file
-output_csv_file = codecs.open(args.out_csv, 'w', 'utf-8')
-output_csv_rows = csv.writer(output_csv_file)
-out_row = [''] * number_of_columns
-get_output_header_row()
-output_csv_rows.writerow(out_row)
-
-if mode == 'single':
-    #  Open & parse a single XML file
-    xml_file = args.in_xml
-    xml = ElemTree.parse(xml_file).getroot()
-    xml_tag = re.match(r'({.*})UVMiFIRDocument$', xml.tag)
-
-    if xml_tag is None:
-        print('Unrecognised XML!')
-        output_bad_xml()
-        exit(0)
-
-    xml_namespace_tag = xml_tag[1]
-    tx_no = 0
-    xml_doc_outer = xml_find(xml, 'Document')  # outer document block
 
-    for xml_node in xml_doc_outer.iter():
-        mm = re.match(r'({urn:iso.*})Document', xml_node.tag)
-        if mm is not None:
-            xml_namespace_tag = mm[1]
-            break
 
-    xml_doc_outer = xml_find(xml_doc_outer, 'Document')  # inner document block
-    xml_rpt = xml_find(xml_doc_outer, 'FinInstrmRptgTxRpt')
+# Run report (-report), the seconds spent parsing, mapping & writing & when the run started, set by convert
+run_times = {'parse': 0.0, 'map': 0.0, 'write': 0.0}
+run_start = (None, 0.0)  # (date & time, time.perf_counter())
+canc_counter = 0
 
-    for xml_rpt_tx in xml_findall(xml_rpt, 'Tx'):
 
-        tx_no += 1
-        out_row = [''] * number_of_columns
-        xml_rpt_tx_new = xml_find(xml_rpt_tx, 'New')
+# returns the peak memory of this process in MB, or None where it isn't known (Windows)
+def get_peak_memory():
 
-        if xml_rpt_tx_new is not None:
-            get_output_row_new(xml_rpt_tx_new, xml_file)
-        else:
-            xml_rpt_tx_cxl = xml_find(xml_rpt_tx, 'Cxl')
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # ru_maxrss is in KB, but in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
 
-            if xml_rpt_tx_cxl is not None:
-                get_output_row_cxl(xml_rpt_tx_cxl)
-            else:
-                print('TX block number ' + str(tx_no) + ' has no NEW or CXL blocks!')
-                output_bad_xml()
-                exit(0)
 
-        output_csv_rows.writerow(out_row)
+# writes the run report of the conversion, as a line of JSON, to the console or appended to the file args.report,
+# with the error message if the input couldn't be converted
+def output_run_report(output_file, counter, filter_counter, error=None):
 
-# run multiple xml files from a folder
-elif mode == 'multi':
-    #  Open & parse input XML files
-    xml_files = [os.path.join(args.in_xml, f) for f in os.listdir(args.in_xml) if os.path.isfile(os.path.join(args.in_xml, f))]
+    if os.path.isdir(args.in_xml):
+        input_bytes = sum(os.path.getsize(os.path.join(args.in_xml, f)) for f in os.listdir(args.in_xml)
+                          if os.path.isfile(os.path.join(args.in_xml, f)))
+    else:
+        input_bytes = os.path.getsize(args.in_xml)
 
-    for xml_file in xml_files:
-        xml = ElemTree.parse(xml_file).getroot()
-        xml_tag = re.match(r'({.*})UVMiFIRDocument$', xml.tag)
+    seconds = time.perf_counter() - run_start[1]
 
-        if xml_tag is None:
-            print('Unrecognised XML')
-            output_bad_xml()
-            exit(0)
+    report = json.dumps({
+        'tool': 'banco_xml2csv', 'client': client_mode, 'started': run_start[0], 'input': args.in_xml,
+        'input_bytes': input_bytes, 'output': output_file, 'tx': counter + filter_counter,
+        'newt': counter - canc_counter, 'canc': canc_counter, 'filtered': filter_counter,
+        'parse_seconds': run_times['parse'], 'map_seconds': run_times['map'], 'write_seconds': run_times['write'],
+        'seconds': seconds, 'peak_memory_mb': get_peak_memory(), 'rows_per_sec': counter / seconds if seconds else None,
+        'error': error})
 
-        xml_namespace_tag = xml_tag[1]
+    if args.report == '-':
+        print(report)
+    else:
+        with open(args.report, 'a', encoding='utf-8') as report_file:
+            report_file.write(report + '\n')
+
+
+# converts in_xml, an XML file or a folder of them, into the output file out_csv & returns the path of the file
+# written. options are the command line options by name (e.g. warn=False), the rest take their defaults.
+def convert(in_xml, out_csv, **options):
+
+    global args
+    global out_row
+    global output_csv_file
+    global xml_namespace_tag
+    global run_start
+    global canc_counter
+
+    # the options are put back into a command line, so they're checked just as the command line options are
+    argv = []
+    for name, value in dict(options, in_xml=in_xml, out_csv=out_csv).items():
+        if isinstance(value, bool):
+            argv.append(('-' if value else '-no-') + name)
+        elif value is not None:
+            argv.append('-' + name.replace('_', '-') + '=' + str(value))
+
+    run_start = (datetime.datetime.now().isoformat(timespec='seconds'), time.perf_counter())
+    run_times.update(parse=0.0, map=0.0, write=0.0)
+
+    args = parser.parse_args(argv)
+
+    mode = 'single'
+    counter = 0
+    filter_counter = 0
+    canc_counter = 0
+
+    # Create output file
+    output_csv_file = codecs.open(args.out_csv, 'w', 'utf-8')
+    output_csv_rows = csv.writer(output_csv_file)
+    out_row = [''] * number_of_columns
+    get_output_header_row()
+    output_csv_rows.writerow(out_row)
+
+    if mode == 'single':
+        #  Open & parse a single XML file
+        xml_file = args.in_xml
+        start = time.perf_counter()
+        uv_namespace_tag, iso_namespace_tag, error = xml_precheck(xml_file)  # before parsing any of the file
+
+        if error is None:
+            try:
+                xml = ElemTree.parse(xml_file).getroot()
+            except ElemTree.ParseError:
+                error = 'Invalid XML'
+
+        run_times['parse'] += time.perf_counter() - start
+
+        if error is not None:
+            error = output_bad_xml(xml_file, error)
+            print(error + '!')
+            if args.report is not None:
+                output_run_report(args.out_csv, counter, filter_counter, error)
+            return args.out_csv
+
+        xml_namespace_tag = uv_namespace_tag
         tx_no = 0
         xml_doc_outer = xml_find(xml, 'Document')  # outer document block
 
-        for xml_node in xml_doc_outer.iter():
-            mm = re.match(r'({urn:iso.*})Document', xml_node.tag)
-            if mm is not None:
-                xml_namespace_tag = mm[1]
-                break
+        if iso_namespace_tag is not None:
+            xml_namespace_tag = iso_namespace_tag
+        else:
+            for xml_node in xml_doc_outer.iter():
+                mm = re.match(r'({urn:iso.*})Document', xml_node.tag)
+                if mm is not None:
+                    xml_namespace_tag = mm[1]
+                    break
 
         xml_doc_outer = xml_find(xml_doc_outer, 'Document')  # inner document block
         xml_rpt = xml_find(xml_doc_outer, 'FinInstrmRptgTxRpt')
+        start = time.perf_counter()
+        write_seconds = run_times['write']
 
         for xml_rpt_tx in xml_findall(xml_rpt, 'Tx'):
 
@@ -3557,30 +3804,117 @@ elif mode == 'multi':
             xml_rpt_tx_new = xml_find(xml_rpt_tx, 'New')
 
             if xml_rpt_tx_new is not None:
-                if filter_ext_trades(xml_rpt_tx_new):
-                    filter_counter += 1
-                    continue
                 get_output_row_new(xml_rpt_tx_new, xml_file)
-
             else:
                 xml_rpt_tx_cxl = xml_find(xml_rpt_tx, 'Cxl')
 
                 if xml_rpt_tx_cxl is not None:
                     get_output_row_cxl(xml_rpt_tx_cxl)
+                    canc_counter += 1
                 else:
-                    print('TX block number ' + str(tx_no) + ' has no NEW or CXL blocks')
-                    output_bad_xml()
-                    exit(0)
+                    error = output_bad_xml(xml_file, 'TX block number ' + str(tx_no) + ' has no NEW or CXL blocks', tx_no)
+                    print(error + '!')
+                    if args.report is not None:
+                        output_run_report(args.out_csv, counter, filter_counter, error)
+                    return args.out_csv
 
+            write_start = time.perf_counter()
             output_csv_rows.writerow(out_row)
+            run_times['write'] += time.perf_counter() - write_start
             counter += 1
-    print('Client: ', client_mode)
-    print('Mode: ', mode)
-    print('Number of transactions: ', counter)
-    print('Number of transactions filtered out: ', filter_counter)
+
+        run_times['map'] += time.perf_counter() - start - (run_times['write'] - write_seconds)
+
+    # run multiple xml files from a folder
+    elif mode == 'multi':
+        #  Open & parse input XML files
+        xml_files = [os.path.join(args.in_xml, f) for f in os.listdir(args.in_xml) if os.path.isfile(os.path.join(args.in_xml, f))]
+
+        for xml_file in xml_files:
+            start = time.perf_counter()
+            uv_namespace_tag, iso_namespace_tag, error = xml_precheck(xml_file)  # before parsing any of the file
+
+            if error is None:
+                try:
+                    xml = ElemTree.parse(xml_file).getroot()
+                except ElemTree.ParseError:
+                    error = 'Invalid XML'
+
+            run_times['parse'] += time.perf_counter() - start
+
+            if error is not None:
+                error = output_bad_xml(xml_file, error)
+                print(xml_file + ': ' + error)
+                if args.report is not None:
+                    output_run_report(args.out_csv, counter, filter_counter, error)
+                return args.out_csv
+
+            xml_namespace_tag = uv_namespace_tag
+            tx_no = 0
+            xml_doc_outer = xml_find(xml, 'Document')  # outer document block
+
+            if iso_namespace_tag is not None:
+                xml_namespace_tag = iso_namespace_tag
+            else:
+                for xml_node in xml_doc_outer.iter():
+                    mm = re.match(r'({urn:iso.*})Document', xml_node.tag)
+                    if mm is not None:
+                        xml_namespace_tag = mm[1]
+                        break
+
+            xml_doc_outer = xml_find(xml_doc_outer, 'Document')  # inner document block
+            xml_rpt = xml_find(xml_doc_outer, 'FinInstrmRptgTxRpt')
+            start = time.perf_counter()
+            write_seconds = run_times['write']
+
+            for xml_rpt_tx in xml_findall(xml_rpt, 'Tx'):
+
+                tx_no += 1
+                out_row = [''] * number_of_columns
+                xml_rpt_tx_new = xml_find(xml_rpt_tx, 'New')
+
+                if xml_rpt_tx_new is not None:
+                    if filter_ext_trades(xml_rpt_tx_new):
+                        filter_counter += 1
+                        continue
+                    get_output_row_new(xml_rpt_tx_new, xml_file)
+
+                else:
+                    xml_rpt_tx_cxl = xml_find(xml_rpt_tx, 'Cxl')
+
+                    if xml_rpt_tx_cxl is not None:
+                        get_output_row_cxl(xml_rpt_tx_cxl)
+                        canc_counter += 1
+                    else:
+                        error = output_bad_xml(xml_file, 'TX block number ' + str(tx_no) + ' has no NEW or CXL blocks', tx_no)
+                        print(xml_file + ': ' + error)
+                        if args.report is not None:
+                            output_run_report(args.out_csv, counter, filter_counter, error)
+                        return args.out_csv
+
+                write_start = time.perf_counter()
+                output_csv_rows.writerow(out_row)
+                run_times['write'] += time.perf_counter() - write_start
+                counter += 1
+
+            run_times['map'] += time.perf_counter() - start - (run_times['write'] - write_seconds)
+
+        if args.report is None:
+            print('Client: ', client_mode)
+            print('Mode: ', mode)
+            print('Number of transactions: ', counter)
+            print('Number of transactions filtered out: ', filter_counter)
+
+    output_csv_file.close()
+
+    if args.report is not None:
+        output_run_report(args.out_csv, counter, filter_counter)
+
+    return args.out_csv
 
 
-output_csv_file.close()
+if __name__ == '__main__':
+    convert(**vars(parser.parse_args()))
 
 
 
@@ -0,0 +1,228 @@
+"""
+converter_benchmark.py
+
+Benchmark of the five UnaVista MIFID 2 XML to CSV converters, TanitaDocuments/unavista_mifid2_xml2csv.py,
+NNIP/xml2csv_convert.py, Banco_do_brasil/banco_xml2csv.py and the Banco_do_brasil 020118 & 221217 snapshots, with
+a JSON history of results so that a change which slows a converter down is caught before it is deployed.
+
+For each -tx size & -shapes mix a synthetic file is written by generate_fininstrmrptgtxrpt.py (wrapped in a
+UVMiFIRDocument for the converters that read one, an ISO 20022 Document alone in a folder for the 020118 & 221217
+snapshots, which read every file in a folder). Each converter is run on it in a process of its own, as it is run in
+production, -repeat times and the best of each measure is recorded:
+
+    * Tx/sec        Tx blocks in the file over the time the converter process took
+    * peak RSS      The largest resident memory of the converter process (not on Windows)
+    * first row     Time until the first row after the header reached the output CSV file, which includes the time
+                    rows spend in the converter's output buffer
+
+The results are appended to the -history JSON file. A converter whose Tx/sec has fallen by more than -tolerance
+since the last result for the same file is reported as a REGRESSION and the script exits with status 1.
+
+Command line usage is as follows:
+
+    python converter_benchmark.py [ optional arguments ... ]
+
+with optional keyword arguments as follows:
+
+    * -tx {n,n}         Comma separated sizes of the synthetic files in Tx blocks (default 1000,100000)
+    * -shapes {s,s}     Comma separated mixes of Tx blocks, of mixed, swaps, cancels and persons (default mixed)
+    * -converters {c,c} Comma separated converters to run, of tanita, nnip, banco, banco_020118 and banco_221217
+                        (default all)
+    * -repeat {n}       Number of timed runs of each converter (default 3)
+    * -seed {n}         Random seed of the synthetic files (default 0)
+    * -history {path}   JSON history file (default converter_benchmark_history.json beside this script)
+    * -label {text}     Label recorded with the results, e.g. a commit or version (default none)
+    * -tolerance {r}    Fall in Tx/sec reported as a regression (default 0.1, i.e. 10%)
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from synthetic_xml import generate_xml, get_shape_names
+
+parser = argparse.ArgumentParser(description="Benchmark of the UnaVista MIFID 2 XML to CSV converters")
+parser.add_argument('-tx', default='1000,100000', help='comma separated Tx block counts (default 1000,100000)')
+parser.add_argument('-shapes', default='mixed', help='comma separated Tx block mixes (default mixed)')
+parser.add_argument('-converters', default='tanita,nnip,banco,banco_020118,banco_221217',
+                    help='comma separated converters to run (default all)')
+parser.add_argument('-repeat', type=int, default=3, help='number of timed runs of each converter (default 3)')
+parser.add_argument('-seed', type=int, default=0, help='random seed of the synthetic files (default 0)')
+parser.add_argument('-history', help='pathname of the JSON history file')
+parser.add_argument('-label', default='', help='label recorded with the results (default none)')
+parser.add_argument('-tolerance', type=float, default=0.1, help='fall in Tx/sec reported as a regression (default 0.1)')
+args = parser.parse_args()
+
+handover_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+if args.history is None:
+    args.history = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'converter_benchmark_history.json')
+
+# script, whether it reads a UVMiFIRDocument file (True) or a folder of ISO 20022 Documents (False) & whether -out-csv
+# is a folder (True) or a file (False), for each converter
+converters = {
+    'tanita': ('TanitaDocuments/unavista_mifid2_xml2csv.py', True, False),
+    'nnip': ('NNIP/xml2csv_convert.py', True, False),
+    'banco': ('Banco_do_brasil/banco_xml2csv.py', True, False),
+    'banco_020118': ('Banco_do_brasil/020118/unavista_mifid2_xml2csv.py', False, False),
+    'banco_221217': ('Banco_do_brasil/221217/unavista_mifid2_xml2csv.py', False, True),
+}
+
+first_row_poll = 0.002  # seconds between looks at the output folder for the first row
+
+
+# returns True once a CSV file in out_dir holds a row after its header
+def has_first_row(out_dir):
+
+    for csv_file in glob.glob(os.path.join(out_dir, '*.csv')):
+        with open(csv_file, 'rb') as out_csv_file:
+            if out_csv_file.read(1 << 16).count(b'\n') > 1:
+                return True
+
+    return False
+
+
+# runs a converter once on xml_file, returning the time taken in seconds, the peak RSS in MB (None if unknown) & the
+# time until the first row was output in seconds (None if it has none)
+def run_converter(name, xml_file, out_dir):
+
+    script, wrapper, out_is_dir = converters[name]
+
+    for csv_file in glob.glob(os.path.join(out_dir, '*.csv')):
+        os.remove(csv_file)
+
+    in_xml = xml_file if wrapper else os.path.dirname(xml_file)
+    out_csv = out_dir if out_is_dir else os.path.join(out_dir, 'out.csv')
+    first_row_time = None
+    peak_rss = None
+
+    error_file = open(os.path.join(out_dir, 'stderr.txt'), 'w+', encoding='utf-8', errors='replace')
+
+    start_time = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(handover_dir, script), '-in-xml', in_xml,
+                                '-out-csv', out_csv, '-no-warn'], stdout=subprocess.DEVNULL, stderr=error_file)
+
+    while True:
+        if first_row_time is None and has_first_row(out_dir):
+            first_row_time = time.perf_counter() - start_time
+
+        if hasattr(os, 'wait4'):
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid != 0:
+                process.returncode = os.waitstatus_to_exitcode(status)
+                # ru_maxrss is in KB, but in bytes on macOS
+                peak_rss = usage.ru_maxrss / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+                break
+        elif process.poll() is not None:
+            break
+
+        time.sleep(first_row_poll)
+
+    run_time = time.perf_counter() - start_time
+
+    with error_file:
+        error_file.seek(0)
+        error_lines = error_file.read().splitlines()
+
+    if process.returncode != 0:
+        raise RuntimeError('exited with status ' + str(process.returncode) +
+                           (': ' + error_lines[-1] if error_lines else ''))
+
+    if first_row_time is None and has_first_row(out_dir):
+        first_row_time = run_time
+
+    return run_time, peak_rss, first_row_time
+
+
+# returns the best of repeated measures, ignoring the unknown ones
+def best(values):
+
+    values = [value for value in values if value is not None]
+    return min(values) if values else None
+
+
+def load_history():
+
+    if not os.path.exists(args.history):
+        return []
+
+    with open(args.history, 'r', encoding='utf-8') as history_file:
+        return json.load(history_file)
+
+
+# returns the last Tx/sec recorded for a converter on a file of the same size & shape, or None
+def last_tx_per_sec(history, result):
+
+    for run in reversed(history):
+        for old_result in run['results']:
+            if all(old_result[key] == result[key] for key in ('converter', 'tx', 'shape', 'seed')):
+                if old_result['tx_per_sec'] is not None:
+                    return old_result['tx_per_sec']
+
+    return None
+
+
+if __name__ == '__main__':
+    tx_counts = [int(tx_count) for tx_count in args.tx.split(',')]
+    shape_names = get_shape_names(parser, args.shapes)
+    converter_names = args.converters.split(',')
+
+    for name in converter_names:
+        if name not in converters:
+            parser.error('unknown converter ' + name + ', use one of ' + ', '.join(converters))
+
+    history = load_history()
+    results = []
+    regressions = 0
+
+    print('{0:<14}{1:>10}  {2:<9}{3:>12}{4:>12}{5:>14}'.format('Converter', 'Tx', 'Shape', 'Tx/sec', 'Peak RSS',
+                                                               'First row'))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_dir = os.path.join(temp_dir, 'out')
+        os.mkdir(out_dir)
+
+        for tx_count in tx_counts:
+            for shape in shape_names:
+                for name in converter_names:
+                    xml_file = generate_xml(temp_dir, tx_count, shape, args.seed, converters[name][1])
+                    result = {'converter': name, 'tx': tx_count, 'shape': shape, 'seed': args.seed,
+                              'tx_per_sec': None, 'peak_rss_mb': None, 'first_row_sec': None, 'error': None}
+
+                    try:
+                        runs = [run_converter(name, xml_file, out_dir) for _ in range(args.repeat)]
+                    except RuntimeError as error:
+                        result['error'] = str(error)
+                        print('{0:<14}{1:>10}  {2:<9}  {3}'.format(name, tx_count, shape, result['error']))
+                        results.append(result)
+                        continue
+
+                    result['tx_per_sec'] = tx_count / best(run[0] for run in runs)
+                    result['peak_rss_mb'] = best(run[1] for run in runs)
+                    result['first_row_sec'] = best(run[2] for run in runs)
+                    results.append(result)
+
+                    last = last_tx_per_sec(history, result)
+                    regression = last is not None and result['tx_per_sec'] < last * (1 - args.tolerance)
+                    regressions += regression
+
+                    print('{0:<14}{1:>10}  {2:<9}{3:>12.0f}{4:>12}{5:>14}{6}'.format(
+                        name, tx_count, shape, result['tx_per_sec'],
+                        '' if result['peak_rss_mb'] is None else '{0:.1f} MB'.format(result['peak_rss_mb']),
+                        '' if result['first_row_sec'] is None else '{0:.3f} s'.format(result['first_row_sec']),
+                        '  REGRESSION (was {0:.0f})'.format(last) if regression else ''))
+
+    history.append({'date': datetime.datetime.now().isoformat(timespec='seconds'), 'label': args.label,
+                    'python': sys.version.split()[0], 'results': results})
+
+    with open(args.history, 'w', encoding='utf-8') as history_file:
+        json.dump(history, history_file, indent=1)
+
+    if regressions:
+        print(regressions, 'regression(s) of more than {0:.0%} in Tx/sec'.format(args.tolerance))
+        sys.exit(1)
@@ -0,0 +1,333 @@
+"""
+generate_fininstrmrptgtxrpt.py
+
+Writes a synthetic UnaVista MIFID 2 XML file (a UVMiFIRDocument wrapping an ISO 20022 FinInstrmRptgTxRpt) for load
+and benchmark testing of the XML to CSV converters (TanitaDocuments, NNIP & Banco_do_brasil).
+
+Command line usage is as follows:
+
+    python generate_fininstrmrptgtxrpt.py -out-xml {out_XML_path} [ optional arguments ... ]
+
+with optional keyword arguments as follows:
+
+    * -tx {n}               Number of Tx blocks (default 1000), e.g. 1000, 100000 or 10000000
+    * -seed {n}             Random seed (default 0)
+    * -workers {n}          Number of worker processes generating Tx blocks (default 1)
+
+    * -canc-ratio {r}       Share of Tx blocks that are cancellations (Cxl) rather than new (New) (default 0.1)
+    * -prsn-ratio {r}       Share of buyer & seller accounts identified by a person (Prsn), the rest mostly by LEI,
+                            some by MIC or INTC (default 0.5)
+    * -max-accts {n}        Maximum number of AcctOwnr & DcsnMakr blocks per buyer & seller (default 3)
+    * -swap-ratio {r}       Share of New blocks that are swaps, with SwpIn & SwpOut legs of single instruments,
+                            indices & baskets (default 0.2)
+    * -nopric-ratio {r}     Share of prices that are pending (NoPric) rather than a Pric (default 0.1)
+
+    * -prefix {p}           Namespace prefix of the ISO 20022 blocks, e.g. iso (default none, the default namespace)
+    * -no-wrapper           Write the ISO 20022 Document alone, without the UVMiFIRDocument wrapper, as read by the
+                            Banco_do_brasil 020118 & 221217 converters
+
+The same seed & options always write the same file, byte for byte, whatever the number of workers. About 5% of LEIs are those the converters'
+external manager filter looks for, and about 5% of files' Tx blocks are filtered by it in multi mode.
+"""
+
+import argparse
+import concurrent.futures
+import random
+
+parser = argparse.ArgumentParser(description="Synthetic UnaVista MIFID 2 XML generator")
+parser.add_argument('-out-xml', help='pathname of output XML text file')
+parser.add_argument('-tx', type=int, default=1000, help='number of Tx blocks to write (default 1000)')
+parser.add_argument('-seed', type=int, default=0, help='random seed (default 0)')
+parser.add_argument('-workers', type=int, default=1, help='number of worker processes (default 1)')
+parser.add_argument('-canc-ratio', type=float, default=0.1, help='share of Tx blocks that are CANC (default 0.1)')
+parser.add_argument('-prsn-ratio', type=float, default=0.5, help='share of buyers/sellers that are persons (default 0.5)')
+parser.add_argument('-max-accts', type=int, default=3, help='maximum AcctOwnr/DcsnMakr blocks per party (default 3)')
+parser.add_argument('-swap-ratio', type=float, default=0.2, help='share of NEWT Tx that are swaps (default 0.2)')
+parser.add_argument('-nopric-ratio', type=float, default=0.1, help='share of NEWT Tx with NoPric (default 0.1)')
+parser.add_argument('-prefix', default='', help='namespace prefix for the ISO 20022 block, e.g. "iso" (default none)')
+parser.add_argument('-no-wrapper', dest='wrapper', action='store_false',
+                    help='write the ISO 20022 Document without the UVMiFIRDocument wrapper')
+
+args = parser.parse_args()
+
+uv_namespace = 'urn:unavista:mifir:uvmifirdocument'
+iso_namespace = 'urn:iso:std:iso:20022:tech:xsd:auth.016.001.01'
+
+filter_lei = ['571474TGEMMWANRLN572', '5493006KMX1VFTPYPW14', 'HPFHU0OQ28E4N0NFVK49', 'MAES062Z21O4RZ2U7M96']
+countries = ['GB', 'DE', 'FR', 'NL', 'LU', 'CH', 'US']
+currencies = ['GBP', 'EUR', 'USD', 'CHF']
+venues = ['XLON', 'XOFF', 'XXXX', 'SINT', 'XETR']
+forenames = ['JOHN', 'MARY', 'ANNA', 'PETER', 'SAMAN', 'JAN']
+surnames = ['SMITH', 'JONES', 'DE VRIES', 'MULLER', 'DUBOIS']
+classifications = ['ESVUFR', 'DBFTFB', 'SRCCSP', 'OCASPS', 'JFXXXX', 'IFXXXX', 'FFICSX']
+
+chunk_tx = 10000  # Tx blocks generated from each random seed, one chunk per worker at a time
+
+rnd = random.Random(args.seed)
+p = args.prefix + ':' if args.prefix else ''
+
+# NOTE: LEIs & ISINs are drawn from pools made up front (as real files repeat their counterparties & instruments),
+# which is much faster than making up 20 random characters for every one
+lei_pool = [''.join(rnd.choices('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=20)) for _ in range(5000)]
+isin_pool = [rnd.choice(['GB', 'US', 'DE', 'XS']) + ''.join(rnd.choices('0123456789', k=10)) for _ in range(5000)]
+
+
+def lei():
+
+    if rnd.random() < 0.05:
+        return rnd.choice(filter_lei)
+
+    return rnd.choice(lei_pool)
+
+
+def isin():
+
+    return rnd.choice(isin_pool)
+
+
+def amount():
+
+    return '{0:.2f}'.format(rnd.uniform(1, 100000))
+
+
+# returns an XML element, with the ISO 20022 namespace prefix if there is one
+def tag(name, content, attrs=''):
+
+    return '<' + p + name + attrs + '>' + content + '</' + p + name + '>'
+
+
+def schme_nm():
+
+    if rnd.random() < 0.8:
+        return tag('SchmeNm', tag('Cd', rnd.choice(['NIDN', 'CCPT', 'CONCAT'])))
+    return tag('SchmeNm', tag('Prtry', 'CUSTOM'))
+
+
+# returns a Prsn block, with the names & birth date of an account owner or decision maker (full) or the country of
+# branch of an investment decision or executing person
+def prsn(full=True):
+
+    content = ''
+    if full:
+        content += tag('FrstNm', rnd.choice(forenames)) + tag('Nm', rnd.choice(surnames))
+        content += tag('BirthDt', '19{0:02d}-0{1}-1{2}'.format(rnd.randint(40, 99), rnd.randint(1, 9), rnd.randint(0, 9)))
+    else:
+        content += tag('CtryOfBrnch', rnd.choice(countries))
+    content += tag('Othr', tag('Id', rnd.choice(countries) + str(rnd.randint(10000000, 99999999))) + schme_nm())
+    return tag('Prsn', content)
+
+
+# returns an AcctOwnr block identified by a person, an LEI, a MIC or INTC in the ratio of -prsn-ratio
+def acct_ownr():
+
+    roll = rnd.random()
+    if roll < args.prsn_ratio:
+        acct_id = prsn()
+    elif roll < args.prsn_ratio + (1 - args.prsn_ratio) * 0.8:
+        acct_id = tag('LEI', lei())
+    elif roll < args.prsn_ratio + (1 - args.prsn_ratio) * 0.9:
+        acct_id = tag('MIC', rnd.choice(venues))
+    else:
+        acct_id = tag('Intl', 'INTC')
+    return tag('AcctOwnr', tag('Id', acct_id) + tag('CtryOfBrnch', rnd.choice(countries)))
+
+
+def dcsn_makr():
+
+    if rnd.random() < 0.5:
+        return tag('DcsnMakr', tag('LEI', lei()))
+    return tag('DcsnMakr', prsn())
+
+
+# returns a Buyr or Sellr block of up to -max-accts AcctOwnr blocks, some with up to -max-accts DcsnMakr blocks
+def party(name):
+
+    content = ''.join(acct_ownr() for _ in range(rnd.randint(1, args.max_accts)))
+    if rnd.random() < 0.4:
+        content += ''.join(dcsn_makr() for _ in range(rnd.randint(1, args.max_accts)))
+    return tag(name, content)
+
+
+# returns a price, pending (NoPric) in the ratio of -nopric-ratio, else a monetary value, percentage, yield or basis
+# points Pric
+def pric_block():
+
+    if rnd.random() < args.nopric_ratio:
+        return tag('NoPric', tag('Pdg', rnd.choice(['PNDG', 'NOAP'])) + tag('Ccy', rnd.choice(currencies)))
+    roll = rnd.random()
+    if roll < 0.7:
+        content = tag('MntryVal', tag('Amt', amount(), ' Ccy="' + rnd.choice(currencies) + '"') +
+                      (tag('Sgn', rnd.choice(['true', 'false'])) if rnd.random() < 0.3 else ''))
+    elif roll < 0.8:
+        content = tag('Pctg', amount())
+    elif roll < 0.9:
+        content = tag('Yld', amount())
+    else:
+        content = tag('BsisPts', str(rnd.randint(1, 500)))
+    return tag('Pric', content)
+
+
+# returns a SwpIn or SwpOut leg, a single instrument, an index, a basket of instruments or a basket index
+def swap_leg(name):
+
+    roll = rnd.random()
+    if roll < 0.25:
+        content = tag('Sngl', tag('ISIN', isin()))
+    elif roll < 0.5:
+        content = tag('Sngl', tag('Indx', tag('ISIN', isin()) + tag('Nm', tag('RefRate', tag('Indx', 'EONA')) +
+                                                                  tag('Term', tag('Unit', 'MNTH') + tag('Val', '3')))))
+    elif roll < 0.75:
+        content = tag('Bskt', ''.join(tag('ISIN', isin()) for _ in range(rnd.randint(1, 4))))
+    else:
+        content = tag('Bskt', tag('Indx', tag('ISIN', isin()) + tag('Nm', tag('Ref', tag('Nm', 'EURIBOR')) +
+                                                                  tag('Term', tag('Unit', 'YEAR') + tag('Val', '1')))))
+    return tag(name, content)
+
+
+# returns a FinInstrm block, an ISIN only or the instrument's attributes, with derivative attributes for a swap
+def fin_instrm(swap):
+
+    if not swap and rnd.random() < 0.5:
+        return tag('FinInstrm', tag('Id', isin()))
+
+    attrs = tag('FinInstrmGnlAttrbts', tag('Id', isin()) + tag('FullNm', 'SYNTHETIC INSTRUMENT ' + str(rnd.randint(1, 999))) +
+                tag('ClssfctnTp', rnd.choice(classifications)) + tag('NtnlCcy', rnd.choice(currencies)))
+    if rnd.random() < 0.3:
+        attrs += tag('DebtInstrmAttrbts', tag('MtrtyDt', '2030-01-01'))
+
+    deriv = ''
+    if swap or rnd.random() < 0.5:
+        deriv += tag('XpryDt', '2028-12-31') + tag('PricMltplr', str(rnd.choice([1, 10, 100])))
+        if swap:
+            deriv += tag('UndrlygInstrm', tag('Swp', swap_leg('SwpIn') + swap_leg('SwpOut')))
+        else:
+            deriv += tag('UndrlygInstrm', tag('Othr', tag('Sngl', tag('ISIN', isin()))))
+        if rnd.random() < 0.5:
+            deriv += tag('OptnTp', rnd.choice(['CALL', 'PUTO']))
+            deriv += tag('StrkPric', pric_block())
+            deriv += tag('OptnExrcStyle', rnd.choice(['EURO', 'AMER']))
+        if rnd.random() < 0.3:
+            deriv += tag('MtrtyDt', '2029-06-30')
+        deriv += tag('DlvryTp', rnd.choice(['PHYS', 'CASH']))
+        if rnd.random() < 0.3:
+            deriv += tag('AsstClssSpcfcAttrbts', tag(rnd.choice(['Intrst', 'FX']), tag('OthrNtnlCcy', rnd.choice(currencies))))
+        attrs += tag('DerivInstrmAttrbts', deriv)
+
+    return tag('FinInstrm', tag('Othr', attrs))
+
+
+# returns an InvstmtDcsnPrsn or ExctgPrsn block, a person, an algorithm or (for ExctgPrsn) the client NORE
+def dcsn_prsn(name, allow_clnt):
+
+    roll = rnd.random()
+    if roll < 0.6:
+        return tag(name, prsn(full=False))
+    elif roll < 0.8 or not allow_clnt:
+        return tag(name, tag('Algo', 'ALGO' + str(rnd.randint(1, 99))))
+    return tag(name, tag('Clnt', 'NORE'))
+
+
+def new_block(tx_id):
+
+    swap = rnd.random() < args.swap_ratio
+    content = tag('TxId', tx_id) + tag('ExctgPty', lei())
+    if rnd.random() < 0.9:
+        content += tag('InvstmtPtyInd', rnd.choice(['true', 'false', '1', '0']))
+    content += tag('SubmitgPty', lei())
+    content += party('Buyr') + party('Sellr')
+    if rnd.random() < 0.5:
+        content += tag('OrdrTrnsmssn', tag('TrnsmssnInd', rnd.choice(['true', 'false', '1', '0'])) +
+                       (tag('TrnsmttgBuyr', lei()) if rnd.random() < 0.3 else '') +
+                       (tag('TrnsmttgSellr', lei()) if rnd.random() < 0.3 else ''))
+
+    roll = rnd.random()
+    if roll < 0.6:
+        qty = tag('Unit', str(rnd.randint(1, 100000)))
+    elif roll < 0.8:
+        qty = tag('NmnlVal', amount(), ' Ccy="' + rnd.choice(currencies) + '"')
+    else:
+        qty = tag('MntryVal', amount(), ' Ccy="' + rnd.choice(currencies) + '"')
+
+    trnsc = tag('TradDt', '2018-01-{0:02d}T{1:02d}:{2:02d}:00.000Z'.format(rnd.randint(1, 28), rnd.randint(0, 23), rnd.randint(0, 59)))
+    trnsc += tag('TradgCpcty', rnd.choice(['AOTC', 'DEAL', 'MTCH'])) + tag('Qty', qty)
+    if rnd.random() < 0.1:
+        trnsc += tag('DerivNtnlChng', rnd.choice(['INCR', 'DECR']))
+    trnsc += tag('Pric', pric_block())
+    if rnd.random() < 0.7:
+        trnsc += tag('NetAmt', amount())
+    trnsc += tag('TradVn', rnd.choice(venues)) + tag('CtryOfBrnch', rnd.choice(countries))
+    if swap and rnd.random() < 0.5:
+        trnsc += tag('UpFrntPmt', tag('Amt', amount(), ' Ccy="' + rnd.choice(currencies) + '"') +
+                     tag('Sgn', rnd.choice(['true', 'false'])))
+    if rnd.random() < 0.05:
+        trnsc += tag('CmplxTradCmpntId', 'CMPLX' + str(rnd.randint(1, 99)))
+    content += tag('Tx', trnsc)
+
+    content += fin_instrm(swap)
+    if rnd.random() < 0.8:
+        content += dcsn_prsn('InvstmtDcsnPrsn', False)
+    content += dcsn_prsn('ExctgPrsn', True)
+
+    addtl = ''.join(tag('WvrInd', rnd.choice(['RFPT', 'NLIQ', 'OILQ', 'PRIC'])) for _ in range(rnd.randint(0, 2)))
+    if rnd.random() < 0.5:
+        addtl += tag('ShrtSellgInd', rnd.choice(['SESH', 'SSEX', 'SELL', 'UNDI']))
+    addtl += ''.join(tag('OTCPstTradInd', rnd.choice(['BENC', 'ACTX', 'LRGS'])) for _ in range(rnd.randint(0, 2)))
+    addtl += tag('RskRdcgTx', rnd.choice(['true', 'false', '1', '0'])) + tag('SctiesFincgTxInd', rnd.choice(['true', 'false', '1', '0']))
+    content += tag('AddtlAttrbts', addtl)
+
+    if rnd.random() < 0.1:
+        content += tag('ElgbltyDtrmntnAttrbts', tag('BrnchLctn', rnd.choice(countries)) + tag('TxTp', 'BUYI') +
+                       tag('LfcclEvnt', 'NEWT'))
+
+    return tag('New', content)
+
+
+def cxl_block(tx_id):
+
+    return tag('Cxl', tag('TxId', tx_id) + tag('ExctgPty', lei()) + tag('SubmitgPty', lei()))
+
+
+# returns the Tx blocks of one chunk of the file, from a seed of its own so chunks can be generated in any order
+def generate_chunk(chunk_no):
+
+    global rnd
+
+    rnd = random.Random('{0}-{1}'.format(args.seed, chunk_no))
+    tx_blocks = []
+
+    for tx_no in range(chunk_no * chunk_tx, min((chunk_no + 1) * chunk_tx, args.tx)):
+        tx_id = 'TRN{0:012d}'.format(tx_no)
+        if rnd.random() < args.canc_ratio:
+            block = cxl_block(tx_id)
+        else:
+            block = new_block(tx_id)
+        tx_blocks.append('        ' + tag('Tx', block) + '\n')
+
+    return ''.join(tx_blocks)
+
+
+if __name__ == '__main__':
+    xmlns = ' xmlns' + (':' + args.prefix if args.prefix else '') + '="' + iso_namespace + '"'
+    chunk_count = (args.tx + chunk_tx - 1) // chunk_tx
+
+    with open(args.out_xml, 'w', encoding='utf-8', newline='\n') as out_xml_file:
+        out_xml_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        if args.wrapper:
+            out_xml_file.write('<UVMiFIRDocument xmlns="' + uv_namespace + '">\n')
+            out_xml_file.write('  <Document>\n')
+        out_xml_file.write('    <' + p + 'Document' + xmlns + '>\n')
+        out_xml_file.write('      <' + p + 'FinInstrmRptgTxRpt>\n')
+
+        if args.workers > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+                for tx_blocks in executor.map(generate_chunk, range(chunk_count)):
+                    out_xml_file.write(tx_blocks)
+        else:
+            for tx_blocks in map(generate_chunk, range(chunk_count)):
+                out_xml_file.write(tx_blocks)
+
+        out_xml_file.write('      </' + p + 'FinInstrmRptgTxRpt>\n')
+        out_xml_file.write('    </' + p + 'Document>\n')
+        if args.wrapper:
+            out_xml_file.write('  </Document>\n')
+            out_xml_file.write('</UVMiFIRDocument>\n')
@@ -0,0 +1,84 @@
+"""
+parser_backend_benchmark.py
+
+Benchmark of the XML parser backends of unavista_mifid2_xml2csv.py, -parser etree (xml.etree.ElementTree) and
+-parser lxml (lxml.etree with compiled XPath expressions), in whole file and -stream modes.
+
+The converter is run on -in-xml (or, with no -in-xml, on a synthetic UnaVista file of -tx Tx blocks for each of the
+-shapes mixes, written by generate_fininstrmrptgtxrpt.py to a temporary folder) once per backend & mode for each of
+-repeat runs, and the best time of each is reported along with the time per Tx block. The CSV files output by every
+run on a file are checked to be identical, so a backend that changes the output is reported.
+
+Command line usage is as follows:
+
+    python parser_backend_benchmark.py [ -in-xml {in_XML_path} ] [ -tx {number of Tx blocks} ] [ -shapes {s,s} ]
+                                       [ -seed {n} ] [ -repeat {runs} ]
+"""
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from synthetic_xml import generate_xml, get_shape_names
+
+parser = argparse.ArgumentParser(description="XML parser backend benchmark for the UnaVista MIFID 2 converter")
+parser.add_argument('-in-xml', help='pathname of an input XML file (default a synthetic file)')
+parser.add_argument('-tx', type=int, default=50000, help='number of Tx blocks in the synthetic file (default 50000)')
+parser.add_argument('-shapes', default='mixed,swaps,cancels',
+                    help='comma separated Tx block mixes of the synthetic files (default mixed,swaps,cancels)')
+parser.add_argument('-seed', type=int, default=0, help='random seed of the synthetic files (default 0)')
+parser.add_argument('-repeat', type=int, default=3, help='number of timed runs of each backend & mode (default 3)')
+args = parser.parse_args()
+
+converter = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TanitaDocuments',
+                         'unavista_mifid2_xml2csv.py')
+
+runs = [('etree', '-no-stream'), ('etree', '-stream'), ('lxml', '-no-stream'), ('lxml', '-stream')]
+
+
+# runs the converter once, returning the time taken in seconds & the content of the CSV file it output
+def run_converter(xml_file, out_dir, parser_name, stream):
+
+    for csv_file in glob.glob(os.path.join(out_dir, '*.csv')):
+        os.remove(csv_file)
+
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable, converter, '-in-xml', xml_file, '-out-csv', os.path.join(out_dir, 'out.csv'),
+                    '-parser', parser_name, stream], stdout=subprocess.DEVNULL, check=True)
+    run_time = time.perf_counter() - start_time
+
+    with open(glob.glob(os.path.join(out_dir, '*.csv'))[0], 'rb') as out_csv_file:
+        return run_time, out_csv_file.read()
+
+
+shape_names = get_shape_names(parser, args.shapes)
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    if args.in_xml is None:
+        xml_files = [(shape, generate_xml(temp_dir, args.tx, shape, args.seed)) for shape in shape_names]
+    else:
+        xml_files = [(None, args.in_xml)]
+
+    for shape, xml_file in xml_files:
+        best_times = {}
+        outputs = {}
+
+        for _ in range(args.repeat):
+            for parser_name, stream in runs:
+                run_time, outputs[parser_name, stream] = run_converter(xml_file, temp_dir, parser_name, stream)
+                best_times[parser_name, stream] = min(run_time, best_times.get((parser_name, stream), run_time))
+
+        tx_count = outputs[runs[0]].count(b'\n') - 1  # less the header row
+
+        if shape is not None:
+            print('Shape                   : ', shape)
+        print('Tx blocks               : ', tx_count)
+        for parser_name, stream in runs:
+            print('{0:<24}:  {1:.3f} s  ({2:.1f} us per Tx)'.format(
+                parser_name + ' ' + stream, best_times[parser_name, stream],
+                best_times[parser_name, stream] * 1e6 / max(1, tx_count)))
+        print('Output                  : ', 'identical' if len(set(outputs.values())) == 1 else 'DIFFERENT')
+        print()
@@ -0,0 +1,113 @@
+"""
+ruffer_benchmark.py
+
+Throughput benchmark of RufferTransaction/RufferTransaction.py, comparing the old scrubbing (each line read on its
+own, with the line rebuilt by slicing for every quoted span) with the chunked scrubbing of the script.
+
+A synthetic Ruffer export of -rows rows, each with -quoted quoted values holding commas, is written to a temporary
+folder. The old scrubbing is run on it in this process & the script is run as Gaspode runs it; the best of -repeat
+runs of each is reported. With -quoted 1 the two outputs are checked to be identical (the old scrubbing shifts the
+later spans of a line with more than one quoted value, so its output differs there).
+
+Command line usage is as follows:
+
+    python ruffer_benchmark.py [ -rows {number of rows} ] [ -quoted {quoted values per row} ] [ -repeat {runs} ]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description="Throughput benchmark for RufferTransaction.py")
+parser.add_argument('-rows', type=int, default=500000, help='number of rows in the synthetic file (default 500000)')
+parser.add_argument('-quoted', type=int, default=1, help='number of quoted values per row (default 1)')
+parser.add_argument('-repeat', type=int, default=3, help='number of timed runs of each scrubbing (default 3)')
+args = parser.parse_args()
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RufferTransaction', 'RufferTransaction.py')
+
+
+# ------------------------------- the old scrubbing, as it was in RufferTransaction.py
+def get_range(input_row):
+    indexes = []
+    my_index = 0
+    start = 0
+    while True:
+        my_index = input_row.find("\"", start)
+        # ends loop if no more single quotes
+        if my_index == -1:
+            break
+        indexes.append(my_index)
+        start = my_index + 1
+
+    return indexes
+
+
+def find_n_replace(input_row):
+
+    # get affected ranges
+    edit_range = get_range(input_row)
+    instances = len(edit_range)
+
+    for i in range(0, int(instances), 2):
+        substring = input_row[edit_range[i]:edit_range[i+1]+1]
+        substring = substring.replace(",", " ")
+        substring = substring.replace("\"", "")
+
+        input_row = input_row[:edit_range[i]] + substring + input_row[edit_range[i+1]+1:]
+
+    return input_row
+
+
+# runs the old scrubbing, returning the time taken in seconds
+def run_old(in_csv_path, out_csv_path):
+
+    start_time = time.perf_counter()
+
+    with open(in_csv_path, 'r') as in_csv_file, open(out_csv_path, 'w') as out_csv_file:
+        for row in in_csv_file:
+            out_csv_file.write(find_n_replace(row))
+
+    return time.perf_counter() - start_time
+
+
+# runs RufferTransaction.py, returning the time taken in seconds
+def run_script(in_csv_path, out_dir):
+
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable, script, '--Input', in_csv_path, '--Temp', out_dir], check=True)
+
+    return time.perf_counter() - start_time
+
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    in_csv_path = os.path.join(temp_dir, 'RUFFER_TRANSACTIONS_20180116.csv')
+    old_csv_path = os.path.join(temp_dir, 'old.csv')
+    new_csv_path = os.path.join(temp_dir, 'RUFFER_TRANSACTIONS_1.csv')
+
+    with open(in_csv_path, 'w') as out_csv_file:
+        out_csv_file.write('TradeId,Account,Security,Description,Quantity,Price,Amount,Currency,TradeDate\n')
+        for row_no in range(args.rows):
+            values = ['T{0:08d}'.format(row_no), 'ACC{0:04d}'.format(row_no % 1000), 'GB00B{0:06d}'.format(row_no)]
+            values += ['"RUFFER FUND {0}, CLASS C, ACC"'.format(row_no % 97)] * args.quoted
+            values += ['{0}'.format(row_no % 5000), '1{0}.25'.format(row_no % 90), '"1,{0:03d},500.00"'.format(
+                row_no % 1000) if args.quoted > 1 else '1500.00', 'GBP', '2018-01-16']
+            out_csv_file.write(','.join(values) + '\n')
+
+    old_time = min(run_old(in_csv_path, old_csv_path) for _ in range(args.repeat))
+    new_time = min(run_script(in_csv_path, temp_dir) for _ in range(args.repeat))
+
+    file_mb = os.path.getsize(in_csv_path) / 1e6
+
+    with open(old_csv_path, 'rb') as old_csv_file, open(new_csv_path, 'rb') as new_csv_file:
+        outputs_identical = old_csv_file.read() == new_csv_file.read()
+
+print('Rows                    : ', args.rows)
+print('File size               :  {0:.1f} MB'.format(file_mb))
+print('Line by line scrubbing  :  {0:.3f} s  ({1:.1f} MB/s)'.format(old_time, file_mb / old_time))
+print('RufferTransaction.py    :  {0:.3f} s  ({1:.1f} MB/s)'.format(new_time, file_mb / new_time))
+print('Speedup                 :  {0:.1f}x'.format(old_time / new_time))
+print('Output                  : ', 'identical' if outputs_identical else 'different')
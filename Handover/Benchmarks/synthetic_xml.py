@@ -0,0 +1,52 @@
+"""
+synthetic_xml.py
+
+The synthetic UnaVista MIFID 2 XML files the benchmarks run on, written by generate_fininstrmrptgtxrpt.py, so every
+benchmark times the same files for the same size, shape & seed.
+
+    * mixed     The generator's default mix of Tx blocks
+    * swaps     Every New block a swap, half of them with a pending price
+    * cancels   Nine Tx blocks in ten cancellations
+    * persons   Every buyer & seller a person, with up to 5 AcctOwnr & DcsnMakr blocks
+"""
+
+import os
+import subprocess
+import sys
+
+generator = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generate_fininstrmrptgtxrpt.py')
+
+# generate_fininstrmrptgtxrpt.py options of each mix of Tx blocks
+shapes = {
+    'mixed': [],
+    'swaps': ['-swap-ratio', '1', '-nopric-ratio', '0.5'],
+    'cancels': ['-canc-ratio', '0.9'],
+    'persons': ['-prsn-ratio', '1', '-max-accts', '5'],
+}
+
+
+# returns the shape names of a comma separated list, calling parser.error for one that isn't in shapes
+def get_shape_names(parser, shape_list):
+
+    shape_names = shape_list.split(',')
+
+    for name in shape_names:
+        if name not in shapes:
+            parser.error('unknown shape ' + name + ', use one of ' + ', '.join(shapes))
+
+    return shape_names
+
+
+# writes a synthetic file of tx_count Tx blocks of the given shape into a folder of its own, returning its path (a
+# file already written to temp_dir for the same size, shape & wrapper is used again)
+def generate_xml(temp_dir, tx_count, shape, seed, wrapper=True):
+
+    xml_dir = os.path.join(temp_dir, '{0}_{1}_{2}'.format(shape, tx_count, 'uv' if wrapper else 'iso'))
+    xml_file = os.path.join(xml_dir, 'synthetic.xml')
+
+    if not os.path.exists(xml_file):
+        os.mkdir(xml_dir)
+        subprocess.run([sys.executable, generator, '-out-xml', xml_file, '-tx', str(tx_count), '-seed', str(seed)] +
+                       shapes[shape] + ([] if wrapper else ['-no-wrapper']), check=True)
+
+    return xml_file
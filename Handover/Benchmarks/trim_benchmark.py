@@ -0,0 +1,127 @@
+"""
+trim_benchmark.py
+
+Benchmark of the space trimming used by Binck/SpaceRemoval.py and Binck/RekeningID.py, comparing the old trimming
+(each value walked one character at a time in Python to find its first & last non space character) with the shared
+trimming in Binck/TrimSpaces.py.
+
+A synthetic Binck semicolon CSV file of -rows rows of -columns values is written to a temporary folder, then read
+back in blocks of block_rows rows (so memory use doesn't grow with -rows); each trimming trims every value of each
+block, and the best total of -repeat runs is reported. The trimmed rows are checked to be the same for both.
+
+Command line usage is as follows:
+
+    python trim_benchmark.py [ -rows {number of rows} ] [ -columns {values per row} ] [ -repeat {runs} ]
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Binck'))
+
+from TrimSpaces import trim_rows
+
+parser = argparse.ArgumentParser(description="Space trimming benchmark for the Binck scripts")
+parser.add_argument('-rows', type=int, default=1000000, help='number of rows in the synthetic file (default 1000000)')
+parser.add_argument('-columns', type=int, default=20, help='number of values per row (default 20)')
+parser.add_argument('-repeat', type=int, default=3, help='number of timed runs of each trimming (default 3)')
+args = parser.parse_args()
+
+block_rows = 10000
+
+
+# ------------------------------- the old trimming, as it was in SpaceRemoval.py & RekeningID.py
+def get_firstlast_index(a_string):
+    first_last = []
+
+    # get index of first character
+    for index, letter in enumerate(a_string):
+        if letter != ' ':
+            first_last.append(index)
+            break
+    # get index of last character
+    for index, letter in reversed(list(enumerate(a_string))):
+        if letter != ' ':
+            first_last.append(index+1)
+            break
+
+    return first_last
+
+
+def strip_value(string):
+    indexs = get_firstlast_index(string)
+    if len(indexs) == 2:
+        first_index = indexs[0]
+        last_index = indexs[1]
+        substring = string[first_index:last_index]
+        return substring
+    else:
+        return string.strip()
+
+
+def old_trim_rows(rows):
+    for row in rows:
+        for index, entry in enumerate(row):
+            row[index] = strip_value(entry)
+    return rows
+
+
+# trims a copy of a block of rows, returning the time taken in seconds & the trimmed rows
+def run_trim(rows, trim):
+
+    rows = [list(row) for row in rows]
+
+    start_time = time.perf_counter()
+    rows = trim(rows)
+
+    return time.perf_counter() - start_time, rows
+
+
+old_times = [0.0] * args.repeat
+new_times = [0.0] * args.repeat
+row_count = 0
+rows_identical = True
+
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    csv_file = os.path.join(temp_dir, 'synthetic.csv')
+    random.seed(0)
+
+    with open(csv_file, 'w', newline='') as out_csv_file:
+        writer_obj = csv.writer(out_csv_file, delimiter=';')
+        for row_no in range(args.rows):
+            writer_obj.writerow([' ' * random.randrange(3) + 'V{0}_{1}'.format(column, row_no % 997) +
+                                 ' ' * random.randrange(12) if column % 4 else '' for column in range(args.columns)])
+
+    with open(csv_file, 'r', newline='') as in_csv_file:
+        reader_obj = csv.reader(in_csv_file, delimiter=';')
+
+        while True:
+            rows = list(itertools.islice(reader_obj, block_rows))
+            if not rows:
+                break
+            row_count += len(rows)
+
+            for run_no in range(args.repeat):
+                old_time, old_rows = run_trim(rows, old_trim_rows)
+                new_time, new_rows = run_trim(rows, trim_rows)
+                old_times[run_no] += old_time
+                new_times[run_no] += new_time
+                rows_identical = rows_identical and old_rows == new_rows
+
+old_time = min(old_times)
+new_time = min(new_times)
+values = row_count * args.columns
+
+print('Rows                    : ', row_count)
+print('Values                  : ', values)
+print('Per character trimming  :  {0:.3f} s  ({1:.0f} ns per value)'.format(old_time, old_time * 1e9 / values))
+print('TrimSpaces.trim_rows    :  {0:.3f} s  ({1:.0f} ns per value)'.format(new_time, new_time * 1e9 / values))
+print('Speedup                 :  {0:.1f}x'.format(old_time / new_time))
+print('Trimmed rows            : ', 'identical' if rows_identical else 'DIFFERENT')
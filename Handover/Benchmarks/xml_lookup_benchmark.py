@@ -0,0 +1,179 @@
+"""
+xml_lookup_benchmark.py
+
+Microbenchmark of the tag lookups made by get_output_row_new in unavista_mifid2_xml2csv.py, comparing the old
+lookup (namespace tag + local name concatenated on every call) with the cached, interned qualified tag names.
+
+For each of the -shapes mixes a synthetic UnaVista file of -tx Tx blocks is written by generate_fininstrmrptgtxrpt.py
+to a temporary folder and parsed once; each lookup style then walks every New block making the same xml_find /
+xml_find_text / xml_findall calls (none under a block the New block doesn't have, as get_output_row_new skips them),
+and the best of -repeat runs is reported.
+
+Command line usage is as follows:
+
+    python xml_lookup_benchmark.py [ -tx {number of Tx blocks} ] [ -shapes {s,s} ] [ -seed {n} ] [ -repeat {runs} ]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ElemTree
+from synthetic_xml import generate_xml, get_shape_names
+
+parser = argparse.ArgumentParser(description="Tag lookup microbenchmark for the UnaVista MIFID 2 converter")
+parser.add_argument('-tx', type=int, default=100000, help='number of Tx blocks in the synthetic file (default 100000)')
+parser.add_argument('-shapes', default='mixed,swaps,cancels',
+                    help='comma separated Tx block mixes (default mixed,swaps,cancels)')
+parser.add_argument('-seed', type=int, default=0, help='random seed of the synthetic files (default 0)')
+parser.add_argument('-repeat', type=int, default=3, help='number of timed runs of each lookup style (default 3)')
+args = parser.parse_args()
+
+iso_namespace = 'urn:iso:std:iso:20022:tech:xsd:auth.016.001.01'
+
+# (path to the parent block, local tag name, lookup) as made by get_output_row_new for a New block
+lookups = [
+    ((), 'TxId', 'text'), ((), 'ExctgPty', 'text'), ((), 'InvstmtPtyInd', 'find'), ((), 'InvstmtPtyInd', 'text'),
+    ((), 'Buyr', 'find'), (('Buyr',), 'AcctOwnr', 'findall'), (('Buyr', 'AcctOwnr'), 'Id', 'find'),
+    (('Buyr', 'AcctOwnr', 'Id'), 'Prsn', 'find'), (('Buyr', 'AcctOwnr', 'Id'), 'LEI', 'find'),
+    (('Buyr', 'AcctOwnr', 'Id'), 'MIC', 'find'), (('Buyr', 'AcctOwnr', 'Id', 'Prsn'), 'Othr', 'find'),
+    (('Buyr', 'AcctOwnr', 'Id', 'Prsn', 'Othr'), 'SchmeNm', 'find'),
+    (('Buyr', 'AcctOwnr', 'Id', 'Prsn', 'Othr', 'SchmeNm'), 'Cd', 'find'),
+    (('Buyr', 'AcctOwnr', 'Id', 'Prsn', 'Othr', 'SchmeNm'), 'Cd', 'text'),
+    (('Buyr', 'AcctOwnr', 'Id', 'Prsn', 'Othr'), 'Id', 'text'), (('Buyr', 'AcctOwnr', 'Id', 'Prsn'), 'FrstNm', 'text'),
+    (('Buyr', 'AcctOwnr', 'Id', 'Prsn'), 'Nm', 'text'), (('Buyr', 'AcctOwnr', 'Id', 'Prsn'), 'BirthDt', 'text'),
+    (('Buyr', 'AcctOwnr'), 'CtryOfBrnch', 'text'), (('Buyr',), 'DcsnMakr', 'findall'),
+    ((), 'Sellr', 'find'), (('Sellr',), 'AcctOwnr', 'findall'), (('Sellr', 'AcctOwnr'), 'Id', 'find'),
+    (('Sellr', 'AcctOwnr', 'Id'), 'LEI', 'find'), (('Sellr', 'AcctOwnr', 'Id'), 'LEI', 'text'),
+    (('Sellr', 'AcctOwnr'), 'CtryOfBrnch', 'text'), ((), 'OrdrTrnsmssn', 'find'), ((), 'Tx', 'find'),
+    (('Tx',), 'TradDt', 'text'), (('Tx',), 'TradgCpcty', 'text'), (('Tx',), 'Qty', 'find'),
+    (('Tx', 'Qty'), 'Unit', 'find'), (('Tx', 'Qty'), 'Unit', 'text'), (('Tx',), 'DerivNtnlChng', 'text'),
+    (('Tx',), 'Pric', 'find'), (('Tx', 'Pric'), 'Pric', 'find'), (('Tx', 'Pric'), 'NoPric', 'find'),
+    (('Tx', 'Pric', 'Pric'), 'MntryVal', 'find'), (('Tx', 'Pric', 'Pric', 'MntryVal'), 'Sgn', 'text'),
+    (('Tx', 'Pric', 'Pric', 'MntryVal'), 'Amt', 'text'), (('Tx',), 'NetAmt', 'text'), (('Tx',), 'TradVn', 'text'),
+    (('Tx',), 'CtryOfBrnch', 'text'), (('Tx',), 'UpFrntPmt', 'find'), (('Tx',), 'CmplxTradCmpntId', 'text'),
+    ((), 'FinInstrm', 'find'), (('FinInstrm',), 'Othr', 'find'), (('FinInstrm',), 'Id', 'find'),
+    (('FinInstrm',), 'Id', 'text'), ((), 'InvstmtDcsnPrsn', 'find'), ((), 'ExctgPrsn', 'find'),
+    (('ExctgPrsn',), 'Prsn', 'find'), (('ExctgPrsn',), 'Algo', 'find'), (('ExctgPrsn',), 'Algo', 'text'),
+    ((), 'AddtlAttrbts', 'find'), (('AddtlAttrbts',), 'WvrInd', 'findall'), (('AddtlAttrbts',), 'ShrtSellgInd', 'find'),
+    (('AddtlAttrbts',), 'OTCPstTradInd', 'findall'), (('AddtlAttrbts',), 'RskRdcgTx', 'find'),
+    (('AddtlAttrbts',), 'RskRdcgTx', 'text'), (('AddtlAttrbts',), 'SctiesFincgTxInd', 'find'),
+    (('AddtlAttrbts',), 'SctiesFincgTxInd', 'text'), ((), 'ElgbltyDtrmntnAttrbts', 'find'),
+]
+
+xml_namespace_tag = '{' + iso_namespace + '}'
+xml_tags = {}
+
+
+# ------------------------------- lookups concatenating the namespace tag on every call (the old helpers)
+def concat_find(xml_ref, in_str):
+
+    return xml_ref.find(xml_namespace_tag + in_str)
+
+
+def concat_find_text(xml_ref, in_str):
+
+    xml_ret = xml_ref.find(xml_namespace_tag + in_str)
+
+    return '' if xml_ret is None or xml_ret.text is None else xml_ret.text
+
+
+def concat_findall(xml_ref, in_str):
+
+    return xml_ref.findall(xml_namespace_tag + in_str)
+
+
+# ------------------------------- lookups through the cache of interned qualified tag names (the new helpers)
+def xml_tag(in_str):
+
+    tag = xml_tags.get(in_str)
+
+    if tag is None:
+        tag = xml_tags[in_str] = sys.intern(xml_namespace_tag + in_str)
+
+    return tag
+
+
+def cached_find(xml_ref, in_str):
+
+    return xml_ref.find(xml_tags.get(in_str) or xml_tag(in_str))
+
+
+def cached_find_text(xml_ref, in_str):
+
+    xml_ret = xml_ref.find(xml_tags.get(in_str) or xml_tag(in_str))
+
+    return '' if xml_ret is None or xml_ret.text is None else xml_ret.text
+
+
+def cached_findall(xml_ref, in_str):
+
+    return xml_ref.findall(xml_tags.get(in_str) or xml_tag(in_str))
+
+
+# makes every lookup in the lookups table on every New block, returning the time taken in seconds
+def run_lookups(xml_news, find, find_text, findall):
+
+    calls = {'find': find, 'text': find_text, 'findall': findall}
+    plan = [(path, in_str, calls[kind]) for path, in_str, kind in lookups]
+
+    start_time = time.perf_counter()
+
+    for xml_new in xml_news:
+        for path, in_str, call in plan:
+            xml_ref = xml_new
+            for path_str in path:
+                xml_ref = find(xml_ref, path_str)
+                if xml_ref is None:
+                    break
+            else:
+                call(xml_ref, in_str)
+
+    return time.perf_counter() - start_time
+
+
+# returns the number of lookups run_lookups makes on the New blocks
+def count_lookups(xml_news):
+
+    lookup_count = 0
+
+    for xml_new in xml_news:
+        for path, in_str, kind in lookups:
+            xml_ref = xml_new
+            for path_str in path:
+                xml_ref = cached_find(xml_ref, path_str)
+                lookup_count += 1
+                if xml_ref is None:
+                    break
+            else:
+                lookup_count += 1
+
+    return lookup_count
+
+
+shape_names = get_shape_names(parser, args.shapes)
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    for shape in shape_names:
+        xml_rpt = ElemTree.parse(generate_xml(temp_dir, args.tx, shape, args.seed)).getroot()[0][0][0]
+
+        # cancellations have no New block
+        xml_news = [xml_new for xml_new in (xml_tx.find(xml_namespace_tag + 'New') for xml_tx in xml_rpt)
+                    if xml_new is not None]
+        lookup_count = max(1, count_lookups(xml_news))
+
+        concat_time = min(run_lookups(xml_news, concat_find, concat_find_text, concat_findall)
+                          for _ in range(args.repeat))
+        cached_time = min(run_lookups(xml_news, cached_find, cached_find_text, cached_findall)
+                          for _ in range(args.repeat))
+
+        print('Shape                   : ', shape)
+        print('Tx blocks               : ', len(xml_rpt))
+        print('New blocks              : ', len(xml_news))
+        print('Lookups per New block   :  {0:.1f}'.format(lookup_count / max(1, len(xml_news))))
+        print('Concatenated tag names  :  {0:.3f} s  ({1:.0f} ns per lookup)'.format(
+            concat_time, concat_time * 1e9 / lookup_count))
+        print('Cached tag names        :  {0:.3f} s  ({1:.0f} ns per lookup)'.format(
+            cached_time, cached_time * 1e9 / lookup_count))
+        print('Speedup                 :  {0:.2f}x'.format(concat_time / cached_time))
+        print()
@@ -1,62 +1,90 @@
 
 import argparse
 import csv
+import json
 import os
-import numpy as np
+import tempfile
 import time
+from RunReport import output_error_run_report, output_run_report, start_run_report
+from TrimSpaces import trim_row, trim_value
 
 start_time = time.time()
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-in-csv', help='name of input csv file')
 parser.add_argument('-ref-data', help='name of reference data')
-args = parser.parse_args()
-
-
-# get the index of the first and last none space character
-def get_firstlast_index(a_string):
-    first_last = []
-
-    # get index of first character
-    for index, letter in enumerate(a_string):
-        if letter != ' ':
-            first_last.append(index)
-            break
-    # get index of last character
-    for index, letter in reversed(list(enumerate(a_string))):
-        if letter != ' ':
-            first_last.append(index+1)
-            break
-    return first_last
-
-
-# remove spaces from start and end of text
-def strip_outer_spaces(string):
-    indexs = get_firstlast_index(string)
-    if len(indexs) == 2:
-        first_index = indexs[0]
-        last_index = indexs[1]
-        substring = string[first_index:last_index]
-        return substring
-    else:
-        return string.strip()
-
+parser.add_argument('-report', help='where to write a JSON run report, - for the console or a file to append to')
 
-# runs strip outer spaces for a whole row
-def strip_row(row):
-    for index, entry in enumerate(row):
-        row[index] = strip_outer_spaces(entry)
-    return row
+parser_cache = parser.add_mutually_exclusive_group(required=False)
+parser_cache.add_argument('-ref-cache', dest='ref_cache', help='Keep the ref data ids in a cache file (default)', action='store_true')
+parser_cache.add_argument('-no-ref-cache', dest='ref_cache', help='Read the ref data every run', action='store_false')
+parser.set_defaults(ref_cache=True)
 
+args = parser.parse_args()
 
-# filter rekeningid
-def filter_rekeningid(ref_reader, in_reader):
-    refdata_list = list(ref_reader)
-    refdata_nplist = np.array(refdata_list)
-    rekeningid_column = refdata_nplist[:, 50]
-
-    new_column = np.unique(rekeningid_column)
-
+rekeningid_column = 50  # column of the rekening id in the ref data
+
+
+# reads the rekening ids of the ref data one row at a time, keeping only the rekening id column
+def read_rekeningids(ref_reader):
+    return {row[rekeningid_column] for row in ref_reader}
+
+
+# returns the rekening ids of the cache file if it was written for ref_key, otherwise None (a cache file that can't be
+# read, or is from another version of the ref data, is only a cache miss)
+def read_cached_rekeningids(cache_path, ref_key):
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as cache_file:
+            cache = json.load(cache_file)
+        if cache['ref_key'] == list(ref_key):
+            return set(cache['rekeningids'])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+# writes the cache file, to a temporary file first so another run never reads half a cache file. A cache file that
+# can't be written (e.g. a read-only Ref_Data folder) only means the ref data is read again next run.
+def write_cached_rekeningids(cache_path, ref_key, rekeningids):
+    cache_dir, cache_name = os.path.split(os.path.abspath(cache_path))
+    try:
+        temp_fd, temp_path = tempfile.mkstemp(suffix='.tmp', prefix=cache_name + '.', dir=cache_dir)
+    except OSError:
+        return
+    try:
+        with open(temp_fd, 'w', encoding='utf-8') as cache_file:
+            json.dump({'ref_key': list(ref_key), 'rekeningids': sorted(rekeningids)}, cache_file)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+# returns the set of ref data rekening ids, from the cache file next to the ref data if it was written for the same
+# version of the ref data file (same size & modification time), otherwise read from the ref data & cached
+def get_rekeningids(refdata_path, use_cache):
+    ref_stat = os.stat(refdata_path)
+    ref_key = (ref_stat.st_size, ref_stat.st_mtime_ns, rekeningid_column)
+    cache_path = refdata_path + '.rekeningids'
+
+    if use_cache:
+        rekeningids = read_cached_rekeningids(cache_path, ref_key)
+        if rekeningids is not None:
+            return rekeningids
+
+    with open(refdata_path, 'r') as ref_data_file:
+        rekeningids = read_rekeningids(csv.reader(ref_data_file, delimiter=';'))
+
+    if use_cache:
+        write_cached_rekeningids(cache_path, ref_key, rekeningids)
+
+    return rekeningids
+
+
+# filter rekeningid, returning the numbers of rows read & written (with the header row)
+def filter_rekeningid(rekeningid_set, in_reader):
     input_counter = 0
     output_counter = 1
     for row in in_reader:
@@ -66,40 +94,55 @@ def filter_rekeningid(ref_reader, in_reader):
             outfile_writer.writerow(row)
             continue
 
-        rekeningid = strip_outer_spaces(row[2])
-        bool_array = new_column == rekeningid
-        id_in_refdata = np.any(bool_array)
+        rekeningid = trim_value(row[2])
 
-        if id_in_refdata:
+        if rekeningid in rekeningid_set:
             output_counter += 1
-            outfile_writer.writerow(strip_row(row))
+            outfile_writer.writerow(trim_row(row))
 
-    print('{0} out of the {1} rows have been kept'.format(output_counter, input_counter))
-    return
+    return input_counter, output_counter
 
 
 input_file_path = os.path.join(os.getcwd(), 'In', args.in_csv)
 output_file_path = os.path.join(os.getcwd(), 'Out', 'OUTPUT_' + args.in_csv)
 refdata_file_path = os.path.join(os.getcwd(), 'Ref_Data', args.ref_data)
 
-# in file
-in_csv_file = open(input_file_path, 'r')
-infile_reader = csv.reader(in_csv_file, delimiter=';')
-# out file
-out_csv_file = open(output_file_path, 'w', newline='')
-outfile_writer = csv.writer(out_csv_file, delimiter=';')
-# ref data
-ref_data_file = open(refdata_file_path, 'r')
-refdata_reader = csv.reader(ref_data_file, delimiter=';')
-
-# run filter function
-filter_rekeningid(refdata_reader, infile_reader)
-
-out_csv_file.close()
-in_csv_file.close()
-ref_data_file.close()
-
-end_time = time.time()
-time_diff = end_time - start_time
-print('The code took {0} seconds'.format(round(time_diff)))
+run_report = start_run_report('RekeningID', input_file_path, output_file_path)
+
+try:
+    # in file
+    in_csv_file = open(input_file_path, 'r')
+    infile_reader = csv.reader(in_csv_file, delimiter=';')
+    # out file
+    out_csv_file = open(output_file_path, 'w', newline='')
+    outfile_writer = csv.writer(out_csv_file, delimiter=';')
+    # ref data, the time reading it is the parse_seconds of the run report
+    ref_data_start = time.perf_counter()
+    refdata_rekeningids = get_rekeningids(refdata_file_path, args.ref_cache)
+    run_report['parse_seconds'] = time.perf_counter() - ref_data_start
+
+    # run filter function, reading, filtering & writing a row at a time
+    filter_start = time.perf_counter()
+    input_counter, output_counter = filter_rekeningid(refdata_rekeningids, infile_reader)
+
+    out_csv_file.close()
+    in_csv_file.close()
+    run_report['map_seconds'] = time.perf_counter() - filter_start
+
+except BaseException as e:
+    if args.report is not None:
+        output_error_run_report(args.report, run_report, e)
+    raise
+
+if args.report is None:
+    print('{0} out of the {1} rows have been kept'.format(output_counter, input_counter))
+
+    end_time = time.time()
+    time_diff = end_time - start_time
+    print('The code took {0} seconds'.format(round(time_diff)))
+else:
+    # the rows after the header row, of which output_counter - 1 were kept
+    tx = max(input_counter - 1, 0)
+    run_report.update(tx=tx, filtered=tx - (output_counter - 1))
+    output_run_report(args.report, run_report, output_counter - 1)
 
@@ -0,0 +1,56 @@
+
+import datetime
+import json
+import os
+import sys
+import time
+
+# Run reports shared by SpaceRemoval.py and RekeningID.py, which must be in the same directory as this file.
+#
+# A run report is one line of JSON, written to the console (sink -) or appended to a file, with the same keys as the
+# run reports of the UnaVista converters. Values a script doesn't measure are null.
+
+
+# returns a run report for a tool's run on an input file, started now, with every value not known yet null (the size
+# of an input file that can't be found too, the run then fails & reports it)
+def start_run_report(tool, input_path, output_path):
+    try:
+        input_bytes = os.path.getsize(input_path)
+    except OSError:
+        input_bytes = None
+
+    return {'tool': tool, 'client': 'Binck', 'started': datetime.datetime.now().isoformat(timespec='seconds'),
+            'input': input_path, 'input_bytes': input_bytes, 'output': output_path,
+            'tx': None, 'newt': None, 'canc': None, 'filtered': None,
+            'parse_seconds': None, 'map_seconds': None, 'write_seconds': None, 'seconds': time.perf_counter(),
+            'peak_memory_mb': None, 'rows_per_sec': None, 'error': None}
+
+
+# returns the peak memory of this process in MB, or None where it isn't known (Windows)
+def get_peak_memory():
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # ru_maxrss is in KB, but in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+# finishes a run report that output rows rows & writes it to sink, - for the console or a file it is appended to
+def output_run_report(sink, report, rows):
+    report['seconds'] = time.perf_counter() - report['seconds']
+    report['peak_memory_mb'] = get_peak_memory()
+    report['rows_per_sec'] = rows / report['seconds'] if report['seconds'] else None
+
+    if sink == '-':
+        print(json.dumps(report))
+    else:
+        with open(sink, 'a', encoding='utf-8') as report_file:
+            report_file.write(json.dumps(report) + '\n')
+
+
+# writes the run report of a run stopped by an exception, with the exception as its error & no rows output
+def output_error_run_report(sink, report, error):
+    report['error'] = type(error).__name__ + ': ' + str(error)
+    output_run_report(sink, report, 0)
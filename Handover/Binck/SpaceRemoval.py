@@ -1,42 +1,23 @@
 
 import argparse
 import csv
+import itertools
 import os
+import shutil
+import tempfile
+import time
+from RunReport import output_error_run_report, output_run_report, start_run_report
+from TrimSpaces import trim_rows
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-in-csv', help='pathname of input csv file')
-parser.add_argument('-out-csv', help='pathname of output csv file')
+parser.add_argument('-out-csv', help='pathname of output csv file (default the input csv file, which is replaced)')
+parser.add_argument('-report', help='where to write a JSON run report, - for the console or a file to append to')
 args = parser.parse_args()
 
-
-# get the index of the first and last none space character
-def get_firstlast_index(a_string):
-    first_last = []
-
-    # get index of first character
-    for index, letter in enumerate(a_string):
-        if letter != ' ':
-            first_last.append(index)
-            break
-    # get index of last character
-    for index, letter in reversed(list(enumerate(a_string))):
-        if letter != ' ':
-            first_last.append(index+1)
-            break
-
-    return first_last
-
-
-# remove spaces from start and end of text
-def strip_value(string):
-    indexs = get_firstlast_index(string)
-    if len(indexs) == 2:
-        first_index = indexs[0]
-        last_index = indexs[1]
-        substring = string[first_index:last_index]
-        return substring
-    else:
-        return string.strip()
+block_rows = 10000  # rows read, filtered & trimmed at a time
+buffer_size = 1 << 20  # bytes buffered by the input & output csv files
+ordersoort_column = 14  # column of the ordersoort (O or F) in the input
 
 
 # remove value if not O or F
@@ -47,20 +28,50 @@ def keep_O_F(ordersoort):
         return False
 
 
-# in file
-in_csv_file = open(args.in_csv, 'r')
-reader_obj = csv.reader(in_csv_file, delimiter=';')
-# out file
-out_csv_file = open(args.in_csv, 'w', newline='')
-writer_obj = csv.writer(out_csv_file, delimiter=';')
+out_csv_path = args.out_csv if args.out_csv else args.in_csv
+run_report = start_run_report('SpaceRemoval', args.in_csv, out_csv_path)
+run_report.update(tx=0, filtered=0, parse_seconds=0.0, map_seconds=0.0, write_seconds=0.0)
+
+# the output is written to a temporary file in the same directory, which then replaces the output file in one step,
+# so the input file is read in full even when it is also the output file, and a failed run leaves the output untouched
+out_fd, temp_csv_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(out_csv_path)))
+
+try:
+    # out file, then in file
+    with open(out_fd, 'w', newline='', buffering=buffer_size) as out_csv_file, \
+            open(args.in_csv, 'r', buffering=buffer_size) as in_csv_file:
+        reader_obj = csv.reader(in_csv_file, delimiter=';')
+        writer_obj = csv.writer(out_csv_file, delimiter=';')
+
+        while True:
+            start = time.perf_counter()
+            rows = list(itertools.islice(reader_obj, block_rows))
+            if not rows:
+                break
+
+            map_start = time.perf_counter()
+            # a blank or short row has no ordersoort, it's filtered out as a row that isn't O or F
+            out_rows = trim_rows([row for row in rows
+                                  if len(row) > ordersoort_column and not keep_O_F(row[ordersoort_column])])
+
+            write_start = time.perf_counter()
+            writer_obj.writerows(out_rows)
+
+            run_report['parse_seconds'] += map_start - start
+            run_report['map_seconds'] += write_start - map_start
+            run_report['write_seconds'] += time.perf_counter() - write_start
+            run_report['tx'] += len(rows)
+            run_report['filtered'] += len(rows) - len(out_rows)
 
-for counter, row in enumerate(reader_obj):
-    if keep_O_F(row[14]):
-        continue
-    for index, entry in enumerate(row):
-        row[index] = strip_value(entry)
+    if os.path.exists(out_csv_path):
+        shutil.copymode(out_csv_path, temp_csv_path)
+    os.replace(temp_csv_path, out_csv_path)
 
-    writer_obj.writerow(row)
+except BaseException as e:
+    os.remove(temp_csv_path)
+    if args.report is not None:
+        output_error_run_report(args.report, run_report, e)
+    raise
 
-out_csv_file.close()
-in_csv_file.close()
+if args.report is not None:
+    output_run_report(args.report, run_report, run_report['tx'] - run_report['filtered'])
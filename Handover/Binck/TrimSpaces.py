@@ -0,0 +1,22 @@
+
+from itertools import repeat
+
+# Trimming shared by SpaceRemoval.py and RekeningID.py, which must be in the same directory as this file.
+#
+# Only spaces are removed, tabs & other white space before the first or after the last character are kept. The
+# trimming is done by str.strip in C, a whole row at a time, instead of looking at each character in Python.
+
+
+# remove spaces from start and end of text
+def trim_value(value):
+    return value.strip(' ')
+
+
+# remove spaces from start and end of every value in a row
+def trim_row(row):
+    return list(map(str.strip, row, repeat(' ', len(row))))
+
+
+# remove spaces from start and end of every value in a block of rows
+def trim_rows(rows):
+    return [list(map(str.strip, row, repeat(' ', len(row)))) for row in rows]
@@ -23,7 +23,13 @@ in which command options & their corresponding arguments are as follows:
         Pathname of Temporary output file
         (specified by Gaspode, & directory part used by script
 
-The script simply runs the nnip_xml2csv.py script with suitable command options & arguments.
+    * --Report {sink}
+
+        Where the converter writes its JSON run report, - for the console or the pathname of a file it is
+        appended to (optional, default no report)
+
+The script simply runs the xml2csv_convert.py script's convert() in this process with suitable
+arguments, so no second Python interpreter is started for each file.
 """
 
 import os
@@ -33,22 +39,27 @@ import sys
 
 sys.path.append('.')
 
+# the converter is imported from the folder of this script
+sys.path.insert(0, os.path.dirname(os.path.abspath(sys.argv[0])))
+import xml2csv_convert
+
 parser = argparse.ArgumentParser(description="UnaVista MIFID 2 master script used by Gaspode")
 
 parser.add_argument('--Input',  help='Filename of Input XML file (specified by Gaspode)')
 parser.add_argument('--Output', help='Leave blank, (specified by Gaspode)')
 parser.add_argument('--Temp',   help='Output file directory, path used by Gaspode')
+parser.add_argument('--Report', help='JSON run report, - for the console or a file to append to (default none)')
 
 
 args = parser.parse_args()
 
 
-def run_os_command(cmd_line):
+def run_convert(in_xml, out_csv, report=None):
 
-    print(cmd_line + "\r\n")
+    print('xml2csv_convert.convert("' + in_xml + '", "' + out_csv + '")' + "\r\n")
 
     try:
-        os.system('"' + cmd_line + '"')
+        xml2csv_convert.convert(in_xml, out_csv, report=report)
 
     except Exception as e:
         if hasattr(e, 'message'):
@@ -59,13 +70,6 @@ def run_os_command(cmd_line):
         exit(-1)
 
 
-# python executable path
-python_path = sys.executable
-
-# script_dir
-script_dir = os.path.dirname(sys.argv[0])
-script_path = os.path.join(script_dir, 'xml2csv_convert.py')
-
 mm = re.match(r'(.*)\.xml', args.Input)
 if mm is None:
     print('Input file "' + path_in_xml + '" is not an XML file!')
@@ -73,8 +77,7 @@ if mm is None:
 
 path_temp = args.Temp if re.match(r'.*\.csv$', args.Temp) is None else os.path.dirname(args.Temp)
 
-run_os_command('"' + python_path + '" "' + script_path + '" -in-xml "' + args.Input
-               + '" -out-csv "' + args.Temp)
+run_convert(args.Input, args.Temp, args.Report)
 
 print("exiting xml2csv_wrapper.py (after running xml2csv_convert.py) ..")
 exit(0)
@@ -1,12 +1,21 @@
 
 import argparse
+import concurrent.futures
 import csv
+import datetime
+import glob
+import json
 import os
+import sys
+import time
 
 parser = argparse.ArgumentParser()
-parser.add_argument('--Input', help='pathname of input csv file')
+parser.add_argument('--Input',
+                    help='pathname of input csv file, or a folder (its *.csv files) or wildcard pattern of input csv files')
 parser.add_argument('--Output', help='pathname of output csv file (not used, for Gaspode only)')
 parser.add_argument('--Temp', help='pathname used for output file location')
+parser.add_argument('--Workers', type=int, default=1, help='number of worker processes for several input files (default 1)')
+parser.add_argument('--Report', help='where to write a JSON run report, - for the console or a file to append to')
 
 parser_warn = parser.add_mutually_exclusive_group(required=False)
 parser_warn.add_argument('-warn', dest='warn', help='Display warnings (default)', action='store_true')
@@ -14,69 +23,198 @@ parser_warn.add_argument('-no-warn', dest='warn', help='Suppress warnings', acti
 parser.set_defaults(warn=True)
 
 args = parser.parse_args()
-hash_file_name = os.path.basename(args.Input)
 
-uscore_counter = 0
-file_name = 'no name'
-for index, character in enumerate(hash_file_name):
-    if character == '_':
-        uscore_counter += 1
 
-    if uscore_counter == 2:
-        file_name = hash_file_name[:index]
-        break
+# returns the output file name for an input file, the name up to its second underscore (where the hash starts)
+# with '_1.csv' added, or for a name without a hash the whole name with '_1' added before the extension
+def get_output_file_name(input_file):
+    hash_file_name = os.path.basename(input_file)
 
+    uscore_counter = 0
+    file_name = 'no name'
+    for index, character in enumerate(hash_file_name):
+        if character == '_':
+            uscore_counter += 1
 
-if file_name != 'no name':
-    input_file_name = file_name + '.csv'
-    output_file_name = file_name + '_1.csv'
-else:
-    input_file_name = hash_file_name
-    output_file_name = hash_file_name[:-4] + '_1' + hash_file_name[-4:]
-
-# in file
-in_csv_file = open(args.Input, 'r')
+        if uscore_counter == 2:
+            file_name = hash_file_name[:index]
+            break
 
-# out file
-output_file = os.path.join(args.Temp, output_file_name)
-out_csv_file = open(output_file, 'w')
+    if file_name != 'no name':
+        output_file_name = file_name + '_1.csv'
+    else:
+        output_file_name = hash_file_name[:-4] + '_1' + hash_file_name[-4:]
 
+    return output_file_name
 
-# returns the indexs of all DOUBLE quotes in the input_row
-def get_range(input_row):
-    indexes = []
-    my_index = 0
-    start = 0
-    while True:
-        my_index = input_row.find("\"", start)
-        # ends loop if no more single quotes
-        if my_index == -1:
-            break
-        indexes.append(my_index)
-        start = my_index + 1
 
-    return indexes
+chunk_size = 1 << 20  # characters read & scrubbed at a time
 
 
-def find_n_replace(input_row):
+# scrubs the quoted spans of a chunk of the file, where inside_quotes is whether the chunk starts inside a quoted span
+# (a span can run on from the chunk before), returning the scrubbed chunk & whether it ends inside a quoted span
+#
+# Splitting the chunk on double quotes gives the text between each quote & the next, which is alternately outside &
+# inside a quoted span, so one pass over the chunk finds every span. Inside a span commas become spaces (so they are
+# no longer delimiters), as do line breaks (so a quoted value spanning lines stays in its row), & the quotes are
+# dropped.
+def scrub_chunk(chunk, inside_quotes):
+    spans = chunk.split('"')
+    first_inside = 0 if inside_quotes else 1
 
-    # get affected ranges
-    edit_range = get_range(input_row)
-    instances = len(edit_range)
+    for index in range(first_inside, len(spans), 2):
+        spans[index] = spans[index].replace(',', ' ').replace('\n', ' ')
 
-    for i in range(0, int(instances), 2):
-        substring = input_row[edit_range[i]:edit_range[i+1]+1]
-        substring = substring.replace(",", " ")
-        substring = substring.replace("\"", "")
+    return ''.join(spans), inside_quotes != (len(spans) % 2 == 0)
 
-        input_row = input_row[:edit_range[i]] + substring + input_row[edit_range[i+1]+1:]
 
-    return input_row
+# copies the csv to the output file, scrubbing quoted spans, a chunk at a time, returning the lines read & written and
+# the seconds spent reading, scrubbing & writing
+def scrub_file(in_csv_file, out_csv_file):
+    inside_quotes = False
+    stats = {'input_lines': 0, 'output_lines': 0, 'read_seconds': 0.0, 'scrub_seconds': 0.0, 'write_seconds': 0.0}
 
+    while True:
+        start = time.perf_counter()
+        chunk = in_csv_file.read(chunk_size)
+        if not chunk:
+            break
 
-# copy csv to output file
-for row in in_csv_file:
-    row = find_n_replace(row)
-    out_csv_file.write(row)
-
-out_csv_file.close()
+        scrub_start = time.perf_counter()
+        stats['input_lines'] += chunk.count('\n')
+        chunk, inside_quotes = scrub_chunk(chunk, inside_quotes)
+        stats['output_lines'] += chunk.count('\n')
+
+        write_start = time.perf_counter()
+        out_csv_file.write(chunk)
+
+        stats['read_seconds'] += scrub_start - start
+        stats['scrub_seconds'] += write_start - scrub_start
+        stats['write_seconds'] += time.perf_counter() - write_start
+
+    return stats
+
+
+# scrubs one input file into its output file in the --Temp folder (runs in a worker process if --Workers > 1),
+# returning the stats of scrub_file with the size of the input file & an error message, None if it was scrubbed. A file
+# that can't be read or written (e.g. it isn't text in the system encoding) leaves no output file, & the rest of a
+# batch is still scrubbed.
+def scrub_input_file(input_file, output_file):
+
+    try:
+        # in file & out file
+        with open(input_file, 'r', buffering=chunk_size) as in_csv_file, \
+                open(output_file, 'w', buffering=chunk_size) as out_csv_file:
+            stats = scrub_file(in_csv_file, out_csv_file)
+
+        stats['input_bytes'] = os.path.getsize(input_file)
+        stats['error'] = None
+
+    except (OSError, ValueError) as e:
+        try:
+            os.remove(output_file)
+        except OSError:
+            pass
+
+        stats = {'input_lines': 0, 'output_lines': 0, 'read_seconds': 0.0, 'scrub_seconds': 0.0,
+                 'write_seconds': 0.0, 'input_bytes': 0, 'error': input_file + ': ' + str(e)}
+
+    return stats
+
+
+# returns the peak memory in MB of this process or of its largest worker process, or None where it isn't known (Windows)
+def get_peak_memory():
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # ru_maxrss is in KB, but in bytes on macOS
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) \
+        / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+# writes one JSON run report for the run, the stats of its files summed, to sink, - for the console or a file it is
+# appended to, with the same keys as the run reports of the UnaVista converters (values not measured here are null)
+def output_run_report(sink, started, seconds, file_stats, error=None):
+    input_lines = sum(stats['input_lines'] for stats in file_stats)
+    output_lines = sum(stats['output_lines'] for stats in file_stats)
+
+    report = {'tool': 'RufferTransaction', 'client': 'Ruffer', 'started': started, 'input': args.Input,
+              'input_bytes': sum(stats['input_bytes'] for stats in file_stats), 'output': args.Temp,
+              'files': len(file_stats), 'tx': input_lines, 'newt': None, 'canc': None,
+              'filtered': input_lines - output_lines,
+              'parse_seconds': sum(stats['read_seconds'] for stats in file_stats),
+              'map_seconds': sum(stats['scrub_seconds'] for stats in file_stats),
+              'write_seconds': sum(stats['write_seconds'] for stats in file_stats),
+              'seconds': seconds, 'peak_memory_mb': get_peak_memory(),
+              'rows_per_sec': output_lines / seconds if seconds else None, 'error': error}
+
+    if sink == '-':
+        print(json.dumps(report))
+    else:
+        with open(sink, 'a', encoding='utf-8') as report_file:
+            report_file.write(json.dumps(report) + '\n')
+
+
+if __name__ == '__main__':
+    started = datetime.datetime.now().isoformat(timespec='seconds')
+    start_time = time.perf_counter()
+
+    file_stats = []
+    errors = []
+
+    # the run report is written however the run ends, with what went wrong as its error
+    try:
+        # a folder (its .csv files) or wildcard pattern is a batch of input files, converted in file name order
+        if os.path.isdir(args.Input):
+            input_files = sorted(os.path.join(args.Input, f) for f in os.listdir(args.Input)
+                                 if f.lower().endswith('.csv') and os.path.isfile(os.path.join(args.Input, f)))
+        elif glob.has_magic(args.Input):
+            input_files = sorted(f for f in glob.glob(args.Input) if os.path.isfile(f))
+        else:
+            input_files = [args.Input]
+
+        input_outputs = [(input_file, os.path.join(args.Temp, get_output_file_name(input_file)))
+                         for input_file in input_files]
+
+        # in a batch, an input file that is also one of the output files (an earlier output, when --Temp is the input
+        # folder) is not converted, it is about to be written over
+        if len(input_outputs) > 1:
+            batch_outputs = {os.path.abspath(output_file) for input_file, output_file in input_outputs}
+            input_outputs = [(input_file, output_file) for input_file, output_file in input_outputs
+                             if os.path.abspath(input_file) not in batch_outputs]
+
+        # when input files share an output file only the last of them is converted, as converting them one at a time
+        # would leave its output
+        output_files = {}
+        for input_file, output_file in input_outputs:
+            if output_file in output_files and args.warn:
+                print('Warning: ' + output_files[output_file] + ' and ' + input_file + ' have the same output file, only '
+                      + input_file + ' is converted')
+            output_files[output_file] = input_file
+
+        batch_files = [(input_file, output_file) for output_file, input_file in output_files.items()]
+
+        if args.Workers > 1 and len(batch_files) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=args.Workers) as executor:
+                file_stats = list(executor.map(scrub_input_file, *zip(*batch_files)))
+        else:
+            file_stats = [scrub_input_file(input_file, output_file) for input_file, output_file in batch_files]
+
+        errors = [stats['error'] for stats in file_stats if stats['error'] is not None]
+        for error in errors:
+            print('Failed: ' + error)
+
+    except BaseException as e:
+        errors.append(type(e).__name__ + ': ' + str(e))
+        raise
+
+    finally:
+        if args.Report is not None:
+            output_run_report(args.Report, started, time.perf_counter() - start_time, file_stats,
+                              '; '.join(errors) if errors else None)
+
+    # a batch with a file that failed exits with an error, as a run on that file alone does
+    if errors:
+        sys.exit(1)
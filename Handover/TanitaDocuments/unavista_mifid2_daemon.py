@@ -0,0 +1,297 @@
+"""
+unavista_mifid2_daemon.py
+
+Long-running UnaVista MIFID 2 converter for use by Gaspode. The daemon keeps unavista_mifid2_xml2csv.py imported
+(with its New block plan compiled) between files, so a wrapper handing it a file waits for the conversion only,
+not for Python to start & import the converter.
+
+Command line usage is as follows:
+
+    python unavista_mifid2_daemon.py [ -address {address} ] [ -stop ]
+
+with:
+
+    * {address}     Path of the Unix domain socket the daemon listens on (default daemon.sock in the daemon
+                    folder), or on Windows the 127.0.0.1 port it listens on (default 47816)
+
+    * -stop         Stop the daemon listening at {address}, instead of starting one
+
+The daemon folder is unavista_mifid2_xml2csv-{user id} in the temporary folder, or unavista_mifid2_xml2csv in the
+user's local application data folder on Windows, & only the user running the daemon may use it (mode 0700). Each
+time the daemon starts it writes a new random key to daemon.key in the folder.
+
+A job is one line each way, the HMAC-SHA256 of a line's JSON under the key, a space & the JSON. The wrapper sends
+{"Input": path, "Temp": path, "options": {...}, "nonce": text}, the options being those of convert() in
+job_options, & the daemon replies {"output": path, "transactions": n, "filtered": n, "log": text, "error": message or
+null}, log being whatever the converter printed. A reply's HMAC also covers the request's, so a wrapper only takes a
+reply from the daemon it sent the job to. Requests without a valid HMAC are dropped, so other users (& on Windows,
+where the daemon listens on a port any local process can connect to, other users' processes) can't hand the daemon
+jobs. A job can't set -profile, & -report only as - (the report is passed back in the log). Jobs are converted one
+at a time, in the order they arrive.
+
+unavista_mifid2_wrapper.py hands its file to the daemon when one is listening at the default address, & converts
+it in-process otherwise.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import hmac
+import io
+import json
+import os
+import secrets
+import socket
+import stat
+import sys
+import tempfile
+import traceback
+
+default_port = 47816
+request_timeout = 10  # seconds a connection may take to send its request
+max_request_bytes = 1 << 16  # longest request line
+
+# the convert() options a job may set, -profile would write a file anywhere & -report only goes to the log
+job_options = {'stream', 'workers', 'parser', 'out_format', 'warn', 'report'}
+
+
+# returns the daemon folder holding the socket & key, which only the user may use. With create, it's made if it
+# doesn't exist. Raises OSError if it isn't a folder of the user's, or others may use it (not checked on Windows,
+# where the folder is in the user's own profile)
+def get_daemon_dir(create=False):
+
+    if hasattr(os, 'getuid'):
+        daemon_dir = os.path.join(tempfile.gettempdir(), 'unavista_mifid2_xml2csv-' + str(os.getuid()))
+    else:
+        daemon_dir = os.path.join(os.environ.get('LOCALAPPDATA') or os.path.expanduser('~'), 'unavista_mifid2_xml2csv')
+
+    if create and not os.path.lexists(daemon_dir):
+        os.mkdir(daemon_dir, 0o700)
+
+    if hasattr(os, 'getuid'):
+        # NOTE: lstat, so a link planted in the temporary folder isn't followed
+        dir_stat = os.lstat(daemon_dir)
+        if not stat.S_ISDIR(dir_stat.st_mode) or dir_stat.st_uid != os.getuid() or dir_stat.st_mode & 0o077:
+            raise OSError(daemon_dir + ' is not a folder only this user may use')
+
+    return daemon_dir
+
+
+# returns the socket family & address to listen at or connect to, a Unix domain socket path where the OS has them
+# (Python on Windows doesn't), else a port on the loopback interface
+def get_address(address=None):
+
+    if hasattr(socket, 'AF_UNIX'):
+        return socket.AF_UNIX, address or os.path.join(get_daemon_dir(), 'daemon.sock')
+
+    return socket.AF_INET, ('127.0.0.1', int(address or default_port))
+
+
+# returns the key of the running daemon, or None if there's no key to read
+def read_key():
+
+    try:
+        with open(os.path.join(get_daemon_dir(), 'daemon.key'), 'rb') as key_file:
+            return bytes.fromhex(key_file.read().decode('ascii'))
+    except (OSError, ValueError):
+        return None
+
+
+# returns the HMAC of data under the key, as hex
+def sign(key, data):
+
+    return hmac.new(key, data, hashlib.sha256).hexdigest().encode('ascii')
+
+
+# sends a job to the daemon & returns its reply, or None if no daemon is listening at the address (or the reply
+# isn't signed by it)
+def send_request(request, address=None):
+
+    key = read_key()
+    if key is None:
+        return None
+
+    family, sock_address = get_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+
+    try:
+        sock.connect(sock_address)
+    except OSError:
+        sock.close()
+        return None
+
+    request_json = json.dumps(dict(request, nonce=secrets.token_hex(16))).encode('utf-8')
+    request_mac = sign(key, request_json)
+
+    with sock, sock.makefile('rwb') as sock_file:
+        sock_file.write(request_mac + b' ' + request_json + b'\n')
+        sock_file.flush()
+
+        reply = sock_file.readline()
+
+    reply_mac, _, reply_json = reply.rstrip(b'\n').partition(b' ')
+    if not hmac.compare_digest(reply_mac, sign(key, request_mac + reply_json)):
+        return None
+
+    return json.loads(reply_json)
+
+
+# hands a file to the daemon to convert, as unavista_mifid2_xml2csv.convert(in_xml, out_csv, **options), returning
+# the reply or None if no daemon is listening (the paths are made absolute, the daemon has its own working folder)
+def send_job(in_xml, out_csv, options=None, address=None):
+
+    return send_request({'Input': os.path.abspath(in_xml), 'Temp': os.path.abspath(out_csv), 'options': options or {}},
+                        address)
+
+
+# returns why a job can't be converted, or None if it can
+def check_job(request):
+
+    if not isinstance(request.get('Input'), str) or not isinstance(request.get('Temp'), str):
+        return 'a job needs Input & Temp paths'
+
+    options = request.get('options', {})
+    if not isinstance(options, dict):
+        return 'a job\'s options must be an object'
+
+    not_allowed = sorted(set(options) - job_options)
+    if not_allowed:
+        return 'a job may not set ' + ', '.join(not_allowed)
+
+    if options.get('report', '-') != '-':
+        return 'a job\'s report can only be -, the report is passed back in the log'
+
+    return None
+
+
+# converts one job, capturing what the converter prints (& argparse's errors) so it's passed back to the wrapper
+def run_job(converter, request):
+
+    reply = {'output': None, 'transactions': 0, 'filtered': 0, 'log': '', 'error': check_job(request)}
+    if reply['error'] is not None:
+        return reply
+
+    log = io.StringIO()
+
+    with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            reply['output'] = converter.convert(request['Input'], request['Temp'], **request.get('options', {}))
+            reply['transactions'] = converter.counter
+            reply['filtered'] = converter.filter_counter
+
+        # NOTE: argparse reports bad options with SystemExit, which mustn't stop the daemon
+        except (Exception, SystemExit):
+            reply['error'] = traceback.format_exc()
+
+    reply['log'] = log.getvalue()
+
+    return reply
+
+
+# listens at the address, converting each job received until asked to stop
+def serve(address=None):
+
+    # NOTE: the converter is only imported by the daemon, the wrappers talking to it never pay for the import
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import unavista_mifid2_xml2csv
+
+    try:
+        daemon_dir = get_daemon_dir(create=True)
+    except OSError as error:
+        print(error)
+        exit(1)
+
+    family, sock_address = get_address(address)
+
+    if send_request({'ping': True}, address) is not None:
+        print('A daemon is already listening at ' + str(sock_address))
+        exit(1)
+
+    # a socket file left by a daemon that didn't stop cleanly
+    if family == socket.AF_UNIX and os.path.lexists(sock_address):
+        os.remove(sock_address)
+
+    # a new key for each daemon, readable by the user only
+    key = secrets.token_bytes(32)
+    key_path = os.path.join(daemon_dir, 'daemon.key')
+    if os.path.lexists(key_path):
+        os.remove(key_path)
+    with os.fdopen(os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'w') as key_file:
+        key_file.write(key.hex())
+
+    server = socket.socket(family, socket.SOCK_STREAM)
+
+    # only the user running the daemon may connect, the socket is made with mode 0600 (not chmod-ed after binding)
+    if family == socket.AF_UNIX:
+        old_umask = os.umask(0o177)
+        try:
+            server.bind(sock_address)
+        finally:
+            os.umask(old_umask)
+    else:
+        server.bind(sock_address)
+
+    server.listen()
+    print('Listening at ' + str(sock_address), flush=True)
+
+    try:
+        while True:
+            sock, _ = server.accept()
+
+            # a wrapper that goes away mid job loses its reply (& a garbled, unsigned, overlong or slow request
+            # gets none), the daemon carries on
+            try:
+                # NOTE: the timeout also bounds writing the reply, not the conversion, which makes no socket calls
+                sock.settimeout(request_timeout)
+
+                with sock, sock.makefile('rwb') as sock_file:
+                    request = sock_file.readline(max_request_bytes)
+                    if not request.endswith(b'\n'):
+                        continue
+
+                    request_mac, _, request_json = request.rstrip(b'\n').partition(b' ')
+                    if not hmac.compare_digest(request_mac, sign(key, request_json)):
+                        continue
+
+                    request = json.loads(request_json)
+                    if not isinstance(request, dict):
+                        continue
+
+                    if request.get('stop'):
+                        reply = {}
+                    elif request.get('ping'):
+                        reply = {}
+                    else:
+                        reply = run_job(unavista_mifid2_xml2csv, request)
+                        print(str(request.get('Input')) + ' -> ' + str(reply['output']) + ' ('
+                              + str(reply['transactions']) + ' transactions)'
+                              + ('' if reply['error'] is None else ' failed'), flush=True)
+
+                    reply_json = json.dumps(reply).encode('utf-8')
+                    sock_file.write(sign(key, request_mac + reply_json) + b' ' + reply_json + b'\n')
+
+                    if request.get('stop'):
+                        break
+
+            except (OSError, ValueError):
+                pass
+
+    finally:
+        server.close()
+        if family == socket.AF_UNIX:
+            os.remove(sock_address)
+        os.remove(key_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="UnaVista MIFID 2 converter daemon used by Gaspode")
+    parser.add_argument('-address', help='Unix domain socket path, or 127.0.0.1 port on Windows, of the daemon')
+    parser.add_argument('-stop', help='Stop the daemon listening at the address', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.stop:
+        if send_request({'stop': True}, args.address) is None:
+            print('No daemon is listening' + (' at ' + args.address if args.address else ''))
+    else:
+        serve(args.address)
@@ -0,0 +1,240 @@
+"""
+unavista_mifid2_watch.py
+
+Watches an inbox folder & converts each UnaVista MIFID 2 XML file that lands in it with unavista_mifid2_xml2csv.py,
+in a pool of worker processes, instead of a scheduler polling the folder & starting a wrapper for each file.
+
+Command line usage is as follows:
+
+    python unavista_mifid2_watch.py -inbox {inbox_path} -out-dir {out_path} [ optional arguments ... ]
+
+with:
+
+    * {inbox_path}  Folder the XML files land in
+
+    * {out_path}    Folder the output files are written to, one python_processed_{XML file name}.csv for each file
+
+and optional keyword arguments as follows:
+
+    * -done {path}      Folder converted XML files are moved to (default {inbox_path}/done)
+    * -failed {path}    Folder XML files that can't be converted are moved to (default {inbox_path}/failed)
+
+    * -workers {n}      Number of files converted at the same time (default 1)
+    * -settle {s}       Seconds a file's size & modified time must stay the same before it's taken as completely
+                        written (default 1)
+    * -poll {s}         Seconds between looks at the inbox when the watchdog package isn't installed (default 1)
+    * -once             Convert the files in the inbox & exit, instead of watching it
+
+    * -parser {p}       XML parser, as for unavista_mifid2_xml2csv.py
+    * -out-format {f}   Output file format, as for unavista_mifid2_xml2csv.py
+    * -stream           Stream each XML file, as for unavista_mifid2_xml2csv.py
+
+With the watchdog package installed (pip install watchdog) a file landing in the inbox is noticed straight away,
+through inotify on Linux or the equivalent on Windows & macOS. Otherwise the inbox is looked at every -poll seconds.
+
+A file that isn't UnaVista XML still gets its INVALID_XML output file, as from the converter, but is moved to the
+failed folder. A file that can't be moved to the done or failed folder is left in the inbox & isn't converted
+again until it changes. Press Ctrl+C to stop watching.
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import unavista_mifid2_xml2csv
+
+try:
+    import watchdog.events
+    import watchdog.observers
+except ImportError:
+    watchdog = None
+
+# NOTE: with watchdog the inbox is still looked at this often, in case an event is missed
+watchdog_poll = 30
+
+
+# converts one XML file into out_dir (runs in a worker process), returning the output file, the number of
+# transactions, whether the file was invalid XML & what the converter printed
+def convert_file(xml_file, out_dir, options):
+
+    xml_name = os.path.splitext(os.path.basename(xml_file))[0]
+    log = io.StringIO()
+
+    # NOTE: the converter names its output file by the second it was written, so each file is converted in a folder
+    # of its own & its output renamed after the XML file
+    job_dir = tempfile.mkdtemp(prefix='.watch_', dir=out_dir)
+
+    try:
+        job_out_csv = os.path.join(job_dir, 'python_processed_' + xml_name + '.csv')
+
+        with contextlib.redirect_stdout(log):
+            output_file = unavista_mifid2_xml2csv.convert(xml_file, job_out_csv, **options)
+
+        out_file = os.path.join(out_dir, 'python_processed_' + xml_name + os.path.splitext(output_file)[1])
+        os.replace(output_file, out_file)
+
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+    return out_file, unavista_mifid2_xml2csv.counter, output_file == job_out_csv, log.getvalue()
+
+
+# moves a converted XML file out of the inbox into folder, returning None, or the file's (size, modified time) if it
+# can't be moved (it stays in the inbox & isn't converted again until it changes)
+def move_file(xml_file, folder):
+
+    try:
+        os.replace(xml_file, os.path.join(folder, os.path.basename(xml_file)))
+    except OSError as e:
+        print('Could not move ' + xml_file + ' to ' + folder + ': ' + str(e) + ', it is left in the inbox and not '
+              'converted again until it changes', flush=True)
+        try:
+            xml_stat = os.stat(xml_file)
+        except OSError:
+            return None
+        return xml_stat.st_size, xml_stat.st_mtime_ns
+
+    return None
+
+
+# returns the XML files in the inbox, keyed by path, with their size & modified time
+def scan_inbox(inbox):
+
+    inbox_files = {}
+
+    with os.scandir(inbox) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith('.xml') and entry.is_file():
+                entry_stat = entry.stat()
+                inbox_files[entry.path] = (entry_stat.st_size, entry_stat.st_mtime_ns)
+
+    return inbox_files
+
+
+def watch(args):
+
+    options = {'parser': args.parser, 'out_format': args.out_format, 'stream': args.stream}
+
+    for folder in (args.out_dir, args.done, args.failed):
+        os.makedirs(folder, exist_ok=True)
+
+    # set whenever the inbox changes or a conversion finishes, so the inbox is looked at again straight away
+    wake_up = threading.Event()
+    observer = None
+
+    if watchdog is not None and not args.once:
+        inbox_handler = watchdog.events.FileSystemEventHandler()
+        inbox_handler.on_any_event = lambda event: wake_up.set()
+        observer = watchdog.observers.Observer()
+        observer.schedule(inbox_handler, args.inbox)
+        observer.start()
+
+    poll = args.poll if observer is None else watchdog_poll
+
+    waiting_files = {}  # (size, modified time) of each file not yet converted & when it was first seen unchanged
+    running_files = {}  # XML file of each conversion running, keyed by its future
+    stuck_files = {}  # (size, modified time) of each converted file that couldn't be moved out of the inbox
+    counter = 0
+    failed_counter = 0
+
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=args.workers)
+
+    try:
+        while True:
+            wake_up.clear()
+            now = time.monotonic()
+
+            # a file is converted once it's stayed the same for -settle seconds, & a worker is free
+            inbox_files = scan_inbox(args.inbox)
+            stuck_files = {xml_file: stats for xml_file, stats in stuck_files.items()
+                           if inbox_files.get(xml_file) == stats}
+            waiting_files = {xml_file: waiting_files[xml_file] if waiting_files.get(xml_file, (None,))[0] == stats
+                             else (stats, now) for xml_file, stats in inbox_files.items()
+                             if xml_file not in running_files.values() and xml_file not in stuck_files}
+
+            for xml_file, (stats, since) in sorted(waiting_files.items(), key=lambda item: item[1][1]):
+                if len(running_files) >= args.workers:
+                    break
+
+                if now - since >= args.settle:
+                    future = executor.submit(convert_file, xml_file, args.out_dir, options)
+                    future.add_done_callback(lambda future: wake_up.set())
+                    running_files[future] = xml_file
+                    del waiting_files[xml_file]
+
+            for future in [future for future in running_files if future.done()]:
+                xml_file = running_files.pop(future)
+
+                try:
+                    out_file, transactions, invalid_xml, log = future.result()
+                except Exception as e:
+                    print(xml_file + ' failed: ' + repr(e), flush=True)
+                    stats = move_file(xml_file, args.failed)
+                    failed_counter += 1
+
+                else:
+                    if invalid_xml:
+                        print(xml_file + ' failed: ' + log.strip().replace('\n', ' ') + ' -> ' + out_file,
+                              flush=True)
+                        stats = move_file(xml_file, args.failed)
+                        failed_counter += 1
+                    else:
+                        print(xml_file + ' -> ' + out_file + ' (' + str(transactions) + ' transactions)', flush=True)
+                        stats = move_file(xml_file, args.done)
+                        counter += 1
+
+                if stats is not None:
+                    stuck_files[xml_file] = stats
+
+            if args.once and not waiting_files and not running_files:
+                break
+
+            # look again when a waiting file could have settled, or after -poll seconds (sooner if woken)
+            timeout = poll
+            for stats, since in waiting_files.values():
+                timeout = min(timeout, max(since + args.settle - now, 0.05))
+
+            wake_up.wait(timeout)
+
+    except KeyboardInterrupt:
+        print('Stopping, waiting for the conversions running to finish ..', flush=True)
+
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        executor.shutdown(cancel_futures=True)
+
+    print('Files converted: ', counter)
+    print('Files failed: ', failed_counter)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="UnaVista MIFID 2 inbox watcher")
+    parser.add_argument('-inbox', required=True, help='folder the XML files land in')
+    parser.add_argument('-out-dir', required=True, help='folder the output files are written to')
+    parser.add_argument('-done', help='folder converted XML files are moved to (default {inbox}/done)')
+    parser.add_argument('-failed', help='folder XML files that fail are moved to (default {inbox}/failed)')
+    parser.add_argument('-workers', type=int, default=1, help='number of files converted at a time (default 1)')
+    parser.add_argument('-settle', type=float, default=1.0,
+                        help='seconds a file must stay unchanged before it is converted (default 1)')
+    parser.add_argument('-poll', type=float, default=1.0,
+                        help='seconds between looks at the inbox without the watchdog package (default 1)')
+    parser.add_argument('-once', help='convert the files in the inbox & exit', action='store_true')
+    parser.add_argument('-parser', choices=['etree', 'lxml'], default='etree', help='XML parser (default etree)')
+    parser.add_argument('-out-format', choices=['csv', 'parquet'], default='csv',
+                        help='output file format (default csv)')
+    parser.add_argument('-stream', help='Stream Tx blocks one at a time', action='store_true')
+
+    args = parser.parse_args()
+    args.done = args.done or os.path.join(args.inbox, 'done')
+    args.failed = args.failed or os.path.join(args.inbox, 'failed')
+
+    watch(args)
@@ -23,7 +23,14 @@ in which command options & their corresponding arguments are as follows:
         Pathname of Temporary output file
         (specified by Gaspode, & directory part used by script
 
-The script simply runs the unavista_mifid2_xml2csv.py script with suitable command options & arguments.
+    * --Report {sink}
+
+        Where the converter writes its JSON run report, - for the console or the pathname of a file it is
+        appended to (optional, default no report)
+
+The script simply runs the unavista_mifid2_xml2csv.py script's convert() in this process with suitable
+arguments, so no second Python interpreter is started for each file. If unavista_mifid2_daemon.py is running the
+file is handed to it instead, & the converter isn't even imported here.
 """
 
 import os
@@ -33,21 +40,48 @@ import sys
 
 sys.path.append('.')
 
+# the converter & daemon client are imported from the folder of this script
+sys.path.insert(0, os.path.dirname(os.path.abspath(sys.argv[0])))
+import unavista_mifid2_daemon
+
 parser = argparse.ArgumentParser(description="UnaVista MIFID 2 master script used by Gaspode")
 
 parser.add_argument('--Input',  help='Filename of Input XML file (specified by Gaspode)')
 parser.add_argument('--Output', help='Leave blank, (specified by Gaspode)')
 parser.add_argument('--Temp',   help='Output file directory, path used by Gaspode')
+parser.add_argument('--Report', help='JSON run report, - for the console or a file to append to (default none)')
 
 args = parser.parse_args()
 
 
-def run_os_command(cmd_line):
+def run_convert(in_xml, out_csv, report=None):
 
-    print(cmd_line + "\r\n")
+    print('unavista_mifid2_xml2csv.convert("' + in_xml + '", "' + out_csv + '")' + "\r\n")
+
+    options = {} if report is None else {'report': report}
 
     try:
-        os.system('"' + cmd_line + '"')
+        # the daemon only writes a report to its log, so the report is taken from the log here for a report file
+        reply = unavista_mifid2_daemon.send_job(in_xml, out_csv, {} if report is None else {'report': '-'})
+
+        # NOTE: the converter is only imported when no daemon is running to convert the file
+        if reply is None:
+            import unavista_mifid2_xml2csv
+            unavista_mifid2_xml2csv.convert(in_xml, out_csv, **options)
+
+        else:
+            log_lines = reply['log'].splitlines(keepends=True)
+
+            if report is not None and report != '-':
+                report_lines = [line for line in log_lines if line.startswith('{"tool": ')]
+                with open(report, 'a', encoding='utf-8') as report_file:
+                    report_file.writelines(report_lines)
+                log_lines = [line for line in log_lines if line not in report_lines]
+
+            print(''.join(log_lines), end='')
+
+            if reply['error'] is not None:
+                raise RuntimeError(reply['error'])
 
     except Exception as e:
         if hasattr(e, 'message'):
@@ -58,13 +92,6 @@ def run_os_command(cmd_line):
         exit(-1)
 
 
-# python executable path
-python_path = sys.executable
-
-# script_dir
-script_dir = os.path.dirname(sys.argv[0])
-script_path = os.path.join(script_dir, 'unavista_mifid2_xml2csv.py')
-
 mm = re.match(r'(.*)\.xml', args.Input)
 if mm is None:
     print('Input file "' + path_in_xml + '" is not an XML file!')
@@ -72,8 +99,7 @@ if mm is None:
 
 path_temp = args.Temp if re.match(r'.*\.csv$', args.Temp) is None else os.path.dirname(args.Temp)
 
-run_os_command('"' + python_path + '" "' + script_path + '" -in-xml "' + args.Input
-               + '" -out-csv "' + args.Temp)
+run_convert(args.Input, args.Temp, args.Report)
 
 print("exiting unavista_mifid2_convert.py (after running unavista_mifid2_xml2csv.py) ..")
 exit(0)
@@ -22,6 +22,56 @@ and optional keyword arguments, in mutually exclusive groups, as follows:
     * -warn         Display warnings (default)
     * -no-warn      Supress warnings
 
+    * -stream       Stream the XML file, converting & freeing one Tx block at a time
+    * -no-stream    Parse the whole XML file before converting (default)
+
+    * -workers {n}  Number of worker processes (default 1)
+
+    * -parser {p}   XML parser, etree (xml.etree.ElementTree, the default) or lxml (needs the lxml package)
+
+    * -out-format {f}   Output file format, csv (the default) or parquet (needs the pyarrow package)
+
+    * -profile {path}   Time & count each section of the New block conversion & each xml_find* call, printing a
+                        summary table and writing a JSON report to {path} (default no profiling)
+
+    * -report {sink}    Write a JSON run report, one line, to {sink}: - for the console (in place of the transaction
+                        counts printed otherwise) or the path of a file it is appended to (default no report)
+
+The run report holds the input file (or folder) & its size in bytes, the output file, the numbers of Tx blocks, NEWT &
+CANC rows & Tx blocks filtered out, the seconds spent parsing, mapping & writing and in total, the peak memory in MB
+(none on Windows) and the output rows per second. parse_seconds is null when the XML is parsed as it is converted, in
+a folder or by worker processes, and the map_seconds then include the parsing.
+
+With -out-format parquet the output file is python_processed_{date}{time}.parquet, with the same columns as the CSV
+file. trnsc_qty_val, trnsc_prc_val & trnsc_net_amt are doubles and trnsc_datetime a UTC timestamp (a time without
+a zone offset is taken as UTC), all other columns are strings. A value that isn't a number or a date time is a null,
+with a warning unless -no-warn.
+
+When {in_XML_path} is a folder, every file in it is converted (in file name order) into the one output CSV file,
+one file per worker process. A single XML file is split into byte ranges of whole Tx blocks, one range per worker.
+
+The script can also be imported & run in-process, which saves starting a second interpreter for each file:
+
+    import unavista_mifid2_xml2csv
+    unavista_mifid2_xml2csv.convert(in_XML_path, out_CSV_path, workers=4, out_format='parquet')
+
+with the optional keyword arguments named as the options above (stream, workers, parser, out_format, profile, report,
+warn).
+
+An XML file that can't be converted gets an INVALID_XML output file at {out_CSV_path} instead, the header row & one
+diagnostic row. The first six columns of that row hold the diagnostics, not the fields their headers name:
+
+    report_status       INVALID_XML
+    trans_ref_no        an excerpt of the XML, at most 400 bytes around the first parse error, or from the start of
+                        the Tx block at fault (from the start of the file if neither is known)
+    trans_id_code       the error message
+    entity_id_code      the line of the parse error or of the start of the Tx block at fault
+    cover_201465eu      the column of the parse error or of the start of the Tx block at fault
+    buy_acct_id_type    the number of the Tx block at fault
+
+and the other columns are empty. The XML file is streamed to find the parse error, so a bad file of any size is
+reported without reading it into memory.
+
 Any command line argument containing spaces, hyphens, or commas (and, depending on the OS,
 other reserved characters) must be quoted. If in doubt, quote the argument!
 
@@ -29,23 +79,71 @@ other reserved characters) must be quoted. If in doubt, quote the argument!
 
 import codecs
 import argparse
+import concurrent.futures
 import csv
+import itertools
 import re
 import os
+import sys
+import mmap
 import xml.etree.ElementTree as ElemTree
+from xml.parsers import expat
 import datetime
+import json
+import linecache
 import time
 
+try:
+    import lxml.etree as LxmlTree
+except ImportError:
+    LxmlTree = None
+
 parser = argparse.ArgumentParser(description="UnaVista MIFID 2 XML to CSV column converter")
 parser.add_argument('-in-xml', help='pathname of input XML text file or folder')
 parser.add_argument('-out-csv', help='path of output CSV text file (no name, this is auto set')
+parser.add_argument('-workers', type=int, default=1, help='number of worker processes (default 1)')
+parser.add_argument('-parser', choices=['etree', 'lxml'], default='etree',
+                    help='XML parser, lxml needs the lxml package (default etree)')
+parser.add_argument('-out-format', choices=['csv', 'parquet'], default='csv',
+                    help='output file format, parquet needs the pyarrow package (default csv)')
+parser.add_argument('-profile', help='pathname of a JSON report timing each section of the conversion (default none)')
+parser.add_argument('-report', help='where to write a JSON run report, - for the console or a file to append to')
 
 parser_warn = parser.add_mutually_exclusive_group(required=False)
 parser_warn.add_argument('-warn', dest='warn', help='Display warnings (default)', action='store_true')
 parser_warn.add_argument('-no-warn', dest='warn', help='Suppress warnings', action='store_false')
 parser.set_defaults(warn=True)
 
-args = parser.parse_args()
+parser_stream = parser.add_mutually_exclusive_group(required=False)
+parser_stream.add_argument('-stream', dest='stream', help='Stream Tx blocks one at a time', action='store_true')
+parser_stream.add_argument('-no-stream', dest='stream', help='Parse the whole XML file (default)', action='store_false')
+parser.set_defaults(stream=False)
+
+args = None  # options of the conversion, set by set_options from the command line or the convert() arguments
+XmlTree = ElemTree
+
+
+# sets the options of the conversion, in this process & (as the process pool initializer) in each worker process,
+# so workers run with the same options however they are started
+def set_options(options):
+
+    global args
+    global XmlTree
+    global xml_namespace_tag
+
+    if options.parser == 'lxml' and LxmlTree is None:
+        parser.error('-parser lxml needs the lxml package, pip install lxml')
+
+    # the New block plan & XPath expressions are built for the parser, so they're rebuilt for the next namespace set
+    if args is None or options.parser != args.parser:
+        xml_namespace_tag = None
+
+    args = options
+    set_profiling(args.profile is not None)
+
+    # NOTE: lxml.etree has the same parse / iterparse / fromstring & Element find API as ElementTree, so the rest of
+    # the script runs on either. Under lxml the New block plan & the trade filter use compiled XPath expressions.
+    XmlTree = LxmlTree if args.parser == 'lxml' else ElemTree
 
 '''
 Background Info
@@ -2039,6 +2137,8 @@ CSV columns
 '''
 
 xml_namespace_tag = None
+xml_tags = {}  # fully qualified tag names, '{urn:iso...}Tag', in xml_namespace_tag keyed by local tag name
+xml_xpaths = {}  # compiled lxml XPath expressions, with n: bound to xml_namespace_tag, keyed by expression
 
 delim = '|'  # pipe
 
@@ -2156,12 +2256,60 @@ ind_elig_cycle_event  = 81
 
 number_of_columns = 82
 
+empty_row = [''] * number_of_columns  # copied over the reused row buffer before each Tx is converted
+
+output_batch_rows = 1000  # rows converted before they are written out in one go
+output_buffer_size = 1 << 20  # bytes buffered by the output CSV file
+output_csv_file = None  # the output CSV file of the conversion running, opened by convert
 
-def xml_find(xml_ref, in_str):
+
+# sets the namespace of the tags looked up by the xml_* functions, dropping the qualified names of any other
+def set_xml_namespace_tag(namespace_tag):
 
     global xml_namespace_tag
+    global new_row_plan
+
+    if namespace_tag != xml_namespace_tag:
+        xml_namespace_tag = namespace_tag
+        xml_tags.clear()
+        xml_xpaths.clear()
+        new_row_plan = None  # set by compile_new_row_plan for the first New block in the namespace
+
+
+# returns the fully qualified name of a tag in xml_namespace_tag, built & interned once per namespace so lookups
+# don't concatenate a new string on every call
+def xml_tag(in_str):
+
+    tag = xml_tags.get(in_str)
 
-    return xml_ref.find(xml_namespace_tag + in_str)
+    if tag is None:
+        tag = xml_tags[in_str] = sys.intern(xml_namespace_tag + in_str)
+
+    return tag
+
+
+# returns an XPath expression compiled by lxml, in which the prefix n: stands for the namespace of xml_namespace_tag,
+# compiled once per namespace
+def xml_xpath(expr):
+
+    xpath = xml_xpaths.get(expr)
+
+    if xpath is None:
+        namespace = xml_namespace_tag[1:-1]
+        if namespace:
+            xpath = LxmlTree.XPath(expr, namespaces={'n': namespace})
+        else:
+            xpath = LxmlTree.XPath(expr.replace('n:', ''))
+        xml_xpaths[expr] = xpath
+
+    return xpath
+
+
+# NOTE: Element.find/findall take a direct scan of the children (no ElementPath parsing) for a plain qualified tag,
+# so all the xml_* lookups below pass one straight from xml_tags
+def xml_find(xml_ref, in_str):
+
+    return xml_ref.find(xml_tags.get(in_str) or xml_tag(in_str))
 
 
 # returns the tag name under the specified tag tree
@@ -2181,47 +2329,397 @@ def tag_from_tree(xml_ref, *tag_names):
 
 def xml_get(xml_ref, in_str, attr):
 
-    global xml_namespace_tag
-
-    xml_ref = xml_ref.find(xml_namespace_tag + in_str)
+    xml_ref = xml_ref.find(xml_tags.get(in_str) or xml_tag(in_str))
 
     return '' if xml_ref is None or xml_ref.attrib[attr] is None else xml_ref.attrib[attr]
 
 
 def xml_find_text(xml_ref, in_str):
 
-    global xml_namespace_tag
-
-    xml_ret = xml_ref.find(xml_namespace_tag + in_str)
+    xml_ret = xml_ref.find(xml_tags.get(in_str) or xml_tag(in_str))
 
     # Annoyingly, text for an empty block, such as <fred></fred> can return None instead of ""
     return '' if xml_ret is None or xml_ret.text is None else xml_ret.text
 
 
+# returns the text of a block that has already been found, so the same child isn't looked up again to read it
+def xml_text(xml_ref):
+
+    return '' if xml_ref is None or xml_ref.text is None else xml_ref.text
+
+
+# returns an attribute of a block that has already been found
+def xml_attrib(xml_ref, attr):
+
+    return '' if xml_ref is None or xml_ref.attrib[attr] is None else xml_ref.attrib[attr]
+
+
 # returns the content within a tag under the specified tag tree
 def get_tag_content(xml_ref, *tag_names):
 
     for tag_name in tag_names:
-        xml_tx_new_element = xml_find(xml_ref, tag_name)
-        xml_tx_new_content = xml_find_text(xml_ref, tag_name)
+        xml_ref = xml_find(xml_ref, tag_name)
 
-        xml_ref = xml_tx_new_element
-        if xml_tx_new_element is None or xml_tx_new_content is None:
+        if xml_ref is None:
             return ""
 
-    return xml_tx_new_content
+    return xml_text(xml_ref)
+
+
+# returns the id type held in the SchmeNm block of a person's Othr block, with NIDN reported as NIND
+def get_id_type(xml_schmenm):
+
+    if xml_schmenm is None:
+        return ''
+
+    xml_schmenm_cd = xml_find(xml_schmenm, 'Cd')
+    if xml_schmenm_cd is not None:
+        return 'NIND' if xml_text(xml_schmenm_cd) == 'NIDN' else xml_text(xml_schmenm_cd)
+
+    return xml_find_text(xml_schmenm, 'Prtry')
 
 
 def xml_findall(xml_ref, in_str):
 
-    global xml_namespace_tag
+    return xml_ref.findall(xml_tags.get(in_str) or xml_tag(in_str))
+
+
+# Profiling (-profile), [calls, seconds] of each section of the New block plan (see compile_new_row_plan) & of each
+# xml_find* helper, in this process. Workers hand theirs back with their rows, taken by profile_take.
+profile_sections = {}
+profile_helpers = {}
+profiled_helpers = {name: globals()[name] for name in ('xml_find', 'xml_find_text', 'xml_findall', 'xml_get',
+                                                        'get_tag_content')}
+
+
+# adds the time since start to a section of the New block plan, returning the time now as the next section's start
+def profile_add(section, start):
+
+    now = time.perf_counter()
+    stats = profile_sections.get(section)
+
+    if stats is None:
+        stats = profile_sections[section] = [0, 0.0]
+
+    stats[0] += 1
+    stats[1] += now - start
+
+    return now
+
+
+# returns an xml_find* helper wrapped to count & time its calls in profile_helpers
+def profile_helper(name, helper):
+
+    def profiled_helper(*helper_args):
+        start = time.perf_counter()
+        try:
+            return helper(*helper_args)
+        finally:
+            stats = profile_helpers.get(name)
+            if stats is None:
+                stats = profile_helpers[name] = [0, 0.0]
+            stats[0] += 1
+            stats[1] += time.perf_counter() - start
+
+    return profiled_helper
+
+
+# turns profiling on or off, swapping the xml_find* helpers for their profiled wrappers or back (the helpers are
+# called by name, so every caller picks the swap up) & dropping a New block plan compiled the other way
+def set_profiling(profiling):
+
+    global new_row_plan
+
+    if (globals()['xml_find'] is not profiled_helpers['xml_find']) != profiling:
+        for name, helper in profiled_helpers.items():
+            globals()[name] = profile_helper(name, helper) if profiling else helper
+        new_row_plan = None
+
+
+# returns & clears the profile of this process, as ({section: [calls, seconds]}, {helper: [calls, seconds]})
+def profile_take():
+
+    profile = ({section: list(stats) for section, stats in profile_sections.items()},
+               {name: list(stats) for name, stats in profile_helpers.items()})
+    profile_sections.clear()
+    profile_helpers.clear()
+
+    return profile
+
+
+# adds a profile taken by profile_take (in a worker process, or this one) to the profile of this process
+def profile_merge(profile):
+
+    for profile_stats, stats_items in zip((profile_sections, profile_helpers), profile):
+        for name, (calls, seconds) in stats_items.items():
+            stats = profile_stats.setdefault(name, [0, 0.0])
+            stats[0] += calls
+            stats[1] += seconds
+
+
+# prints the profile of a conversion of tx_count Tx blocks as a table, slowest first, & writes it to args.profile as
+# a JSON report
+def output_profile(tx_count):
+
+    report = {'in_xml': args.in_xml, 'parser': args.parser, 'stream': args.stream, 'workers': args.workers,
+              'tx': tx_count}
+
+    for title, key, profile_stats in (('Section', 'sections', profile_sections), ('Helper', 'helpers', profile_helpers)):
+        total_seconds = sum(seconds for calls, seconds in profile_stats.values()) or 1.0
+        report[key] = {name: {'calls': calls, 'seconds': seconds}
+                       for name, (calls, seconds) in sorted(profile_stats.items(), key=lambda item: -item[1][1])}
+
+        print('{0:<32}{1:>12}{2:>12}{3:>12}{4:>8}'.format(title, 'Calls', 'Seconds', 'us/call', '%'))
+        for name, stats in report[key].items():
+            print('{0:<32}{1:>12}{2:>12.3f}{3:>12.2f}{4:>8.1f}'.format(
+                name, stats['calls'], stats['seconds'], stats['seconds'] * 1e6 / max(1, stats['calls']),
+                stats['seconds'] * 100 / total_seconds))
+
+    with open(args.profile, 'w', encoding='utf-8') as profile_file:
+        json.dump(report, profile_file, indent=1)
+
+
+xml_precheck_bytes = 1 << 16  # bytes scanned at the start & at the end of an XML file by xml_precheck
+
+# the XML declaration, comments, processing instructions & a DOCTYPE before the root block, then the root block's name
+xml_precheck_root = re.compile(r'(?:\s|<\?.*?\?>|<!--.*?-->|<!DOCTYPE[^>]*>)*<(?=[\w.-])', re.S)
+# a start or end tag: whether it's an end tag, its name & the rest of it (quoted attribute values may hold a '>')
+xml_precheck_tag = re.compile(r'<(/?)([\w.:-]+)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>')
+# a namespace declaration: its prefix (None for the default namespace) & its URI, in double or single quotes
+xml_precheck_xmlns = re.compile(r'xmlns(?::([\w.-]+))?\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+# checks an XML file looks like a UnaVista file by scanning the raw bytes at its start & end, without building a tree.
+# Returns the namespace tag of the UVMiFIRDocument root block, the namespace tag of the first urn:iso... Document
+# block (None if there isn't one near the start, when it's looked for in the parsed tree instead) and an error message,
+# None if the file passes. The file is memory mapped, so only the pages scanned are read from disk.
+# NOTE: a file that passes can still fail to parse, only a file that can't be a UnaVista file is rejected here
+def xml_precheck(xml_file):
+
+    with open(xml_file, 'rb') as in_xml_file:
+        if os.fstat(in_xml_file.fileno()).st_size == 0:
+            return None, None, 'Unrecognised XML'
+        xml_bytes = mmap.mmap(in_xml_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with xml_bytes:
+        encoding = {codecs.BOM_UTF16_LE: 'utf-16-le', codecs.BOM_UTF16_BE: 'utf-16-be'}.get(xml_bytes[:2], 'utf-8')
+        xml_head = xml_bytes[:xml_precheck_bytes].decode(encoding, 'replace').lstrip('\ufeff')
+        xml_tail = xml_bytes[max(0, len(xml_bytes) - xml_precheck_bytes) & ~1:].decode(encoding, 'replace')
+
+    mm = xml_precheck_root.match(xml_head)
+    if mm is None:
+        return None, None, 'Unrecognised XML'
+
+    # walk the tags from the root block down, keeping the namespaces declared in each open block
+    namespaces = [{}]
+    root_name = None
+    uv_namespace_tag = None
+    iso_namespace_tag = None
 
-    return xml_ref.findall(xml_namespace_tag + in_str)
+    for mm in xml_precheck_tag.finditer(xml_head, mm.end() - 1):
+        if mm[1]:
+            if len(namespaces) > 1:
+                namespaces.pop()
+            continue
+
+        block_namespaces = dict(namespaces[-1])
+        for ns in xml_precheck_xmlns.finditer(mm[3]):
+            block_namespaces[ns[1] or ''] = ns[2] if ns[2] is not None else ns[3]
+
+        prefix, _, local_name = mm[2].rpartition(':')
+        namespace_uri = block_namespaces.get(prefix)
+
+        if root_name is None:
+            if local_name != 'UVMiFIRDocument' or not namespace_uri:
+                return None, None, 'Unrecognised XML'
+            root_name = mm[2]
+            uv_namespace_tag = '{' + namespace_uri + '}'
+
+        elif local_name.startswith('Document') and namespace_uri and namespace_uri.startswith('urn:iso'):
+            iso_namespace_tag = '{' + namespace_uri + '}'
+            break
+
+        if not mm[3].endswith('/'):
+            namespaces.append(block_namespaces)
+
+    if root_name is None:
+        return None, None, 'Unrecognised XML'
+
+    # only white space, comments & processing instructions may follow the end of the root block
+    if re.search(r'</' + re.escape(root_name) + r'\s*>(?:\s|<!--.*?-->|<\?.*?\?>)*\Z', xml_tail, re.S) is None:
+        return uv_namespace_tag, iso_namespace_tag, 'XML file ends before its UVMiFIRDocument block does'
+
+    return uv_namespace_tag, iso_namespace_tag, None
+
+
+# the namespace of the first urn:iso... Document block in or under a block, as xml_parse_tx finds it
+xml_iso_namespace_xpath = None if LxmlTree is None else LxmlTree.XPath(
+    "namespace-uri((descendant-or-self::*[starts-with(namespace-uri(), 'urn:iso')"
+    " and starts-with(local-name(), 'Document')])[1])")
+
+
+# returns all the /UVMiFIRDocument/Document/Document/FinInstrmRptgTxRpt/Tx blocks of a fully parsed XML file, where
+# namespace_tags are the UVMiFIRDocument & urn:iso... namespace tags found by xml_precheck
+def xml_parse_tx(xml_file, namespace_tags):
+
+    uv_namespace_tag, iso_namespace_tag = namespace_tags
+
+    xml = XmlTree.parse(xml_file).getroot()
+    set_xml_namespace_tag(uv_namespace_tag)
+    xml_doc_outer = xml_find(xml, 'Document')  # outer document block
+
+    if iso_namespace_tag is not None:
+        set_xml_namespace_tag(iso_namespace_tag)
+    elif args.parser == 'lxml':
+        # NOTE: lxml's iter() also returns comments & processing instructions, whose tag isn't a string
+        iso_namespace = xml_iso_namespace_xpath(xml_doc_outer)
+        if iso_namespace:
+            set_xml_namespace_tag('{' + iso_namespace + '}')
+    else:
+        for xml_node in xml_doc_outer.iter():
+            mm = re.match(r'({urn:iso.*})Document', xml_node.tag)
+            if mm is not None:
+                set_xml_namespace_tag(mm[1])
+                break
+
+    xml_doc_outer = xml_find(xml_doc_outer, 'Document')  # inner document block
+    xml_rpt = xml_find(xml_doc_outer, 'FinInstrmRptgTxRpt')
+
+    return xml_findall(xml_rpt, 'Tx')
+
+
+# yields the /UVMiFIRDocument/Document/Document/FinInstrmRptgTxRpt/Tx blocks one at a time as they are parsed,
+# each block is cleared once the caller asks for the next, so memory use does not grow with the file size
+# (namespace_tags as for xml_parse_tx, the urn:iso... namespace is looked for as the file is parsed if it's None)
+def xml_iter_tx(xml_file, namespace_tags):
+
+    xml_path = []  # open elements, from the root down to the current one
+    uv_namespace_tag, iso_namespace_tag = namespace_tags
+
+    for event, xml_node in XmlTree.iterparse(xml_file, events=('start', 'end')):
+
+        if event == 'start':
+            if len(xml_path) == 0:
+                set_xml_namespace_tag(iso_namespace_tag or uv_namespace_tag)
+
+            elif xml_namespace_tag == uv_namespace_tag:
+                xml_doc_outer = xml_path[1] if len(xml_path) > 1 else xml_node  # outer document block
+
+                if xml_doc_outer.tag == uv_namespace_tag + 'Document':
+                    mm = re.match(r'({urn:iso.*})Document', xml_node.tag)
+                    if mm is not None:
+                        set_xml_namespace_tag(mm[1])
+
+            xml_path.append(xml_node)
+            continue
+
+        xml_path.pop()
+
+        if len(xml_path) == 4 and xml_node.tag == xml_tag('Tx') \
+                and xml_path[3].tag == xml_tag('FinInstrmRptgTxRpt') \
+                and xml_path[2].tag == xml_tag('Document') \
+                and xml_path[1].tag == uv_namespace_tag + 'Document':
+
+            yield xml_node
+
+            xml_node.clear()
+            xml_path[3].remove(xml_node)
+
+
+# scans the raw bytes of an XML file for the boundaries of the FinInstrmRptgTxRpt/Tx blocks, without parsing it,
+# and splits them into about range_count byte ranges of whole Tx blocks. Returns the text to wrap around a range so
+# it parses on its own (the XML declaration plus a FinInstrmRptgTxRpt block carrying the namespace declarations),
+# the namespace tag of the Tx blocks and a list of (start, end, number of Tx blocks before the range).
+# NOTE: Tx tags inside comments or CDATA sections are not recognised as such, UnaVista files have neither
+def xml_scan_tx_ranges(xml_file, range_count):
+
+    with open(xml_file, 'rb') as in_xml_file:
+        xml_bytes = mmap.mmap(in_xml_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    mm = re.search(rb'<(?:([\w.-]+):)?FinInstrmRptgTxRpt[\s>]', xml_bytes)
+    if mm is None:
+        xml_bytes.close()
+        return (b'', b''), None, []
+
+    prefix = mm[1] + b':' if mm[1] is not None else b''
+    rpt_start = xml_bytes.find(b'>', mm.start()) + 1
+    rpt_end = xml_bytes.rfind(b'</' + prefix + b'FinInstrmRptgTxRpt')
+    if rpt_end < rpt_start:
+        rpt_end = len(xml_bytes)
+
+    # namespace declarations in scope at the report block, a later declaration of a prefix wins
+    xml_header = xml_bytes[:rpt_start]
+    namespaces = {}
+    for mm in re.finditer(rb'xmlns(?::([\w.-]+))?\s*=\s*["\']([^"\']*)["\']', xml_header):
+        namespaces[mm[1] or b''] = mm[2]
+
+    namespace_uri = namespaces.get(prefix[:-1], b'')
+    namespace_tag = '{' + namespace_uri.decode('utf-8') + '}' if namespace_uri else ''
+
+    mm = re.match(rb'\s*<\?xml[^>]*\?>', xml_header)
+    xml_wrapper_start = (mm[0] if mm is not None else b'') + b'<' + prefix + b'FinInstrmRptgTxRpt' + \
+        b''.join(b' xmlns' + (b':' + ns_prefix if ns_prefix else b'') + b'="' + ns_uri + b'"'
+                 for ns_prefix, ns_uri in namespaces.items()) + b'>'
+    xml_wrapper_end = b'</' + prefix + b'FinInstrmRptgTxRpt>'
+
+    # New blocks have their own Tx block inside, so count the depth of Tx tags to find the outer ones
+    range_size = max(1, (rpt_end - rpt_start) // max(1, range_count))
+    xml_ranges = []
+    tx_no = 0
+    range_start = None
+    range_tx_no = 0
+    depth = 0
+
+    tx_tag = re.compile(rb'<(/?)' + re.escape(prefix) + rb'Tx(?=[\s/>])')
+
+    for mm in tx_tag.finditer(xml_bytes, rpt_start, rpt_end):
+        tag_end = xml_bytes.find(b'>', mm.end()) + 1
+
+        if mm[1]:
+            depth -= 1
+        elif xml_bytes[tag_end - 2:tag_end - 1] != b'/':
+            depth += 1
+            if depth == 1 and range_start is None:
+                range_start = mm.start()
+                range_tx_no = tx_no
+            continue
+
+        if depth == 0:
+            if range_start is None:  # an empty <Tx/> block
+                range_start = mm.start()
+                range_tx_no = tx_no
+
+            tx_no += 1
+            if tag_end - range_start >= range_size:
+                xml_ranges.append((range_start, tag_end, range_tx_no))
+                range_start = None
+
+    if range_start is not None:
+        xml_ranges.append((range_start, rpt_end, range_tx_no))
+
+    xml_bytes.close()
+
+    return (xml_wrapper_start, xml_wrapper_end), namespace_tag, xml_ranges
+
+
+filter_lei = ['571474TGEMMWANRLN572', '5493006KMX1VFTPYPW14', 'HPFHU0OQ28E4N0NFVK49', 'MAES062Z21O4RZ2U7M96']
+
+# the conditions of filter_ext_trades as one XPath expression, for lxml (the first block is taken at every level of
+# a path, as get_tag_content does)
+filter_classification = 'string(n:FinInstrm[1]/n:Othr[1]/n:FinInstrmGnlAttrbts[1]/n:ClssfctnTp[1])'
+filter_lei_test = ' or '.join("string(n:Id[1]/n:LEI[1]) = '" + lei + "'" for lei in filter_lei)
+filter_ext_trades_expr = (
+    filter_classification + " = 'IFXXXX' or (" +
+    filter_classification + " = 'JFXXXX'" +
+    " and (n:Buyr[1]/n:AcctOwnr[" + filter_lei_test + "] or n:Sellr[1]/n:AcctOwnr[" + filter_lei_test + "])" +
+    " and string(n:ExctgPrsn[1]/n:Clnt[1]) = 'NORE')")
 
 
 # filter out external manager trades
 def filter_ext_trades(xml_new):
-    filter_lei = ['571474TGEMMWANRLN572', '5493006KMX1VFTPYPW14', 'HPFHU0OQ28E4N0NFVK49', 'MAES062Z21O4RZ2U7M96']
+
+    if args.parser == 'lxml':
+        return xml_xpath(filter_ext_trades_expr)(xml_new)
 
     condition1, condition2, condition3 = False, False, False
 
@@ -2384,1065 +2882,827 @@ def get_output_header_row():
     out_row[ind_elig_cycle_event]  = 'elig_cycle_event'
 
 
-# For all new transactions
-def get_output_row_new(xml_tx_new, xml_file):
+# ----------------------------- New block column map ---------------------------
+#
+# Each column of a New block is mapped to a list of fallbacks, (path, transform), where the path of local tag names
+# is relative to the New block (or to each repeat of a group block, '' being the block itself). The column is set
+# from the first fallback whose path is found, by its transform of the found block (or to the transform itself when
+# it's a string); a transform returning None passes on to the next fallback, and a column with no fallback found is
+# left as ''.
+#
+# The map is compiled by compile_new_row_plan into a plan that finds every block on its paths once per Tx.
 
-    global client_modes
+# returns a transform of a '1' / '0' indicator block to true_value / false_value, any other text is kept as is
+def to_indicator(true_value, false_value):
 
-    # Report Details
-    out_row[ind_report_status]  = 'NEWT'
-    out_row[ind_trans_ref_no]   = xml_find_text(xml_tx_new, 'TxId')
-    out_row[ind_entity_id_code] = xml_find_text(xml_tx_new, 'ExctgPty')
-
-    if xml_find(xml_tx_new, 'InvstmtPtyInd') is not None:
-        if xml_find_text(xml_tx_new, 'InvstmtPtyInd') == '1':
-            out_row[ind_cover_201465eu] = 'true'
-        elif xml_find_text(xml_tx_new, 'InvstmtPtyInd') == '0':
-            out_row[ind_cover_201465eu] = 'false'
-        else:
-            out_row[ind_cover_201465eu] = xml_find_text(xml_tx_new, 'InvstmtPtyInd')
-
-    # ----------------------------- Buyer details ---------------------------
-    list_buy_acct_id_type  = []
-    list_buy_acct_np_code  = []
-    list_buy_acct_id_code  = []
-    list_buy_acct_country  = []
-    list_buy_acct_forename = []
-    list_buy_acct_surname  = []
-    list_buy_acct_birthdt  = []
-
-    list_buy_dcsn_id_type  = []
-    list_buy_dcsn_np_code  = []
-    list_buy_dcsn_id_code  = []
-    list_buy_dcsn_forename = []
-    list_buy_dcsn_surname  = []
-    list_buy_dcsn_birthdt  = []
-
-    xml_tx_new_buy = xml_find(xml_tx_new, 'Buyr')
-
-    if xml_tx_new_buy is not None:
-        xml_tx_new_buy_accts = xml_findall(xml_tx_new_buy, 'AcctOwnr')
-        if xml_tx_new_buy_accts is not None:
-            for xml_tx_new_buy_acct in xml_tx_new_buy_accts:
-
-                single_id_type  = ''
-                single_id_code  = ''
-                single_forename = ''
-                single_surname  = ''
-                single_birthdt  = ''
-
-# ----------------------------- Buyer Id Code Type
-                xml_tx_new_buy_acct_id = xml_find(xml_tx_new_buy_acct, 'Id')
-
-                if xml_tx_new_buy_acct_id is not None:
-                    xml_tx_new_buy_acct_id_prsn = xml_find(xml_tx_new_buy_acct_id, 'Prsn')
-
-                    if xml_find(xml_tx_new_buy_acct_id, 'LEI') is not None:
-                        single_id_type = 'LEI'
-
-                    elif xml_find(xml_tx_new_buy_acct_id, 'MIC') is not None:
-                        single_id_type = 'MIC'
-
-                    elif xml_tx_new_buy_acct_id_prsn is not None:
-                        ref_numb = xml_find_text(xml_tx_new, 'TxId')
-                        xml_tx_new_buy_acct_id_prsn_othr = xml_find(xml_tx_new_buy_acct_id_prsn, 'Othr')
-                        if xml_tx_new_buy_acct_id_prsn_othr is not None:
-                            xml_tx_new_buy_acct_id_prsn_othr_schmenm = xml_find(xml_tx_new_buy_acct_id_prsn_othr, 'SchmeNm')
-                            if xml_tx_new_buy_acct_id_prsn_othr_schmenm is not None:
-                                if xml_find(xml_tx_new_buy_acct_id_prsn_othr_schmenm, 'Cd') is not None:
-                                    if xml_find_text(xml_tx_new_buy_acct_id_prsn_othr_schmenm, 'Cd') != 'NIDN':
-                                        single_id_type = xml_find_text(xml_tx_new_buy_acct_id_prsn_othr_schmenm, 'Cd')
-                                    else:
-                                        single_id_type = 'NIND'
-
-                                elif xml_find(xml_tx_new_buy_acct_id_prsn_othr_schmenm, 'Prtry') is not None:
-                                    single_id_type = xml_find_text(xml_tx_new_buy_acct_id_prsn_othr_schmenm, 'Prtry')
+    def to_indicator_value(xml_ref):
+        value = xml_text(xml_ref)
+        return true_value if value == '1' else false_value if value == '0' else value
 
-                    else:
-                        single_id_type = xml_find_text(xml_tx_new_buy_acct_id, 'Intl')
-# ----------------------------------------------------------------------------------------
+    return to_indicator_value
 
-# --------------------------------- Buyer Id Code
-                    if xml_find(xml_tx_new_buy_acct_id, 'LEI') is not None:
-                        single_id_code = xml_find_text(xml_tx_new_buy_acct_id, 'LEI')
 
-                    elif xml_find(xml_tx_new_buy_acct_id, 'MIC') is not None:
-                        single_id_code = xml_find_text(xml_tx_new_buy_acct_id, 'MIC')
+def to_ccy(xml_ref):
 
-                    elif xml_tx_new_buy_acct_id_prsn is not None:
-                        xml_tx_new_buy_acct_id_prsn_othr = xml_find(xml_tx_new_buy_acct_id_prsn, 'Othr')
-                        if xml_tx_new_buy_acct_id_prsn_othr is not None:
-                            xml_tx_new_buy_acct_id_prsn_othr_id = xml_find(xml_tx_new_buy_acct_id_prsn_othr, 'Id')
-                            if xml_tx_new_buy_acct_id_prsn_othr_id is not None:
-                                single_id_code = xml_find_text(xml_tx_new_buy_acct_id_prsn_othr, 'Id')
+    return xml_attrib(xml_ref, 'Ccy')
 
-                    else:
-                        single_id_code = xml_find_text(xml_tx_new_buy_acct_id, 'Intl')
-# ----------------------------------------------------------------------------------------
-
-# --------------------------------- First, last, DOB Codes
-                    if xml_find(xml_tx_new_buy_acct_id, 'Prsn') is not None:
-                        xml_tx_new_buy_acct_id_prsn = xml_find(xml_tx_new_buy_acct_id, 'Prsn')
-                        if xml_find(xml_tx_new_buy_acct_id_prsn, 'FrstNm') is not None:
-                            single_forename = xml_find_text(xml_tx_new_buy_acct_id_prsn, 'FrstNm')
-                        if xml_find(xml_tx_new_buy_acct_id_prsn, 'Nm') is not None:
-                            single_surname = xml_find_text(xml_tx_new_buy_acct_id_prsn, 'Nm')
-                        if xml_find(xml_tx_new_buy_acct_id_prsn, 'BirthDt') is not None:
-                            single_birthdt = xml_find_text(xml_tx_new_buy_acct_id_prsn, 'BirthDt')
-# ----------------------------------------------------------------------------------------
-
-                list_buy_acct_id_type.append(single_id_type)
-                list_buy_acct_np_code.append('')
-                list_buy_acct_id_code.append(replace_dummy(single_id_code))
-                list_buy_acct_country.append(xml_find_text(xml_tx_new_buy_acct, 'CtryOfBrnch'))
-                list_buy_acct_forename.append(single_forename)
-                list_buy_acct_surname.append(single_surname)
-                list_buy_acct_birthdt.append(single_birthdt)
-
-        xml_tx_new_buy_dcsns = xml_findall(xml_tx_new_buy, 'DcsnMakr')
-        if xml_tx_new_buy_dcsns is not None:
-            for xml_tx_new_buy_dcsn in xml_tx_new_buy_dcsns:
-
-                single_id_type  = ''
-                single_id_code  = ''
-                single_forename = ''
-                single_surname  = ''
-                single_birthdt  = ''
-
-# --------------------------------- Buyer Decision Maker Code Type
-                if xml_tx_new_buy_dcsn is not None:
-                    if xml_find(xml_tx_new_buy_dcsn, 'LEI') is not None:
-                        single_id_type = 'LEI'
-
-                    elif xml_find(xml_tx_new_buy_dcsn, 'Prsn') is not None:
-                        xml_tx_new_buy_dcsn_prsn = xml_find(xml_tx_new_buy_dcsn, 'Prsn')
-                        if xml_tx_new_buy_dcsn_prsn is not None:
-                            xml_tx_new_buy_dcsn_prsn_othr = xml_find(xml_tx_new_buy_dcsn_prsn, 'Othr')
-                            if xml_tx_new_buy_dcsn_prsn_othr is not None:
-                                xml_tx_new_buy_dcsn_prsn_othr_schmenm = xml_find(xml_tx_new_buy_dcsn_prsn_othr, 'SchmeNm')
-                                if xml_tx_new_buy_dcsn_prsn_othr_schmenm is not None:
-                                    if xml_find(xml_tx_new_buy_dcsn_prsn_othr_schmenm, 'Cd') is not None:
-                                        if xml_find_text(xml_tx_new_buy_dcsn_prsn_othr_schmenm, 'Cd') != 'NIDN':
-                                            single_id_type = xml_find_text(xml_tx_new_buy_dcsn_prsn_othr_schmenm, 'Cd')
-                                        else:
-                                            single_id_type = 'NIND'
-
-                                    elif xml_find(xml_tx_new_buy_dcsn_prsn_othr_schmenm, 'Prtry') is not None:
-                                        single_id_type = xml_find_text(xml_tx_new_buy_dcsn_prsn_othr_schmenm, 'Prtry')
-# ----------------------------------------------------------------------------------------
-
-# --------------------------------- Buyer Decision Maker ID Code
-                    if xml_find(xml_tx_new_buy_dcsn, 'LEI') is not None:
-                        single_id_code = xml_find_text(xml_tx_new_buy_dcsn, 'LEI')
-
-                    elif xml_find(xml_tx_new_buy_dcsn, 'Prsn') is not None:
-                        xml_tx_new_buy_dcsn_prsn = xml_find(xml_tx_new_buy_dcsn, 'Prsn')
-                        if xml_tx_new_buy_dcsn_prsn is not None:
-                            xml_tx_new_buy_dcsn_prsn_othr = xml_find(xml_tx_new_buy_dcsn_prsn, 'Othr')
-                            if xml_tx_new_buy_dcsn_prsn_othr is not None:
-                                single_id_code = xml_find_text(xml_tx_new_buy_dcsn_prsn_othr, 'Id')
-# ----------------------------------------------------------------------------------------
-
-# ------------------------------------ First, last, DOB Codes
-                    if xml_find(xml_tx_new_buy_dcsn, 'Prsn') is not None:
-                        xml_tx_new_buy_dcsn_prsn = xml_find(xml_tx_new_buy_dcsn, 'Prsn')
-                        single_forename = xml_find_text(xml_tx_new_buy_dcsn_prsn, 'FrstNm')
-                        single_surname  = xml_find_text(xml_tx_new_buy_dcsn_prsn, 'Nm')
-                        single_birthdt  = xml_find_text(xml_tx_new_buy_dcsn_prsn, 'BirthDt')
-# ----------------------------------------------------------------------------------------
-
-                list_buy_dcsn_id_type.append(single_id_type)
-                list_buy_dcsn_np_code.append('')
-                list_buy_dcsn_id_code.append(replace_dummy(single_id_code))
-                list_buy_dcsn_forename.append(single_forename)
-                list_buy_dcsn_surname.append(single_surname)
-                list_buy_dcsn_birthdt.append(single_birthdt)
-
-    out_row[ind_buy_acct_id_type]  = delim.join(list_buy_acct_id_type)
-    out_row[ind_buy_acct_np_code]  = delim.join(list_buy_acct_np_code)
-    out_row[ind_buy_acct_id_code]  = delim.join(list_buy_acct_id_code)
-    out_row[ind_buy_acct_country]  = delim.join(list_buy_acct_country)
-    out_row[ind_buy_acct_forename] = delim.join(list_buy_acct_forename)
-    out_row[ind_buy_acct_surname]  = delim.join(list_buy_acct_surname)
-    out_row[ind_buy_acct_birthdt]  = delim.join(list_buy_acct_birthdt)
-
-    out_row[ind_buy_dcsn_id_type]  = delim.join(list_buy_dcsn_id_type)
-    out_row[ind_buy_dcsn_np_code]  = delim.join(list_buy_dcsn_np_code)
-    out_row[ind_buy_dcsn_id_code]  = delim.join(list_buy_dcsn_id_code)
-    out_row[ind_buy_dcsn_forename] = delim.join(list_buy_dcsn_forename)
-    out_row[ind_buy_dcsn_surname]  = delim.join(list_buy_dcsn_surname)
-    out_row[ind_buy_dcsn_birthdt]  = delim.join(list_buy_dcsn_birthdt)
-
-    # ----------------------------- Seller details ---------------------------
-    list_sel_acct_id_type  = []
-    list_sel_acct_np_code  = []
-    list_sel_acct_id_code  = []
-    list_sel_acct_country  = []
-    list_sel_acct_forename = []
-    list_sel_acct_surname  = []
-    list_sel_acct_birthdt  = []
-
-    list_sel_dcsn_id_type  = []
-    list_sel_dcsn_np_code  = []
-    list_sel_dcsn_id_code  = []
-    list_sel_dcsn_forename = []
-    list_sel_dcsn_surname  = []
-    list_sel_dcsn_birthdt  = []
-
-    xml_tx_new_sel = xml_find(xml_tx_new, 'Sellr')
-    if xml_tx_new_sel is not None:
-        # --- Seller Id ---
-        xml_tx_new_sel_accts = xml_findall(xml_tx_new_sel, 'AcctOwnr')
-        if xml_tx_new_sel_accts is not None:
-            for xml_tx_new_sel_acct in xml_tx_new_sel_accts:
-
-                single_id_type  = ''
-                single_id_code  = ''
-                single_forename = ''
-                single_surname  = ''
-                single_birthdt  = ''
-
-                xml_tx_new_sel_acct_id = xml_find(xml_tx_new_sel_acct, 'Id')
-
-# ----------------------------- Seller Id Code Type
-                if xml_tx_new_sel_acct_id is not None:
-                    xml_tx_new_sel_acct_id_prsn = xml_find(xml_tx_new_sel_acct_id, 'Prsn')
-
-                    if xml_find(xml_tx_new_sel_acct_id, 'LEI') is not None:
-                        single_id_type = 'LEI'
-
-                    elif xml_find(xml_tx_new_sel_acct_id, 'MIC') is not None:
-                        single_id_type = 'MIC'
-
-                    elif xml_tx_new_sel_acct_id_prsn is not None:
-                        xml_tx_new_sel_acct_id_prsn_othr = xml_find(xml_tx_new_sel_acct_id_prsn, 'Othr')
-                        if xml_tx_new_sel_acct_id_prsn_othr is not None:
-                            xml_tx_new_sel_acct_id_prsn_othr_schmenm = xml_find(xml_tx_new_sel_acct_id_prsn_othr, 'SchmeNm')
-                            if xml_tx_new_sel_acct_id_prsn_othr_schmenm is not None:
-                                if xml_find(xml_tx_new_sel_acct_id_prsn_othr_schmenm, 'Cd') is not None:
-                                    if xml_find_text(xml_tx_new_sel_acct_id_prsn_othr_schmenm, 'Cd') != 'NIDN':
-                                        single_id_type = xml_find_text(xml_tx_new_sel_acct_id_prsn_othr_schmenm, 'Cd')
-                                    else:
-                                        single_id_type = 'NIND'
-
-                                elif xml_find(xml_tx_new_sel_acct_id_prsn_othr_schmenm, 'Prtry') is not None:
-                                    single_id_type = xml_find_text(xml_tx_new_sel_acct_id_prsn_othr_schmenm, 'Prtry')
 
-                    else:
-                        single_id_type = xml_find_text(xml_tx_new_sel_acct_id, 'Intl')
-# ----------------------------------------------------------------------------------------
+def to_id_code(xml_ref):
 
-# ----------------------------- Seller Id Code
-                    if xml_find(xml_tx_new_sel_acct_id, 'LEI') is not None:
-                        single_id_code = xml_find_text(xml_tx_new_sel_acct_id, 'LEI')
+    return replace_dummy(xml_text(xml_ref))
 
-                    elif xml_find(xml_tx_new_sel_acct_id, 'MIC') is not None:
-                        single_id_code = xml_find_text(xml_tx_new_sel_acct_id, 'MIC')
 
-                    elif xml_tx_new_sel_acct_id_prsn is not None:
-                        xml_tx_new_sel_acct_id_prsn_othr = xml_find(xml_tx_new_sel_acct_id_prsn, 'Othr')
-                        if xml_tx_new_sel_acct_id_prsn_othr is not None:
-                            if xml_find(xml_tx_new_sel_acct_id_prsn_othr, 'Id') is not None:
-                                single_id_code = xml_find_text(xml_tx_new_sel_acct_id_prsn_othr, 'Id')
+# MntryVal block of the transaction price, negative prices are output as floats
+def to_signed_float(xml_ref):
 
-                    else:
-                        single_id_code = xml_find_text(xml_tx_new_sel_acct_id, 'Intl')
-# ----------------------------------------------------------------------------------------
-
-# ------------------------------------ First, last, DOB Codes
-                    if xml_find(xml_tx_new_sel_acct_id, 'Prsn') is not None:
-                        xml_tx_new_sel_acct_id_prsn = xml_find(xml_tx_new_sel_acct_id, 'Prsn')
-                        single_forename = xml_find_text(xml_tx_new_sel_acct_id_prsn, 'FrstNm')
-                        single_surname  = xml_find_text(xml_tx_new_sel_acct_id_prsn, 'Nm')
-                        single_birthdt  = xml_find_text(xml_tx_new_sel_acct_id_prsn, 'BirthDt')
-# ----------------------------------------------------------------------------------------
-
-                list_sel_acct_id_type.append(single_id_type)
-                list_sel_acct_np_code.append('')
-                list_sel_acct_id_code.append(replace_dummy(single_id_code))
-                list_sel_acct_country.append(xml_find_text(xml_tx_new_sel_acct, 'CtryOfBrnch'))
-                list_sel_acct_forename.append(single_forename)
-                list_sel_acct_surname.append(single_surname)
-                list_sel_acct_birthdt.append(single_birthdt)
-
-        # --- Seller Decision Maker ---
-        xml_tx_new_sel_dcsns = xml_findall(xml_tx_new_sel, 'DcsnMakr')
-        if xml_tx_new_sel_dcsns is not None:
-            for xml_tx_new_sel_dcsn in xml_tx_new_sel_dcsns:
-
-                single_id_type  = ''
-                single_id_code  = ''
-                single_forename = ''
-                single_surname  = ''
-                single_birthdt  = ''
-
-                if xml_tx_new_sel_dcsn is not None:
-
-# ----------------------------- Seller Decision Code Type
-                    if xml_find(xml_tx_new_sel_dcsn, 'LEI') is not None:
-                        single_id_type = 'LEI'
-
-                    elif xml_find(xml_tx_new_sel_dcsn, 'Prsn') is not None:
-                        xml_tx_new_sel_dcsn_prsn = xml_find(xml_tx_new_sel_dcsn, 'Prsn')
-                        if xml_tx_new_sel_dcsn_prsn is not None:
-                            xml_tx_new_sel_dcsn_prsn_othr = xml_find(xml_tx_new_sel_dcsn_prsn, 'Othr')
-                            if xml_tx_new_sel_dcsn_prsn_othr is not None:
-                                xml_tx_new_sel_dcsn_prsn_othr_schmenm = xml_find(xml_tx_new_sel_dcsn_prsn_othr, 'SchmeNm')
-                                if xml_tx_new_sel_dcsn_prsn_othr_schmenm is not None:
-                                    if xml_find(xml_tx_new_sel_dcsn_prsn_othr_schmenm, 'Cd') is not None:
-                                        if xml_find_text(xml_tx_new_sel_dcsn_prsn_othr_schmenm, 'Cd') != 'NIDN':
-                                            single_id_type = xml_find_text(xml_tx_new_sel_dcsn_prsn_othr_schmenm, 'Cd')
-                                        else:
-                                            single_id_type = 'NIND'
-
-                                    elif xml_find(xml_tx_new_sel_dcsn_prsn_othr_schmenm, 'Prtry') is not None:
-                                        single_id_type = xml_find_text(xml_tx_new_sel_dcsn_prsn_othr_schmenm, 'Prtry')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Seller Decision Id Code
-                    if xml_find(xml_tx_new_sel_dcsn, 'LEI') is not None:
-                        single_id_code = xml_find_text(xml_tx_new_sel_dcsn, 'LEI')
-
-                    elif xml_find(xml_tx_new_sel_dcsn, 'Prsn') is not None:
-                        xml_tx_new_sel_dcsn_prsn = xml_find(xml_tx_new_sel_dcsn, 'Prsn')
-                        if xml_tx_new_sel_dcsn_prsn is not None:
-                            xml_tx_new_sel_dcsn_prsn_othr = xml_find(xml_tx_new_sel_dcsn_prsn, 'Othr')
-                            if xml_tx_new_sel_dcsn_prsn_othr is not None:
-                                if xml_find(xml_tx_new_sel_dcsn_prsn_othr, 'Id') is not None:
-                                    single_id_code = xml_find_text(xml_tx_new_sel_dcsn_prsn_othr, 'Id')
-# ----------------------------------------------------------------------------------------
-
-                    if xml_find(xml_tx_new_sel_dcsn, 'Prsn') is not None:
-                        xml_tx_new_sel_dcsn_prsn = xml_find(xml_tx_new_sel_dcsn, 'Prsn')
-                        single_forename = xml_find_text(xml_tx_new_sel_dcsn_prsn, 'FrstNm')
-                        single_surname = xml_find_text(xml_tx_new_sel_dcsn_prsn, 'Nm')
-                        single_birthdt = xml_find_text(xml_tx_new_sel_dcsn_prsn, 'BirthDt')
-
-                list_sel_dcsn_id_type.append(single_id_type)
-                list_sel_dcsn_np_code.append('')
-                list_sel_dcsn_id_code.append(replace_dummy(single_id_code))
-                list_sel_dcsn_forename.append(single_forename)
-                list_sel_dcsn_surname.append(single_surname)
-                list_sel_dcsn_birthdt.append(single_birthdt)
-
-    # output Seller Id & Seller Decision Maker values to columns for row
-    out_row[ind_sel_acct_id_type]  = delim.join(list_sel_acct_id_type)
-    out_row[ind_sel_acct_np_code]  = delim.join(list_sel_acct_np_code)
-    out_row[ind_sel_acct_id_code]  = delim.join(list_sel_acct_id_code)
-    out_row[ind_sel_acct_country]  = delim.join(list_sel_acct_country)
-    out_row[ind_sel_acct_forename] = delim.join(list_sel_acct_forename)
-    out_row[ind_sel_acct_surname]  = delim.join(list_sel_acct_surname)
-    out_row[ind_sel_acct_birthdt]  = delim.join(list_sel_acct_birthdt)
-
-    out_row[ind_sel_dcsn_id_type]  = delim.join(list_sel_dcsn_id_type)
-    out_row[ind_sel_dcsn_np_code]  = delim.join(list_sel_dcsn_np_code)
-    out_row[ind_sel_dcsn_id_code]  = delim.join(list_sel_dcsn_id_code)
-    out_row[ind_sel_dcsn_forename] = delim.join(list_sel_dcsn_forename)
-    out_row[ind_sel_dcsn_surname]  = delim.join(list_sel_dcsn_surname)
-    out_row[ind_sel_dcsn_birthdt]  = delim.join(list_sel_dcsn_birthdt)
-
-# ----------------------------- Transmission details ---------------------------
-    single_trnsm_order_ind   = ''
-    single_trnsm_buy_id_code = ''
-    single_trnsm_sel_id_code = ''
-
-    xml_tx_new_trnsm = xml_find(xml_tx_new, 'OrdrTrnsmssn')
-    if xml_tx_new_trnsm is not None:
-        single_trnsm_order_ind = xml_find_text(xml_tx_new_trnsm, 'TrnsmssnInd')
-        if single_trnsm_order_ind == '1':
-            single_trnsm_order_ind = 'True'
-        elif single_trnsm_order_ind == '0':
-            single_trnsm_order_ind = 'False'
-
-        single_trnsm_buy_id_code = xml_find_text(xml_tx_new_trnsm, 'TrnsmttgBuyr')
-        single_trnsm_sel_id_code = xml_find_text(xml_tx_new_trnsm, 'TrnsmttgSellr')
-
-    out_row[ind_trnsm_order_ind]   = single_trnsm_order_ind
-    out_row[ind_trnsm_buy_id_code] = single_trnsm_buy_id_code
-    out_row[ind_trnsm_sel_id_code] = single_trnsm_sel_id_code
-
-# ----------------------------- Transaction details ---------------------------
-    single_trnsc_datetime    = ''
-    single_trnsc_trade_cap   = ''
-    single_trnsc_qty_type    = ''
-    single_trnsc_qty_val     = ''
-    single_trnsc_qty_ccy     = ''
-    single_trnsc_drv_notion  = ''
-    single_trnsc_prc_type    = ''
-    single_trnsc_prc_val     = ''
-    single_trnsc_prc_ccy     = ''
-    single_trnsc_net_amt     = ''
-    single_trnsc_venue       = ''
-    single_trnsc_brnch_ctry  = ''
-    single_trnsc_up_fr_amt   = ''
-    single_trnsc_up_fr_ccy   = ''
-    single_trnsc_cmpnt_id    = ''
-
-    xml_tx_new_trnsc = xml_find(xml_tx_new, 'Tx')
-    if xml_tx_new_trnsc is not None:
-
-# ----------------------------- Trading Date Time & Capacity
-        single_trnsc_datetime    = xml_find_text(xml_tx_new_trnsc, 'TradDt')
-        single_trnsc_trade_cap   = xml_find_text(xml_tx_new_trnsc, 'TradgCpcty')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Quantity - Type, Quantity & Quantity Currency
-        xml_tx_new_trnsc_qty = xml_find(xml_tx_new_trnsc, 'Qty')
-        if xml_tx_new_trnsc_qty is not None:
-            if xml_find(xml_tx_new_trnsc_qty, 'Unit') is not None:
-                single_trnsc_qty_type = 'UNIT'
-                single_trnsc_qty_val = xml_find_text(xml_tx_new_trnsc_qty, 'Unit')
-            elif xml_find(xml_tx_new_trnsc_qty, 'NmnlVal') is not None:
-                single_trnsc_qty_type = 'NOMI'
-                single_trnsc_qty_val = xml_find_text(xml_tx_new_trnsc_qty, 'NmnlVal')
-                single_trnsc_qty_ccy = xml_get(xml_tx_new_trnsc_qty, 'NmnlVal', 'Ccy')
-            elif xml_find(xml_tx_new_trnsc_qty, 'MntryVal') is not None:
-                single_trnsc_qty_type = 'MONE'
-                single_trnsc_qty_val = xml_find_text(xml_tx_new_trnsc_qty, 'MntryVal')
-                single_trnsc_qty_ccy = xml_get(xml_tx_new_trnsc_qty, 'MntryVal', 'Ccy')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Derivative Notional
-        single_trnsc_drv_notion = xml_find_text(xml_tx_new_trnsc, 'DerivNtnlChng')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Price - Type
-        xml_tx_new_trnsc_pric = xml_find(xml_tx_new_trnsc, 'Pric')
-        if xml_tx_new_trnsc_pric is not None:
-            xml_tx_new_trnsc_pric_pric = xml_find(xml_tx_new_trnsc_pric, 'Pric')
-            xml_tx_new_trnsc_pric_nopric = xml_find(xml_tx_new_trnsc_pric, 'NoPric')
-
-            if xml_tx_new_trnsc_pric_pric is not None:
-                if xml_find(xml_tx_new_trnsc_pric_pric, 'MntryVal') is not None:
-                    single_trnsc_prc_type = 'MONE'
-
-                elif xml_find(xml_tx_new_trnsc_pric_pric, 'Pctg') is not None:
-                    single_trnsc_prc_type = 'PERC'
-
-                elif xml_find(xml_tx_new_trnsc_pric_pric, 'Yld') is not None:
-                    single_trnsc_prc_type = 'YIEL'
-
-                elif xml_find(xml_tx_new_trnsc_pric_pric, 'BsisPts') is not None:
-                    single_trnsc_prc_type = 'BPNT'
-
-            elif xml_tx_new_trnsc_pric_nopric is not None:
-                if xml_find(xml_tx_new_trnsc_pric_nopric, 'Pdg') is not None:
-                    single_trnsc_prc_type = xml_find_text(xml_tx_new_trnsc_pric_nopric, 'Pdg')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Price
-            if xml_tx_new_trnsc_pric_pric is not None:
-                xml_tx_new_trnsc_pric_pric_mntryval = xml_find(xml_tx_new_trnsc_pric_pric, 'MntryVal')
-                if xml_tx_new_trnsc_pric_pric_mntryval is not None:
-                    if xml_find_text(xml_tx_new_trnsc_pric_pric_mntryval, 'Sgn') in ('1', 'true'):
-                        single_trnsc_prc_val = float('-' + str(xml_find_text(xml_tx_new_trnsc_pric_pric_mntryval, 'Amt')))
-                    else:
-                        single_trnsc_prc_val = xml_find_text(xml_tx_new_trnsc_pric_pric_mntryval, 'Amt')
-
-                elif xml_find(xml_tx_new_trnsc_pric_pric, 'Pctg') is not None:
-                    single_trnsc_prc_val = xml_find_text(xml_tx_new_trnsc_pric_pric, 'Pctg')
-
-                elif xml_find(xml_tx_new_trnsc_pric_pric, 'Yld') is not None:
-                    single_trnsc_prc_val = xml_find_text(xml_tx_new_trnsc_pric_pric, 'Yld')
-
-                elif xml_find(xml_tx_new_trnsc_pric_pric, 'BsisPts') is not None:
-                    single_trnsc_prc_val = xml_find_text(xml_tx_new_trnsc_pric_pric, 'BsisPts')
-
-            elif xml_tx_new_trnsc_pric_nopric is not None:
-                if xml_find(xml_tx_new_trnsc_pric_nopric, 'Pdg') is not None:
-                    if xml_find_text(xml_tx_new_trnsc_pric_nopric, 'Pdg') == 'PNDG':
-                        single_trnsc_prc_val = xml_find_text(xml_tx_new_trnsc_pric_nopric, 'Pdg')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Price Currency
-            if xml_tx_new_trnsc_pric_pric is not None:
-                xml_tx_new_trnsc_pric_pric_mntryval = xml_find(xml_tx_new_trnsc_pric_pric, 'MntryVal')
-                if xml_tx_new_trnsc_pric_pric_mntryval is not None:
-                    single_trnsc_prc_ccy = xml_get(xml_tx_new_trnsc_pric_pric_mntryval, 'Amt', 'Ccy')
-            elif xml_tx_new_trnsc_pric_nopric is not None:
-                single_trnsc_prc_ccy = xml_find_text(xml_tx_new_trnsc_pric_nopric, 'Ccy')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Net Amount, Venue & Country of Branch
-        single_trnsc_net_amt = xml_find_text(xml_tx_new_trnsc, 'NetAmt')
-        single_trnsc_venue = xml_find_text(xml_tx_new_trnsc, 'TradVn')
-        single_trnsc_brnch_ctry = xml_find_text(xml_tx_new_trnsc, 'CtryOfBrnch')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Up-front Payment & Complex Trade Id
-        xml_tx_new_trnsc_upfr = xml_find(xml_tx_new_trnsc, 'UpFrntPmt')
-        if xml_tx_new_trnsc_upfr is not None:
-            xml_tx_new_trnsc_upfr_amt = xml_find_text(xml_tx_new_trnsc_upfr, 'Amt')
-
-            if xml_tx_new_trnsc_upfr_amt:
-                xml_tx_new_trnsc_upfr_sgn = xml_find_text(xml_tx_new_trnsc_upfr, 'Sgn')
-                single_trnsc_up_fr_ccy = xml_get(xml_tx_new_trnsc_upfr, 'Amt', 'Ccy')
-
-                if xml_tx_new_trnsc_upfr_sgn in ('1', 'true'):
-                    single_trnsc_up_fr_amt = '-' + str(xml_tx_new_trnsc_upfr_amt)
-                else:
-                    single_trnsc_up_fr_amt = xml_tx_new_trnsc_upfr_amt
-
-        single_trnsc_cmpnt_id = xml_find_text(xml_tx_new_trnsc, 'CmplxTradCmpntId')
-# ----------------------------------------------------------------------------------------
-
-    out_row[ind_trnsc_datetime]    = single_trnsc_datetime
-    out_row[ind_trnsc_trade_cap]   = single_trnsc_trade_cap
-    out_row[ind_trnsc_qty_type]    = single_trnsc_qty_type
-    out_row[ind_trnsc_qty_val]     = single_trnsc_qty_val
-    out_row[ind_trnsc_qty_ccy]     = single_trnsc_qty_ccy
-    out_row[ind_trnsc_drv_notion]  = single_trnsc_drv_notion
-    out_row[ind_trnsc_prc_type]    = single_trnsc_prc_type
-    out_row[ind_trnsc_prc_val]     = single_trnsc_prc_val
-    out_row[ind_trnsc_prc_ccy]     = single_trnsc_prc_ccy
-    out_row[ind_trnsc_net_amt]     = single_trnsc_net_amt
-    out_row[ind_trnsc_venue]       = single_trnsc_venue
-    out_row[ind_trnsc_brnch_ctry]  = single_trnsc_brnch_ctry
-    out_row[ind_trnsc_up_fr_amt]   = single_trnsc_up_fr_amt
-    out_row[ind_trnsc_up_fr_ccy]   = single_trnsc_up_fr_ccy
-    out_row[ind_trnsc_cmpnt_id]    = single_trnsc_cmpnt_id
-
-
-# ----------------------------- Instrument details ---------------------------
-    single_instr_id_code     = ''
-    single_instr_full_name   = ''
-    single_instr_class       = ''
-    single_instr_notnl_ccy1  = ''
-    single_instr_notnl_ccy2  = ''
-    single_instr_price_mult  = ''
-    list_instr_under_code    = []
-    single_instr_under_name  = ''
-    single_instr_under_term  = ''
-    single_instr_optn_type   = ''
-    single_instr_strk_type   = ''
-    single_instr_strk_price  = ''
-    single_instr_strk_ccy    = ''
-    single_instr_optn_exrc   = ''
-    single_instr_mat_date    = ''
-    single_instr_exp_date    = ''
-    single_instr_dlvry_type  = ''
-
-    xml_tx_new_instr = xml_find(xml_tx_new, 'FinInstrm')
-    if xml_tx_new_instr is not None:
-
-# ------------------------------------ Instrument identification code
-        xml_tx_new_instr_othr = xml_find(xml_tx_new_instr, 'Othr')
-        if xml_find(xml_tx_new_instr, 'Id') is not None:
-            single_instr_id_code = xml_find_text(xml_tx_new_instr, 'Id')
-
-        elif xml_tx_new_instr_othr is not None:
-            xml_tx_new_instr_othr_fininstr = xml_find(xml_tx_new_instr_othr, 'FinInstrmGnlAttrbts')
-            if xml_tx_new_instr_othr_fininstr is not None:
-                if xml_find(xml_tx_new_instr_othr_fininstr, 'Id') is not None:
-                    single_instr_id_code = xml_find_text(xml_tx_new_instr_othr_fininstr, 'Id')
-# -------------------------------------------------------------------
-
-# ------------------------------------ Instrument name, instrument classification, notional currency 1
-                single_instr_full_name = xml_find_text(xml_tx_new_instr_othr_fininstr, 'FullNm')
-                single_instr_class = xml_find_text(xml_tx_new_instr_othr_fininstr, 'ClssfctnTp')
-                single_instr_notnl_ccy1 = xml_find_text(xml_tx_new_instr_othr_fininstr, 'NtnlCcy')
-# ----------------------------------------------------------------------------------------
-
-# ------------------------------------ Option Type, Strike Price - Type, Strike Price, Strike Price Currency, Option Excercise Style
-            xml_tx_new_instr_othr_derivinstr = xml_find(xml_tx_new_instr_othr, 'DerivInstrmAttrbts')
-            if xml_tx_new_instr_othr_derivinstr is not None:
-                xml_tx_new_instr_othr_derivinstr_undr = xml_find(xml_tx_new_instr_othr_derivinstr, 'UndrlygInstrm')
-                xml_tx_new_instr_othr_derivinstr_optntp = xml_find(xml_tx_new_instr_othr_derivinstr, 'OptnTp')
-                xml_tx_new_instr_othr_derivinstr_strkpric = xml_find(xml_tx_new_instr_othr_derivinstr, 'StrkPric')
-
-                if xml_tx_new_instr_othr_derivinstr_optntp is not None:
-                        single_instr_optn_type = xml_find_text(xml_tx_new_instr_othr_derivinstr, 'OptnTp')
-
-                if xml_tx_new_instr_othr_derivinstr_strkpric is not None:
-                    xml_tx_new_instr_othr_derivinstr_strkpric_pric = xml_find(xml_tx_new_instr_othr_derivinstr_strkpric, 'Pric')
-                    xml_tx_new_instr_othr_derivinstr_strkpric_nopric = xml_find(xml_tx_new_instr_othr_derivinstr_strkpric, 'NoPric')
-                    if xml_tx_new_instr_othr_derivinstr_strkpric_pric is not None:
-                        xml_tx_new_instr_othr_derivinstr_strkpric_pric_mntryval = xml_find(xml_tx_new_instr_othr_derivinstr_strkpric_pric, 'MntryVal')
-                        xml_tx_new_instr_othr_derivinstr_strkpric_pric_pctg = xml_find(xml_tx_new_instr_othr_derivinstr_strkpric_pric, 'Pctg')
-                        xml_tx_new_instr_othr_derivinstr_strkpric_pric_yld = xml_find(xml_tx_new_instr_othr_derivinstr_strkpric_pric, 'Yld')
-                        xml_tx_new_instr_othr_derivinstr_strkpric_pric_bsispts = xml_find(xml_tx_new_instr_othr_derivinstr_strkpric_pric, 'BsisPts')
-
-                        if xml_tx_new_instr_othr_derivinstr_strkpric_pric_mntryval is not None:
-                            single_instr_strk_type = 'MONE'
-                            single_instr_strk_ccy = xml_get(xml_tx_new_instr_othr_derivinstr_strkpric_pric_mntryval, 'Amt', 'Ccy')
-                            if xml_find_text(xml_tx_new_instr_othr_derivinstr_strkpric_pric_mntryval, 'Sgn') in ('1', 'true'):
-                                single_instr_strk_price = '-' + str(xml_find_text(xml_tx_new_instr_othr_derivinstr_strkpric_pric_mntryval, 'Amt'))
-                            else:
-                                single_instr_strk_price = xml_find_text(xml_tx_new_instr_othr_derivinstr_strkpric_pric_mntryval, 'Amt')
-
-                        elif xml_tx_new_instr_othr_derivinstr_strkpric_pric_pctg is not None:
-                            single_instr_strk_type = 'PERC'
-                            single_instr_strk_price = xml_find_text(xml_tx_new_instr_othr_derivinstr_strkpric_pric, 'Pctg')
-
-                        elif xml_tx_new_instr_othr_derivinstr_strkpric_pric_yld is not None:
-                            single_instr_strk_type = 'YIEL'
-                            single_instr_strk_price = xml_find_text(xml_tx_new_instr_othr_derivinstr_strkpric_pric, 'Yld')
-
-                        elif xml_tx_new_instr_othr_derivinstr_strkpric_pric_bsispts is not None:
-                            single_instr_strk_type = 'BPNT'
-                            single_instr_strk_price = xml_find_text(xml_tx_new_instr_othr_derivinstr_strkpric_pric, 'BsisPts')
-
-                    elif xml_tx_new_instr_othr_derivinstr_strkpric_nopric is not None:
-                        xml_tx_new_instr_othr_derivinstr_strkpric_nopric_pdg = xml_find(xml_tx_new_instr_othr_derivinstr_strkpric_nopric, 'Pdg')
-                        xml_tx_new_instr_othr_derivinstr_strkpric_nopric_ccy = xml_find(xml_tx_new_instr_othr_derivinstr_strkpric_nopric, 'Ccy')
-                        if xml_tx_new_instr_othr_derivinstr_strkpric_nopric_pdg is not None:
-                            single_instr_strk_type = xml_find_text(xml_tx_new_instr_othr_derivinstr_strkpric_nopric, 'Pdg')
-                            single_instr_strk_price = xml_find_text(xml_tx_new_instr_othr_derivinstr_strkpric_nopric, 'Pdg')
-
-                        if xml_tx_new_instr_othr_derivinstr_strkpric_nopric_ccy is not None:
-                            single_instr_strk_ccy = xml_find_text(xml_tx_new_instr_othr_derivinstr_strkpric_nopric, 'Ccy')
-# ----------------------------------------------------------------------------------------
-
-# ------------------------------------ Price Multiplier
-                xml_tx_new_instr_othr_derivinstr_pmltplr = xml_find(xml_tx_new_instr_othr_derivinstr, 'PricMltplr')
-                if xml_tx_new_instr_othr_derivinstr_pmltplr is not None:
-                    single_instr_price_mult = xml_find_text(xml_tx_new_instr_othr_derivinstr, 'PricMltplr')
-# ----------------------------------------------------------------------------------------
-
-# ------------------------------------ Notional currency 2
-                xml_tx_new_instr_othr_derivinstr_asst = xml_find(xml_tx_new_instr_othr_derivinstr, 'AsstClssSpcfcAttrbts')
-                if xml_tx_new_instr_othr_derivinstr_asst is not None:
-                    xml_tx_new_instr_othr_derivinstr_asst_intrst = xml_find(xml_tx_new_instr_othr_derivinstr_asst, 'Intrst')
-                    xml_tx_new_instr_othr_derivinstr_asst_fx = xml_find(xml_tx_new_instr_othr_derivinstr_asst, 'FX')
-                    if xml_tx_new_instr_othr_derivinstr_asst_intrst is not None:
-                        xml_tx_new_instr_othr_derivinstr_asst_intrst_othr = xml_find(xml_tx_new_instr_othr_derivinstr_asst_intrst, 'OthrNtnlCcy')
-                        if xml_tx_new_instr_othr_derivinstr_asst_intrst_othr is not None:
-                            single_instr_notnl_ccy2 = xml_find_text(xml_tx_new_instr_othr_derivinstr_asst_intrst, 'OthrNtnlCcy')
-
-                    elif xml_tx_new_instr_othr_derivinstr_asst_fx is not None:
-                        xml_tx_new_instr_othr_derivinstr_asst_fx_othr = xml_find(xml_tx_new_instr_othr_derivinstr_asst_fx, 'OthrNtnlCcy')
-                        if xml_tx_new_instr_othr_derivinstr_asst_fx_othr is not None:
-                            single_instr_notnl_ccy2 = xml_find_text(xml_tx_new_instr_othr_derivinstr_asst_fx, 'OthrNtnlCcy')
-# ----------------------------------------------------------------------------------------
-
-                if xml_tx_new_instr_othr_derivinstr_undr is not None:
-                    xml_tx_new_instr_othr_derivinstr_undr_swp = xml_find(xml_tx_new_instr_othr_derivinstr_undr, 'Swp')
-                    if xml_tx_new_instr_othr_derivinstr_undr_swp is not None:
-
-                        for i, j in zip(['SwpIn', 'SwpOut'], ['', '-']):
-                            xml_tx_new_instr_othr_derivinstr_undr_swp_inout = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp, i)
-                            if xml_tx_new_instr_othr_derivinstr_undr_swp_inout is not None:
-
-# ------------------------------------ Underlying Instrument Code
-                                xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout, 'Sngl')
-                                xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout, 'Bskt')
-                                # for case: sngl
-                                if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl is not None:
-                                    xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_isin = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl, 'ISIN')
-                                    xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl, 'Indx')
-                                    if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_isin is not None:
-                                        list_instr_under_code.append(str(j)+str(xml_find_text(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl, 'ISIN')))
-
-                                    elif xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx is not None:
-                                        xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_isin = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx, 'ISIN')
-                                        if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_isin is not None:
-                                            list_instr_under_code.append(str(j)+str(xml_find_text(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx, 'ISIN')))
-                                # for case: bskt
-                                elif xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt is not None:
-                                    xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt, 'Indx')
-                                    if xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt, 'ISIN') is not None:
-                                        isin_bskt = xml_find_text(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt, 'ISIN')
-                                        for k in range(len(isin_bskt)):
-                                            list_instr_under_code.append(str(j)+str(isin_bskt[k]))
-
-                                    elif xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx is not None:
-                                        if xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx, 'ISIN') is not None:
-                                            isin_bskt = xml_find_text(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx, 'ISIN')
-                                            for k in range(len(isin_bskt)):
-                                                list_instr_under_code.append(str(j)+str(isin_bskt[k]))
-# ----------------------------------------------------------------------------------------
-
-# ------------------------------------ Underlying Index Name
-                                xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout, 'Sngl')
-                                xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout, 'Bskt')
-                                # for case: sngl
-                                if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl is not None:
-                                    xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl, 'Indx')
-                                    if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx is not None:
-                                        xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx, 'Nm')
-                                        if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm is not None:
-                                            xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm_ref = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm, 'RefRate')
-                                            if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm_ref is not None:
-                                                if xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm_ref, 'Indx') is not None:
-                                                    single_instr_under_name = str(j)+str(xml_find_text(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm_ref, 'Indx'))
-
-                                                elif xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm_ref, 'Nm') is not None:
-                                                    single_instr_under_name = str(j)+str(xml_find_text(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm_ref, 'Nm'))
-                                # for case: bskt
-                                elif xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt is not None:
-                                    xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt, 'Indx')
-                                    if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx is not None:
-                                        xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx, 'Nm')
-                                        if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm is not None:
-                                            xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm_ref = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm, 'Ref')
-                                            if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm_ref is not None:
-                                                if xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm_ref, 'Indx') is not None:
-                                                    single_instr_under_name = str(j)+str(xml_find_text(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm_ref, 'Indx'))
-
-                                                else:
-                                                    single_instr_under_name = str(j)+str(xml_find_text(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm_ref, 'Nm'))
-# ----------------------------------------------------------------------------------------
-
-# ------------------------------------ Term of Underlying Index
-                                xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout, 'Sngl')
-                                xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout, 'Bskt')
-                                # for case: sngl
-                                if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl is not None:
-                                    xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl, 'Indx')
-                                    if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx is not None:
-                                        xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx, 'Nm')
-                                        if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm is not None:
-                                            xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm_trm = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm, 'Term')
-                                            if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm_trm is not None:
-                                                if (xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm_trm, 'Val') is not None) and \
-                                                        (xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm_trm, 'Unit') is not None):
-                                                    val = xml_find_text(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm_trm, 'Val')
-                                                    unt = xml_find_text(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_sngl_idx_Nm_trm, 'Unit')
-                                                    single_instr_under_term = str(j)+str(val)+' '+str(unt)
-
-                                # for case: bskt
-                                elif xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt is not None:
-                                    xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt, 'Indx')
-                                    if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx is not None:
-                                        xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx, 'Nm')
-                                        if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm is not None:
-                                            xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm_trm = xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm, 'Term')
-                                            if xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm_trm is not None:
-                                                if (xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm_trm, 'Val') is not None) and \
-                                                        (xml_find(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm_trm, 'Unit') is not None):
-                                                    val = xml_find_text(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm_trm, 'Val')
-                                                    unt = xml_find_text(xml_tx_new_instr_othr_derivinstr_undr_swp_inout_bskt_idx_Nm_trm, 'Unit')
-                                                    single_instr_under_term = str(j)+str(val)+' '+str(unt)
-# ----------------------------------------------------------------------------------------
-
-# ------------------------------------ Option Exercise Style, Maturity Date, Expiry Date, Delivery Type
-                single_instr_optn_exrc   = xml_find_text(xml_tx_new_instr_othr_derivinstr, 'OptnExrcStyle')
-                single_instr_mat_date    = xml_find_text(xml_tx_new_instr_othr_derivinstr, 'MtrtyDt')
-                single_instr_exp_date    = xml_find_text(xml_tx_new_instr_othr_derivinstr, 'XpryDt')
-                single_instr_dlvry_type  = xml_find_text(xml_tx_new_instr_othr_derivinstr, 'DlvryTp')
-# ----------------------------------------------------------------------------------------
-
-    out_row[ind_instr_id_code]     = single_instr_id_code
-    out_row[ind_instr_full_name]   = single_instr_full_name
-    out_row[ind_instr_class]       = single_instr_class
-    out_row[ind_instr_notnl_ccy1]  = single_instr_notnl_ccy1
-    out_row[ind_instr_notnl_ccy2]  = single_instr_notnl_ccy2
-    out_row[ind_instr_price_mult]  = single_instr_price_mult
-    out_row[ind_instr_under_code]  = delim.join(list_instr_under_code)
-    out_row[ind_instr_under_name]  = single_instr_under_name
-    out_row[ind_instr_under_term]  = single_instr_under_term
-    out_row[ind_instr_optn_type]   = single_instr_optn_type
-    out_row[ind_instr_strk_type]   = single_instr_strk_type
-    out_row[ind_instr_strk_price]  = single_instr_strk_price
-    out_row[ind_instr_strk_ccy]    = single_instr_strk_ccy
-    out_row[ind_instr_optn_exrc]   = single_instr_optn_exrc
-    out_row[ind_instr_mat_date]    = single_instr_mat_date
-    out_row[ind_instr_exp_date]    = single_instr_exp_date
-    out_row[ind_instr_dlvry_type]  = single_instr_dlvry_type
-
-# ----------------------------- Traders ---------------------------
-    single_trade_invst_type  = ''
-    single_trade_invst_np    = ''
-    single_trade_invst_code  = ''
-    single_trade_invst_ctry  = ''
-    single_trade_exec_type   = ''
-    single_trade_exec_np     = ''
-    single_trade_exec_code   = ''
-    single_trade_exec_ctry   = ''
-
-    xml_tx_new_invstdcsn = xml_find(xml_tx_new, 'InvstmtDcsnPrsn')
-
-# ----------------------------- Trade Invest Np/Code
-    if xml_tx_new_invstdcsn is not None:
-        xml_tx_new_invstdcsn_prsn = xml_find(xml_tx_new_invstdcsn, 'Prsn')
-        if xml_tx_new_invstdcsn_prsn is not None:
-            xml_tx_new_invstdcsn_prsn_othr = xml_find(xml_tx_new_invstdcsn_prsn, 'Othr')
-            if xml_tx_new_invstdcsn_prsn_othr is not None:
-                if xml_find(xml_tx_new_invstdcsn_prsn_othr, 'Id') is not None:
-                    if client_mode == 'NNIP':
-                        single_trade_invst_np = xml_find_text(xml_tx_new_invstdcsn_prsn_othr, 'Id')
-                    else:
-                        single_trade_invst_code = xml_find_text(xml_tx_new_invstdcsn_prsn_othr, 'Id')
+    if xml_find_text(xml_ref, 'Sgn') in ('1', 'true'):
+        return float('-' + xml_find_text(xml_ref, 'Amt'))
 
-        elif xml_find(xml_tx_new_invstdcsn, 'Algo') is not None:
-            if client_mode == 'NNIP':
-                single_trade_invst_np = xml_find_text(xml_tx_new_invstdcsn, 'Algo')
-            else:
-                single_trade_invst_code = xml_find_text(xml_tx_new_invstdcsn, 'Algo')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Trade Invest Type
-        xml_tx_new_invstdcsn_prsn = xml_find(xml_tx_new_invstdcsn, 'Prsn')
-        if xml_tx_new_invstdcsn_prsn is not None:
-            xml_tx_new_invstdcsn_prsn_othr = xml_find(xml_tx_new_invstdcsn_prsn, 'Othr')
-            if xml_tx_new_invstdcsn_prsn_othr is not None:
-                xml_tx_new_invstdcsn_prsn_othr_schmenm = xml_find(xml_tx_new_invstdcsn_prsn_othr, 'SchmeNm')
-                if xml_find(xml_tx_new_invstdcsn_prsn_othr_schmenm, 'Cd') is not None:
-                    if xml_find_text(xml_tx_new_invstdcsn_prsn_othr_schmenm, 'Cd') != 'NIDN':
-                        single_trade_invst_type = xml_find_text(xml_tx_new_invstdcsn_prsn_othr_schmenm, 'Cd')
-                    else:
-                        single_trade_invst_type = 'NIND'
-
-                elif xml_find(xml_tx_new_invstdcsn_prsn_othr_schmenm, 'Prtry') is not None:
-                    single_trade_invst_type = xml_find_text(xml_tx_new_invstdcsn_prsn_othr_schmenm, 'Prtry')
-
-        elif xml_find(xml_tx_new_invstdcsn, 'Algo') is not None:
-            single_trade_invst_type = 'ALGO'
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Trade Invest Country of Branch
-        xml_tx_new_invstdcsn_prsn = xml_find(xml_tx_new_invstdcsn, 'Prsn')
-        if xml_tx_new_invstdcsn_prsn is not None:
-            if xml_find(xml_tx_new_invstdcsn_prsn, 'CtryOfBrnch') is not None:
-                single_trade_invst_ctry = xml_find_text(xml_tx_new_invstdcsn_prsn, 'CtryOfBrnch')
-# ---------------------------------------------------------------------------------------
-
-# ----------------------------- Trade Execution Type
-    xml_tx_new_exctprsn = xml_find(xml_tx_new, 'ExctgPrsn')
-
-    if xml_tx_new_exctprsn is not None:
-        xml_tx_new_exctprsn_prsn = xml_find(xml_tx_new_exctprsn, 'Prsn')
-        if xml_tx_new_exctprsn_prsn is not None:
-            xml_tx_new_exctprsn_prsn_othr = xml_find(xml_tx_new_exctprsn_prsn, 'Othr')
-            if xml_tx_new_exctprsn_prsn_othr is not None:
-                xml_tx_new_exctprsn_prsn_othr_schmenm = xml_find(xml_tx_new_exctprsn_prsn_othr, 'SchmeNm')
-                if xml_find(xml_tx_new_exctprsn_prsn_othr_schmenm, 'Cd') is not None:
-                    if xml_find_text(xml_tx_new_exctprsn_prsn_othr_schmenm, 'Cd') != 'NIDN':
-                        single_trade_exec_type = xml_find_text(xml_tx_new_exctprsn_prsn_othr_schmenm, 'Cd')
-                    else:
-                        single_trade_exec_type = 'NIND'
-
-                elif xml_find(xml_tx_new_exctprsn_prsn_othr_schmenm, 'Prtry') is not None:
-                    single_trade_exec_type = xml_find_text(xml_tx_new_exctprsn_prsn_othr_schmenm, 'Prtry')
-
-        elif xml_find(xml_tx_new_exctprsn, 'Algo') is not None:
-            single_trade_exec_type = 'ALGO'
-
-        elif xml_find(xml_tx_new_exctprsn, 'Clnt') is not None:
-                single_trade_exec_type = 'CLIENT'
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Trade Execution Code/np
-        xml_tx_new_exctprsn_prsn = xml_find(xml_tx_new_exctprsn, 'Prsn')
-        if xml_find(xml_tx_new_exctprsn, 'Prsn') is not None:
-            xml_tx_new_exctprsn_prsn_othr = xml_find(xml_tx_new_exctprsn_prsn, 'Othr')
-            if xml_tx_new_exctprsn_prsn_othr is not None:
-                if xml_find(xml_tx_new_exctprsn_prsn_othr, 'Id') is not None:
-                    # NOTE: this is NNIP specific
-                    if client_mode == 'NNIP':
-                        single_trade_exec_np = xml_find_text(xml_tx_new_exctprsn_prsn_othr, 'Id')
-                    else:
-                        single_trade_exec_code = xml_find_text(xml_tx_new_exctprsn_prsn_othr, 'Id')
+    return xml_find_text(xml_ref, 'Amt')
 
-        elif xml_find(xml_tx_new_exctprsn, 'Algo') is not None:
-            # NOTE: this is NNIP specific
-            if client_mode == 'NNIP':
-                single_trade_exec_np = xml_find_text(xml_tx_new_exctprsn, 'Algo')
-            else:
-                single_trade_exec_code = xml_find_text(xml_tx_new_exctprsn, 'Algo')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Trade Country of Branch
-        if xml_tx_new_exctprsn_prsn is not None:
-            if xml_find(xml_tx_new_exctprsn_prsn, 'CtryOfBrnch') is not None:
-                single_trade_exec_ctry = xml_find_text(xml_tx_new_exctprsn_prsn, 'CtryOfBrnch')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Waiver and indicator details ---------------------------
-    list_trade_waiver_ind    = []
-    single_trade_shrt_ind    = ''
-    list_trade_post_ind      = []
-    single_trade_drv_ind     = ''
-    single_trade_sec_ind     = ''
-
-# ----------------------------- Waiver Indicator
-    xml_tx_new_addtl = xml_find(xml_tx_new, 'AddtlAttrbts')
-    if xml_tx_new_addtl is not None:
-        for xml_indic in xml_findall(xml_tx_new_addtl, 'WvrInd'):
-            if xml_indic is not None:
-                list_trade_waiver_ind.append(xml_indic.text)
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Short Selling Indicator
-        if xml_find(xml_tx_new_addtl, 'ShrtSellgInd') is not None:
-            single_trade_shrt_ind = xml_find_text(xml_tx_new_addtl, 'ShrtSellgInd')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- OTC Post-trade Indicator
-        for xml_indic in xml_findall(xml_tx_new_addtl, 'OTCPstTradInd'):
-            if xml_indic is not None:
-                list_trade_post_ind.append(xml_indic.text)
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Comodity Derivative Indicator
-        xml_tx_new_rskrdcg = xml_find(xml_tx_new_addtl, 'RskRdcgTx')
-        if xml_tx_new_rskrdcg is not None:
-            if xml_find_text(xml_tx_new_addtl, 'RskRdcgTx') == '1':
-                single_trade_drv_ind = 'True'
-            elif xml_find_text(xml_tx_new_addtl, 'RskRdcgTx') == '0':
-                single_trade_drv_ind = 'False'
-            else:
-                single_trade_drv_ind = xml_find_text(xml_tx_new_addtl, 'RskRdcgTx')
-# ----------------------------------------------------------------------------------------
-
-# ----------------------------- Securities Financing Indicator
-        xml_tx_new_addtl_scties = xml_find(xml_tx_new_addtl, 'SctiesFincgTxInd')
-        if xml_tx_new_addtl_scties is not None:
-            if xml_find_text(xml_tx_new_addtl, 'SctiesFincgTxInd') == '1':
-                single_trade_sec_ind = 'True'
-            elif xml_find_text(xml_tx_new_addtl, 'SctiesFincgTxInd') == '0':
-                single_trade_sec_ind = 'False'
-            else:
-                single_trade_sec_ind = xml_find_text(xml_tx_new_addtl, 'SctiesFincgTxInd')
-# ----------------------------------------------------------------------------------------
-
-    out_row[ind_trade_invst_type]  = single_trade_invst_type
-    out_row[ind_trade_invst_np]    = single_trade_invst_np
-    out_row[ind_trade_invst_code]  = single_trade_invst_code
-    out_row[ind_trade_invst_ctry]  = single_trade_invst_ctry
-    out_row[ind_trade_exec_type]   = single_trade_exec_type
-    out_row[ind_trade_exec_np]     = single_trade_exec_np
-    out_row[ind_trade_exec_code]   = single_trade_exec_code
-    out_row[ind_trade_exec_ctry]   = single_trade_exec_ctry
-    out_row[ind_trade_waiver_ind]  = delim.join(list_trade_waiver_ind)
-    out_row[ind_trade_shrt_ind]    = single_trade_shrt_ind
-    out_row[ind_trade_post_ind]    = delim.join(list_trade_post_ind)
-    out_row[ind_trade_drv_ind]     = single_trade_drv_ind
-    out_row[ind_trade_sec_ind]     = single_trade_sec_ind
 
-    # Eligibility details
-    single_elig_branch_loc   = ''
-    single_elig_trnsc_type   = ''
-    single_elig_cycle_event  = ''
+# MntryVal block of the strike price
+def to_signed_amt(xml_ref):
 
-    xml_tx_new_elig = xml_find(xml_tx_new, 'ElgbltyDtrmntnAttrbts')
-    if xml_tx_new_elig is not None:
-        single_elig_branch_loc   = xml_find_text(xml_tx_new_elig, 'BrnchLctn')
-        single_elig_trnsc_type   = xml_find_text(xml_tx_new_elig, 'TxTp')
-        single_elig_cycle_event  = xml_find_text(xml_tx_new_elig, 'LfcclEvnt')
+    if xml_find_text(xml_ref, 'Sgn') in ('1', 'true'):
+        return '-' + xml_find_text(xml_ref, 'Amt')
 
-    out_row[ind_elig_branch_loc]   = single_elig_branch_loc
-    out_row[ind_elig_trnsc_type]   = single_elig_trnsc_type
-    out_row[ind_elig_cycle_event]  = single_elig_cycle_event
+    return xml_find_text(xml_ref, 'Amt')
 
-    return
 
+def to_pending(xml_ref):
 
-def get_output_row_cxl(xml_tx_cxl):
+    return 'PNDG' if xml_text(xml_ref) == 'PNDG' else ''
 
-    # Report Details
-    out_row[ind_report_status]     = 'CANC'
-    out_row[ind_trans_ref_no]      = xml_find_text(xml_tx_cxl, 'TxId')
-    out_row[ind_trans_id_code]     = ''
-    out_row[ind_entity_id_code]    = xml_find_text(xml_tx_cxl, 'ExctgPty')
-    out_row[ind_cover_201465eu]    = ''
 
-    # Buyer Details
-    out_row[ind_buy_acct_id_type]  = ''
-    out_row[ind_buy_acct_np_code]  = ''
-    out_row[ind_buy_acct_id_code]  = ''
-    out_row[ind_buy_acct_country]  = ''
-    out_row[ind_buy_acct_forename] = ''
-    out_row[ind_buy_acct_surname]  = ''
-    out_row[ind_buy_acct_birthdt]  = ''
+# UpFrntPmt block, the amount & currency are only output when there is an amount
+def to_upfront_amt(xml_ref):
 
-    # Buyer Decision Maker details
-    out_row[ind_buy_dcsn_id_type]  = ''
-    out_row[ind_buy_dcsn_np_code]  = ''
-    out_row[ind_buy_dcsn_id_code]  = ''
-    out_row[ind_buy_dcsn_forename] = ''
-    out_row[ind_buy_dcsn_surname]  = ''
-    out_row[ind_buy_dcsn_birthdt]  = ''
-
-    # Seller Details
-    out_row[ind_sel_acct_id_type]  = ''
-    out_row[ind_sel_acct_np_code]  = ''
-    out_row[ind_sel_acct_id_code]  = ''
-    out_row[ind_sel_acct_country]  = ''
-    out_row[ind_sel_acct_forename] = ''
-    out_row[ind_sel_acct_surname]  = ''
-    out_row[ind_sel_acct_birthdt]  = ''
+    upfront_amt = xml_find_text(xml_ref, 'Amt')
 
-    # Seller Decision Maker details
-    out_row[ind_sel_dcsn_id_type]  = ''
-    out_row[ind_sel_dcsn_np_code]  = ''
-    out_row[ind_sel_dcsn_id_code]  = ''
-    out_row[ind_sel_dcsn_forename] = ''
-    out_row[ind_sel_dcsn_surname]  = ''
-    out_row[ind_sel_dcsn_birthdt]  = ''
+    if upfront_amt and xml_find_text(xml_ref, 'Sgn') in ('1', 'true'):
+        return '-' + upfront_amt
+
+    return upfront_amt
+
+
+def to_upfront_ccy(xml_ref):
+
+    xml_upfront_amt = xml_find(xml_ref, 'Amt')
+
+    return xml_attrib(xml_upfront_amt, 'Ccy') if xml_text(xml_upfront_amt) else ''
+
+
+# NOTE: the ISIN of a basket is output one character per value, as the original mapping did
+def to_chars(xml_ref):
+
+    return list(xml_text(xml_ref))
+
+
+# Term block of an underlying index, only output when it has both a value & a unit
+def to_term(xml_ref):
+
+    xml_term_val = xml_find(xml_ref, 'Val')
+    xml_term_unit = xml_find(xml_ref, 'Unit')
+
+    if xml_term_val is None or xml_term_unit is None:
+        return None
+
+    return xml_text(xml_term_val) + ' ' + xml_text(xml_term_unit)
+
+
+# NOTE: this is NNIP specific, trader ids go to the np columns instead of the code columns
+def to_nnip_np(xml_ref):
+
+    return xml_text(xml_ref) if client_mode == 'NNIP' else None
+
+
+def to_nnip_code(xml_ref):
+
+    return None if client_mode == 'NNIP' else xml_text(xml_ref)
+
+
+deriv_path = 'FinInstrm/Othr/DerivInstrmAttrbts/'
+
+# (column, fallbacks) for the columns with one value per New block
+new_row_map = [
+    # Report Details
+    (ind_trans_ref_no,      [('TxId', xml_text)]),
+    (ind_entity_id_code,    [('ExctgPty', xml_text)]),
+    (ind_cover_201465eu,    [('InvstmtPtyInd', to_indicator('true', 'false'))]),
 
     # Transmission details
-    out_row[ind_trnsm_order_ind]   = ''
-    out_row[ind_trnsm_buy_id_code] = ''
-    out_row[ind_trnsm_sel_id_code] = ''
+    (ind_trnsm_order_ind,   [('OrdrTrnsmssn/TrnsmssnInd', to_indicator('True', 'False'))]),
+    (ind_trnsm_buy_id_code, [('OrdrTrnsmssn/TrnsmttgBuyr', xml_text)]),
+    (ind_trnsm_sel_id_code, [('OrdrTrnsmssn/TrnsmttgSellr', xml_text)]),
 
     # Transaction details
-    out_row[ind_trnsc_datetime]    = ''
-    out_row[ind_trnsc_trade_cap]   = ''
-    out_row[ind_trnsc_qty_type]    = ''
-    out_row[ind_trnsc_qty_val]     = ''
-    out_row[ind_trnsc_qty_ccy]     = ''
-    out_row[ind_trnsc_drv_notion]  = ''
-    out_row[ind_trnsc_prc_type]    = ''
-    out_row[ind_trnsc_prc_val]     = ''
-    out_row[ind_trnsc_prc_ccy]     = ''
-    out_row[ind_trnsc_net_amt]     = ''
-    out_row[ind_trnsc_venue]       = ''
-    out_row[ind_trnsc_brnch_ctry]  = ''
-    out_row[ind_trnsc_up_fr_amt]   = ''
-    out_row[ind_trnsc_up_fr_ccy]   = ''
-    out_row[ind_trnsc_cmpnt_id]    = ''
+    (ind_trnsc_datetime,    [('Tx/TradDt', xml_text)]),
+    (ind_trnsc_trade_cap,   [('Tx/TradgCpcty', xml_text)]),
+    (ind_trnsc_qty_type,    [('Tx/Qty/Unit', 'UNIT'),
+                             ('Tx/Qty/NmnlVal', 'NOMI'),
+                             ('Tx/Qty/MntryVal', 'MONE')]),
+    (ind_trnsc_qty_val,     [('Tx/Qty/Unit', xml_text),
+                             ('Tx/Qty/NmnlVal', xml_text),
+                             ('Tx/Qty/MntryVal', xml_text)]),
+    (ind_trnsc_qty_ccy,     [('Tx/Qty/NmnlVal', to_ccy),
+                             ('Tx/Qty/MntryVal', to_ccy)]),
+    (ind_trnsc_drv_notion,  [('Tx/DerivNtnlChng', xml_text)]),
+    (ind_trnsc_prc_type,    [('Tx/Pric/Pric/MntryVal', 'MONE'),
+                             ('Tx/Pric/Pric/Pctg', 'PERC'),
+                             ('Tx/Pric/Pric/Yld', 'YIEL'),
+                             ('Tx/Pric/Pric/BsisPts', 'BPNT'),
+                             ('Tx/Pric/NoPric/Pdg', xml_text)]),
+    (ind_trnsc_prc_val,     [('Tx/Pric/Pric/MntryVal', to_signed_float),
+                             ('Tx/Pric/Pric/Pctg', xml_text),
+                             ('Tx/Pric/Pric/Yld', xml_text),
+                             ('Tx/Pric/Pric/BsisPts', xml_text),
+                             ('Tx/Pric/NoPric/Pdg', to_pending)]),
+    (ind_trnsc_prc_ccy,     [('Tx/Pric/Pric/MntryVal/Amt', to_ccy),
+                             ('Tx/Pric/NoPric/Ccy', xml_text)]),
+    (ind_trnsc_net_amt,     [('Tx/NetAmt', xml_text)]),
+    (ind_trnsc_venue,       [('Tx/TradVn', xml_text)]),
+    (ind_trnsc_brnch_ctry,  [('Tx/CtryOfBrnch', xml_text)]),
+    (ind_trnsc_up_fr_amt,   [('Tx/UpFrntPmt', to_upfront_amt)]),
+    (ind_trnsc_up_fr_ccy,   [('Tx/UpFrntPmt', to_upfront_ccy)]),
+    (ind_trnsc_cmpnt_id,    [('Tx/CmplxTradCmpntId', xml_text)]),
 
     # Instrument details
-    out_row[ind_instr_id_code]     = ''
-    out_row[ind_instr_full_name]   = ''
-    out_row[ind_instr_class]       = ''
-    out_row[ind_instr_notnl_ccy1]  = ''
-    out_row[ind_instr_notnl_ccy2]  = ''
-    out_row[ind_instr_price_mult]  = ''
-    out_row[ind_instr_under_code]  = ''
-    out_row[ind_instr_under_name]  = ''
-    out_row[ind_instr_under_term]  = ''
-    out_row[ind_instr_optn_type]   = ''
-    out_row[ind_instr_strk_type]   = ''
-    out_row[ind_instr_strk_price]  = ''
-    out_row[ind_instr_strk_ccy]    = ''
-    out_row[ind_instr_optn_exrc]   = ''
-    out_row[ind_instr_mat_date]    = ''
-    out_row[ind_instr_exp_date]    = ''
-    out_row[ind_instr_dlvry_type]  = ''
+    (ind_instr_id_code,     [('FinInstrm/Id', xml_text),
+                             ('FinInstrm/Othr/FinInstrmGnlAttrbts/Id', xml_text)]),
+    (ind_instr_full_name,   [('FinInstrm/Othr/FinInstrmGnlAttrbts/FullNm', xml_text)]),
+    (ind_instr_class,       [('FinInstrm/Othr/FinInstrmGnlAttrbts/ClssfctnTp', xml_text)]),
+    (ind_instr_notnl_ccy1,  [('FinInstrm/Othr/FinInstrmGnlAttrbts/NtnlCcy', xml_text)]),
+    (ind_instr_notnl_ccy2,  [(deriv_path + 'AsstClssSpcfcAttrbts/Intrst/OthrNtnlCcy', xml_text),
+                             (deriv_path + 'AsstClssSpcfcAttrbts/FX/OthrNtnlCcy', xml_text)]),
+    (ind_instr_price_mult,  [(deriv_path + 'PricMltplr', xml_text)]),
+    (ind_instr_optn_type,   [(deriv_path + 'OptnTp', xml_text)]),
+    (ind_instr_strk_type,   [(deriv_path + 'StrkPric/Pric/MntryVal', 'MONE'),
+                             (deriv_path + 'StrkPric/Pric/Pctg', 'PERC'),
+                             (deriv_path + 'StrkPric/Pric/Yld', 'YIEL'),
+                             (deriv_path + 'StrkPric/Pric/BsisPts', 'BPNT'),
+                             (deriv_path + 'StrkPric/NoPric/Pdg', xml_text)]),
+    (ind_instr_strk_price,  [(deriv_path + 'StrkPric/Pric/MntryVal', to_signed_amt),
+                             (deriv_path + 'StrkPric/Pric/Pctg', xml_text),
+                             (deriv_path + 'StrkPric/Pric/Yld', xml_text),
+                             (deriv_path + 'StrkPric/Pric/BsisPts', xml_text),
+                             (deriv_path + 'StrkPric/NoPric/Pdg', xml_text)]),
+    (ind_instr_strk_ccy,    [(deriv_path + 'StrkPric/Pric/MntryVal/Amt', to_ccy),
+                             (deriv_path + 'StrkPric/NoPric/Ccy', xml_text)]),
+    (ind_instr_optn_exrc,   [(deriv_path + 'OptnExrcStyle', xml_text)]),
+    (ind_instr_mat_date,    [(deriv_path + 'MtrtyDt', xml_text)]),
+    (ind_instr_exp_date,    [(deriv_path + 'XpryDt', xml_text)]),
+    (ind_instr_dlvry_type,  [(deriv_path + 'DlvryTp', xml_text)]),
 
     # Trading details
-    out_row[ind_trade_invst_type]  = ''
-    out_row[ind_trade_invst_np]    = ''
-    out_row[ind_trade_invst_code]  = ''
-    out_row[ind_trade_invst_ctry]  = ''
-    out_row[ind_trade_exec_type]   = ''
-    out_row[ind_trade_exec_np]     = ''
-    out_row[ind_trade_exec_code]   = ''
-    out_row[ind_trade_exec_ctry]   = ''
-    out_row[ind_trade_waiver_ind]  = ''
-    out_row[ind_trade_shrt_ind]    = ''
-    out_row[ind_trade_post_ind]    = ''
-    out_row[ind_trade_drv_ind]     = ''
-    out_row[ind_trade_sec_ind]     = ''
+    (ind_trade_invst_type,  [('InvstmtDcsnPrsn/Prsn/Othr/SchmeNm', get_id_type),
+                             ('InvstmtDcsnPrsn/Algo', 'ALGO')]),
+    (ind_trade_invst_np,    [('InvstmtDcsnPrsn/Prsn/Othr/Id', to_nnip_np),
+                             ('InvstmtDcsnPrsn/Algo', to_nnip_np)]),
+    (ind_trade_invst_code,  [('InvstmtDcsnPrsn/Prsn/Othr/Id', to_nnip_code),
+                             ('InvstmtDcsnPrsn/Algo', to_nnip_code)]),
+    (ind_trade_invst_ctry,  [('InvstmtDcsnPrsn/Prsn/CtryOfBrnch', xml_text)]),
+    (ind_trade_exec_type,   [('ExctgPrsn/Prsn/Othr/SchmeNm', get_id_type),
+                             ('ExctgPrsn/Algo', 'ALGO'),
+                             ('ExctgPrsn/Clnt', 'CLIENT')]),
+    (ind_trade_exec_np,     [('ExctgPrsn/Prsn/Othr/Id', to_nnip_np),
+                             ('ExctgPrsn/Algo', to_nnip_np)]),
+    (ind_trade_exec_code,   [('ExctgPrsn/Prsn/Othr/Id', to_nnip_code),
+                             ('ExctgPrsn/Algo', to_nnip_code)]),
+    (ind_trade_exec_ctry,   [('ExctgPrsn/Prsn/CtryOfBrnch', xml_text)]),
+    (ind_trade_shrt_ind,    [('AddtlAttrbts/ShrtSellgInd', xml_text)]),
+    (ind_trade_drv_ind,     [('AddtlAttrbts/RskRdcgTx', to_indicator('True', 'False'))]),
+    (ind_trade_sec_ind,     [('AddtlAttrbts/SctiesFincgTxInd', to_indicator('True', 'False'))]),
 
     # Eligibility details
-    out_row[ind_elig_branch_loc]   = ''
-    out_row[ind_elig_trnsc_type]   = ''
-    out_row[ind_elig_cycle_event]  = ''
+    (ind_elig_branch_loc,   [('ElgbltyDtrmntnAttrbts/BrnchLctn', xml_text)]),
+    (ind_elig_trnsc_type,   [('ElgbltyDtrmntnAttrbts/TxTp', xml_text)]),
+    (ind_elig_cycle_event,  [('ElgbltyDtrmntnAttrbts/LfcclEvnt', xml_text)]),
+]
+
+swap_leg_map = [
+    (ind_instr_under_code,  [('Sngl/ISIN', xml_text),
+                             ('Sngl/Indx/ISIN', xml_text),
+                             ('Bskt/ISIN', to_chars),
+                             ('Bskt/Indx/ISIN', to_chars)]),
+    (ind_instr_under_name,  [('Sngl/Indx/Nm/RefRate/Indx', xml_text),
+                             ('Sngl/Indx/Nm/RefRate/Nm', xml_text),
+                             ('Bskt/Indx/Nm/Ref/Indx', xml_text),
+                             ('Bskt/Indx/Nm/Ref/Nm', xml_text),
+                             ('Bskt/Indx/Nm/Ref', '')]),
+    (ind_instr_under_term,  [('Sngl/Indx/Nm/Term', to_term),
+                             ('Bskt/Indx/Nm/Term', to_term)]),
+]
+
+# (group path, value prefix, default value, column map) for the columns with a value from each repeat of a group
+# block: every value found is output with the prefix and, for a repeat with no fallback found, the default is output
+# instead (or nothing if it's None). A column's values from every repeat & group are joined with delim, except for the
+# new_row_last_value columns which keep the last one.
+new_row_groups = [
+    ('Buyr/AcctOwnr', '', '', [
+        (ind_buy_acct_id_type,  [('Id/LEI', 'LEI'),
+                                 ('Id/MIC', 'MIC'),
+                                 ('Id/Prsn/Othr/SchmeNm', get_id_type),
+                                 ('Id/Intl', xml_text)]),
+        (ind_buy_acct_np_code,  []),
+        (ind_buy_acct_id_code,  [('Id/LEI', to_id_code),
+                                 ('Id/MIC', to_id_code),
+                                 ('Id/Prsn/Othr/Id', to_id_code),
+                                 ('Id/Intl', to_id_code)]),
+        (ind_buy_acct_country,  [('CtryOfBrnch', xml_text)]),
+        (ind_buy_acct_forename, [('Id/Prsn/FrstNm', xml_text)]),
+        (ind_buy_acct_surname,  [('Id/Prsn/Nm', xml_text)]),
+        (ind_buy_acct_birthdt,  [('Id/Prsn/BirthDt', xml_text)]),
+    ]),
+    ('Buyr/DcsnMakr', '', '', [
+        (ind_buy_dcsn_id_type,  [('LEI', 'LEI'),
+                                 ('Prsn/Othr/SchmeNm', get_id_type)]),
+        (ind_buy_dcsn_np_code,  []),
+        (ind_buy_dcsn_id_code,  [('LEI', to_id_code),
+                                 ('Prsn/Othr/Id', to_id_code)]),
+        (ind_buy_dcsn_forename, [('Prsn/FrstNm', xml_text)]),
+        (ind_buy_dcsn_surname,  [('Prsn/Nm', xml_text)]),
+        (ind_buy_dcsn_birthdt,  [('Prsn/BirthDt', xml_text)]),
+    ]),
+    ('Sellr/AcctOwnr', '', '', [
+        (ind_sel_acct_id_type,  [('Id/LEI', 'LEI'),
+                                 ('Id/MIC', 'MIC'),
+                                 ('Id/Prsn/Othr/SchmeNm', get_id_type),
+                                 ('Id/Intl', xml_text)]),
+        (ind_sel_acct_np_code,  []),
+        (ind_sel_acct_id_code,  [('Id/LEI', to_id_code),
+                                 ('Id/MIC', to_id_code),
+                                 ('Id/Prsn/Othr/Id', to_id_code),
+                                 ('Id/Intl', to_id_code)]),
+        (ind_sel_acct_country,  [('CtryOfBrnch', xml_text)]),
+        (ind_sel_acct_forename, [('Id/Prsn/FrstNm', xml_text)]),
+        (ind_sel_acct_surname,  [('Id/Prsn/Nm', xml_text)]),
+        (ind_sel_acct_birthdt,  [('Id/Prsn/BirthDt', xml_text)]),
+    ]),
+    ('Sellr/DcsnMakr', '', '', [
+        (ind_sel_dcsn_id_type,  [('LEI', 'LEI'),
+                                 ('Prsn/Othr/SchmeNm', get_id_type)]),
+        (ind_sel_dcsn_np_code,  []),
+        (ind_sel_dcsn_id_code,  [('LEI', to_id_code),
+                                 ('Prsn/Othr/Id', to_id_code)]),
+        (ind_sel_dcsn_forename, [('Prsn/FrstNm', xml_text)]),
+        (ind_sel_dcsn_surname,  [('Prsn/Nm', xml_text)]),
+        (ind_sel_dcsn_birthdt,  [('Prsn/BirthDt', xml_text)]),
+    ]),
+    (deriv_path + 'UndrlygInstrm/Swp/SwpIn', '', None, swap_leg_map),
+    (deriv_path + 'UndrlygInstrm/Swp/SwpOut', '-', None, swap_leg_map),
+    ('AddtlAttrbts/WvrInd', '', None, [(ind_trade_waiver_ind, [('', xml_text)])]),
+    ('AddtlAttrbts/OTCPstTradInd', '', None, [(ind_trade_post_ind, [('', xml_text)])]),
+]
+
+new_row_last_value = (ind_instr_under_name, ind_instr_under_term)
+
+# the plan compiled from new_row_map & new_row_groups for the current namespace, a function filling the columns of
+# out_row from a New block, and its Python source (registered with linecache, so tracebacks & profilers can show it)
+new_row_plan = None
+new_row_plan_source = ''
+new_row_plans = {}  # (plan, source) compiled for each (namespace tag, parser), so files after the first don't compile
+
+
+# adds the steps finding the blocks on a path to a plan (each (parent slot, tag) step is added once, slot 0 being the
+# block the plan is run on), returning the slot of the path's last block
+def compile_plan_path(path, plan_steps, plan_slots):
+
+    slot = 0
+
+    for tag in path.split('/') if path else []:
+        step = (slot, xml_tag(tag))
+        if step not in plan_slots:
+            plan_steps.append(step)
+            plan_slots[step] = len(plan_steps)
+        slot = plan_slots[step]
+
+    return slot
+
+
+# returns the columns of a column map, with the paths of their fallbacks compiled into a plan's slots, in sections of
+# (guard slot, columns) where the guard is the deepest block on the paths of all a section's columns, so the whole
+# section is skipped when it isn't found
+def compile_plan_columns(row_map, plan_steps, plan_slots):
+
+    plan_sections = []
+
+    for column, fallbacks in row_map:
+        plan_fallbacks = [(compile_plan_path(path, plan_steps, plan_slots), transform) for path, transform in fallbacks]
+
+        guard_slots = None
+        for slot, transform in plan_fallbacks:
+            path_slots = [slot]
+            while path_slots[-1]:
+                path_slots.append(plan_steps[path_slots[-1] - 1][0])
+            guard_slots = path_slots if guard_slots is None else [guard for guard in guard_slots if guard in path_slots]
+
+        guard_slot = guard_slots[0] if guard_slots else 0
+
+        if plan_sections and plan_sections[-1][0] == guard_slot:
+            plan_sections[-1][1].append((column, plan_fallbacks))
+        else:
+            plan_sections.append((guard_slot, [(column, plan_fallbacks)]))
+
+    return plan_sections
+
+
+# returns the source finding the child blocks with a qualified tag under a block, as a list (a compiled XPath
+# expression under lxml, added to plan_globals)
+def compile_plan_findall(block_source, tag, plan_globals):
+
+    if args.parser != 'lxml':
+        return '{0}.findall({1!r})'.format(block_source, tag)
+
+    xpath_var = 'xpath_' + str(len(plan_globals))
+    plan_globals[xpath_var] = xml_xpath('n:' + tag[len(xml_namespace_tag):])
+
+    return '{0}({1})'.format(xpath_var, block_source)
+
+
+# appends the source of a plan's steps to plan_lines, with each find nested under the test that its parent was found
+# (when profiling, the finds under each child of the block are timed as the section '{prefix}/{child tag} find', or
+# '{prefix} find' for children with no children of their own)
+def compile_plan_steps(block_var, plan_steps, indent, plan_globals, plan_lines, profile_prefix=None):
+
+    child_steps = {}
+
+    for slot, (parent_slot, tag) in enumerate(plan_steps, 1):
+        child_steps.setdefault(parent_slot, []).append((slot, tag))
+
+    if plan_steps:
+        plan_lines.append(indent + ' = '.join(block_var + str(slot) for slot in range(1, len(plan_steps) + 1)) + ' = None')
+
+    def profile_section(slot, tag):
+        return profile_prefix + ('/' + tag[len(xml_namespace_tag):] if slot in child_steps else '') + ' find'
+
+    def compile_child_steps(parent_slot, indent):
+        sibling_steps = child_steps.get(parent_slot, [])
+        for sibling_no, (slot, tag) in enumerate(sibling_steps):
+            if args.parser == 'lxml':
+                find_source = '({0} or (None,))[0]'.format(
+                    compile_plan_findall(block_var + str(parent_slot), tag, plan_globals))
+            else:
+                find_source = '{0}{1}.find({2!r})'.format(block_var, parent_slot, tag)
+            plan_lines.append('{0}{1}{2} = {3}'.format(indent, block_var, slot, find_source))
+            if slot in child_steps:
+                plan_lines.append('{0}if {1}{2} is not None:'.format(indent, block_var, slot))
+                compile_child_steps(slot, indent + '    ')
+            if parent_slot == 0 and profile_prefix is not None:
+                if sibling_no + 1 == len(sibling_steps) or \
+                        profile_section(slot, tag) != profile_section(*sibling_steps[sibling_no + 1]):
+                    plan_lines.append('{0}profile_time = profile_add({1!r}, profile_time)'.format(
+                        indent, profile_section(slot, tag)))
+
+    compile_child_steps(0, indent)
+
+
+# returns the source of the value of a fallback found at a slot, adding a transform function to plan_globals
+def compile_plan_value(block_var, slot, transform, plan_globals):
+
+    if transform is xml_text:
+        return "({0}{1}.text or '')".format(block_var, slot)
+    elif isinstance(transform, str):
+        return repr(transform)
+
+    transform_var = 'transform_' + str(len(plan_globals))
+    plan_globals[transform_var] = transform
+
+    return '{0}({1}{2})'.format(transform_var, block_var, slot)
+
+
+# appends the source of a section of columns to plan_lines, each column set to its first fallback found: in out_row
+# for a New block, or appended to the column's values_{n} list for a group (values_index maps columns to their n)
+def compile_plan_section(block_var, guard_slot, columns, group, values_index, indent, plan_globals, plan_lines):
+
+    prefix, default = group if group is not None else ('', None)
+    prefix_source = repr(prefix) + ' + ' if prefix else ''
+
+    if guard_slot:
+        plan_lines.append('{0}if {1}{2} is not None:'.format(indent, block_var, guard_slot))
+        indent += '    '
+
+    for column, fallbacks in columns:
+        plan_lines.append('{0}# column {1}'.format(indent, column))
+        values_var = 'values_' + str(values_index.get(column))
+        value_sources = [(slot, compile_plan_value(block_var, slot, transform, plan_globals))
+                         for slot, transform in fallbacks]
+
+        # text & fixed values are never None (or a list), so the fallbacks are a plain if / elif
+        if all(transform is xml_text or isinstance(transform, str) for slot, transform in fallbacks):
+            for fallback_no, (slot, value_source) in enumerate(value_sources):
+                plan_lines.append('{0}{1} {2}{3} is not None:'.format(indent, 'elif' if fallback_no else 'if', block_var, slot))
+                if group is None:
+                    plan_lines.append('{0}    out_row[{1}] = {2}'.format(indent, column, value_source))
+                else:
+                    plan_lines.append('{0}    {1}.append({2}{3})'.format(indent, values_var, prefix_source, value_source))
+
+            if group is not None and default is not None:
+                plan_lines.append('{0}{1}'.format(indent, 'else:' if fallbacks else 'if True:'))
+                plan_lines.append('{0}    {1}.append({2!r})'.format(indent, values_var, default))
+            continue
+
+        plan_lines.append(indent + 'value = None')
+        for slot, value_source in value_sources:
+            plan_lines.append('{0}if value is None and {1}{2} is not None:'.format(indent, block_var, slot))
+            plan_lines.append('{0}    value = {1}'.format(indent, value_source))
+
+        if group is None:
+            plan_lines.append(indent + 'if value is not None:')
+            plan_lines.append('{0}    out_row[{1}] = value'.format(indent, column))
+        else:
+            if default is not None:
+                plan_lines.append(indent + 'if value is None:')
+                plan_lines.append('{0}    {1}.append({2!r})'.format(indent, values_var, default))
+            plan_lines.append(indent + ('elif' if default is not None else 'if') + ' type(value) is list:')
+            plan_lines.append('{0}    {1}.extend([{2}item for item in value])'.format(indent, values_var, prefix_source))
+            plan_lines.append(indent + 'elif value is not None:')
+            plan_lines.append('{0}    {1}.append({2}value)'.format(indent, values_var, prefix_source))
+
+    if guard_slot and group is not None and default is not None:
+        plan_lines.append(indent[:-4] + 'else:')
+        for column, fallbacks in columns:
+            plan_lines.append('{0}values_{1}.append({2!r})'.format(indent, values_index[column], default))
+
+
+# returns the section a plan's columns are profiled in, 'New/' & the tag of the New block's child their first fallback
+# is under, or 'New' for a child with no children of its own
+def compile_plan_profile_section(plan_steps, columns):
+
+    for column, fallbacks in columns:
+        for slot, transform in fallbacks:
+            while slot and plan_steps[slot - 1][0]:
+                slot = plan_steps[slot - 1][0]
+            if slot and any(parent_slot == slot for parent_slot, tag in plan_steps):
+                return 'New/' + plan_steps[slot - 1][1][len(xml_namespace_tag):]
+
+    return 'New'
+
+
+# compiles new_row_map & new_row_groups into new_row_plan, with every tag qualified in xml_namespace_tag
+#
+# The plan is generated as straight-line Python: a find for each step of the paths in the map, nested so a missing
+# block skips everything under it, then each section of columns under a test that its guard block was found.
+#
+# When profiling, the plan also times its finds under each child of the New block, the columns under each child (once
+# per New block) & each repeat of each group block (see profile_add).
+def compile_new_row_plan():
+
+    global new_row_plan
+    global new_row_plan_source
+
+    profiling = args.profile is not None
+    plan_key = (xml_namespace_tag, args.parser, profiling)
+
+    if plan_key in new_row_plans:
+        new_row_plan, new_row_plan_source = new_row_plans[plan_key]
+        linecache.cache['<new_row_plan>'] = (len(new_row_plan_source), None, new_row_plan_source.splitlines(True),
+                                             '<new_row_plan>')
+        return
+
+    plan_steps = []
+    plan_slots = {}
+    plan_sections = compile_plan_columns(new_row_map, plan_steps, plan_slots)
+
+    plan_groups = []
+    values_index = {}
+
+    for path, prefix, default, row_map in new_row_groups:
+        group_path, _, group_tag = path.rpartition('/')
+        group_steps = []
+        group_sections = compile_plan_columns(row_map, group_steps, {})
+
+        for column, fallbacks in row_map:
+            values_index.setdefault(column, len(values_index))
+
+        plan_groups.append((compile_plan_path(group_path, plan_steps, plan_slots), xml_tag(group_tag), (prefix, default),
+                            group_steps, group_sections))
+
+    plan_globals = {}
+    plan_lines = ['def run_new_row_plan(out_row, xml_new_0):', '']
+
+    if profiling:
+        plan_globals['profile_add'] = profile_add
+        plan_globals['perf_counter'] = time.perf_counter
+        plan_lines.append('    profile_time = perf_counter()')
+
+    compile_plan_steps('xml_new_', plan_steps, '    ', plan_globals, plan_lines, 'New' if profiling else None)
+    for section_no, (guard_slot, columns) in enumerate(plan_sections):
+        compile_plan_section('xml_new_', guard_slot, columns, None, values_index, '    ', plan_globals, plan_lines)
+        if profiling:
+            profile_section = compile_plan_profile_section(plan_steps, columns)
+            if section_no + 1 == len(plan_sections) or \
+                    profile_section != compile_plan_profile_section(plan_steps, plan_sections[section_no + 1][1]):
+                plan_lines.append('    profile_time = profile_add({0!r}, profile_time)'.format(profile_section))
+
+    plan_lines.append('')
+    for values_no in range(len(values_index)):
+        plan_lines.append('    values_{0} = []'.format(values_no))
+
+    for (path, prefix, default, row_map), (parent_slot, group_tag, group, group_steps, group_sections) in \
+            zip(new_row_groups, plan_groups):
+        plan_lines.append('    if xml_new_{0} is not None:'.format(parent_slot))
+        plan_lines.append('        for xml_group_0 in {0}:'.format(
+            compile_plan_findall('xml_new_' + str(parent_slot), group_tag, plan_globals)))
+        compile_plan_steps('xml_group_', group_steps, '            ', plan_globals, plan_lines)
+        for guard_slot, columns in group_sections:
+            compile_plan_section('xml_group_', guard_slot, columns, group, values_index, '            ', plan_globals,
+                                 plan_lines)
+        if profiling:
+            # a group's section is its path shortened to the first & last tags, e.g. FinInstrm/.../SwpIn
+            path_tags = path.split('/')
+            profile_section = '/'.join(path_tags if len(path_tags) < 3 else [path_tags[0], '...', path_tags[-1]])
+            plan_lines.append('            profile_time = profile_add({0!r}, profile_time)'.format(profile_section))
+            plan_lines.append('        profile_time = perf_counter()')
+
+    plan_lines.append('')
+    for column, values_no in values_index.items():
+        if column in new_row_last_value:
+            plan_lines.append("    out_row[{0}] = values_{1}[-1] if values_{1} else ''".format(column, values_no))
+        else:
+            plan_lines.append('    out_row[{0}] = {1!r}.join(values_{2})'.format(column, delim, values_no))
+
+    new_row_plan_source = '\n'.join(plan_lines) + '\n'
+    linecache.cache['<new_row_plan>'] = (len(new_row_plan_source), None, new_row_plan_source.splitlines(True),
+                                         '<new_row_plan>')
+
+    exec(compile(new_row_plan_source, '<new_row_plan>', 'exec'), plan_globals)
+    new_row_plan = plan_globals['run_new_row_plan']
+    new_row_plans[plan_key] = new_row_plan, new_row_plan_source
+
+
+# For all new transactions, filling in the columns of out_row (the row buffer is reset by the caller)
+def get_output_row_new(out_row, xml_tx_new, xml_file):
+
+    out_row[ind_report_status] = 'NEWT'
+
+    if new_row_plan is None:
+        compile_new_row_plan()
+    new_row_plan(out_row, xml_tx_new)
 
     return
 
 
-def output_bad_xml():
+# a cancellation only reports its TxId & ExctgPty, every other column is empty
+cxl_row_template = list(empty_row)
+cxl_row_template[ind_report_status] = 'CANC'
+
+
+# For all cancelled transactions, overwriting every column of out_row from cxl_row_template
+def get_output_row_cxl(out_row, xml_tx_cxl):
+
+    out_row[:] = cxl_row_template
+    out_row[ind_trans_ref_no]      = xml_find_text(xml_tx_cxl, 'TxId')
+    out_row[ind_entity_id_code]    = xml_find_text(xml_tx_cxl, 'ExctgPty')
+
+    return
+
+
+# Parquet output, the output rows are written in row groups of parquet_row_group_rows as the Tx blocks are converted
+parquet_row_group_rows = 100000
+parquet_float_columns = (ind_trnsc_qty_val, ind_trnsc_prc_val, ind_trnsc_net_amt)
+output_parquet_writer = None
+output_parquet_tables = []  # rows waiting to be written in the next row group, already in Arrow columns
+output_parquet_table_rows = 0
+
+
+# returns the schema of the Parquet output file, named from get_output_header_row
+def get_parquet_schema():
+
+    get_output_header_row()
+    schema_fields = []
+
+    for column, column_name in enumerate(out_row):
+        if column in parquet_float_columns:
+            schema_fields.append(pyarrow.field(column_name, pyarrow.float64()))
+        elif column == ind_trnsc_datetime:
+            schema_fields.append(pyarrow.field(column_name, pyarrow.timestamp('us', tz='UTC')))
+        else:
+            schema_fields.append(pyarrow.field(column_name, pyarrow.string()))
+
+    return pyarrow.schema(schema_fields)
+
+
+# prints a warning (unless -no-warn) for a value of the output that can't be held in its Parquet column, it's a null
+def warn_parquet_value(column, value):
+
+    if args.warn:
+        print('Warning: ' + output_parquet_writer.schema.names[column] + ' value ' + repr(value) +
+              ' is not valid, it is null in the Parquet file')
+
+
+# NOTE: a pending price (NoPric/Pdg) is output as PNDG in trnsc_prc_val, it's a null in Parquet (trnsc_prc_type
+# still holds PNDG)
+def to_parquet_float(value, column):
+
+    if value == '' or value == 'PNDG':
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        warn_parquet_value(column, value)
+        return None
+
+
+# returns a date time of the output as Arrow can read it into a UTC timestamp, or None. MiFIR trading date times are
+# in UTC, so a time without a zone offset is taken as UTC & a date on its own as midnight UTC.
+def to_parquet_timestamp_text(value):
+
+    if not value:
+        return None
+
+    for text in (value, value + 'Z', value + 'T00:00:00Z'):
+        try:
+            pyarrow.array([text], pyarrow.string()).cast(pyarrow.timestamp('us', tz='UTC'))
+            return text
+        except pyarrow.ArrowInvalid:
+            pass
+
+    warn_parquet_value(ind_trnsc_datetime, value)
+    return None
+
+
+def to_parquet_timestamps(values):
+
+    values = pyarrow.array([value or None for value in values], pyarrow.string())
+
+    try:
+        return values.cast(pyarrow.timestamp('us', tz='UTC'))
+    except pyarrow.ArrowInvalid:
+        pass
+
+    try:
+        return pyarrow.compute.assume_timezone(values.cast(pyarrow.timestamp('us')), 'UTC')
+    except pyarrow.ArrowInvalid:
+        pass
+
+    # a mix of date times with & without a zone offset (or one that isn't a date time), read one value at a time
+    values = pyarrow.array([to_parquet_timestamp_text(value) for value in values.to_pylist()], pyarrow.string())
+    return values.cast(pyarrow.timestamp('us', tz='UTC'))
+
+
+# adds output rows to the Parquet file, converted to Arrow columns straight away (much smaller than the rows), and
+# writes a row group whenever parquet_row_group_rows are waiting (or all the rows waiting, when flush is set)
+def write_parquet_rows(rows, flush=False):
+
+    global output_parquet_table_rows
+
+    if rows:
+        row_arrays = []
+        for column, values in enumerate(zip(*rows)):
+            if column in parquet_float_columns:
+                row_arrays.append(pyarrow.array([to_parquet_float(value, column) for value in values],
+                                                pyarrow.float64()))
+            elif column == ind_trnsc_datetime:
+                row_arrays.append(to_parquet_timestamps(values))
+            else:
+                row_arrays.append(pyarrow.array(values, pyarrow.string()))
+
+        output_parquet_tables.append(pyarrow.Table.from_arrays(row_arrays, schema=output_parquet_writer.schema))
+        output_parquet_table_rows += len(rows)
+
+    if output_parquet_table_rows >= parquet_row_group_rows or (flush and output_parquet_table_rows):
+        output_parquet_writer.write_table(pyarrow.concat_tables(output_parquet_tables),
+                                          row_group_size=parquet_row_group_rows)
+        output_parquet_tables.clear()
+        output_parquet_table_rows = 0
+
+
+# writes any rows still waiting & closes the Parquet file
+def close_parquet_output():
+
+    global output_parquet_writer
+
+    if output_parquet_writer is not None:
+        write_parquet_rows([], True)
+        output_parquet_writer.close()
+        output_parquet_writer = None
+
+
+# drops any rows still waiting & closes the Parquet file, so a conversion that stops part way (an exception) leaves
+# nothing behind for the next conversion in the same process, e.g. in the daemon
+def discard_parquet_output():
+
+    global output_parquet_writer
+    global output_parquet_table_rows
+
+    output_parquet_tables.clear()
+    output_parquet_table_rows = 0
+
+    if output_parquet_writer is not None:
+        try:
+            output_parquet_writer.close()
+        finally:
+            output_parquet_writer = None
+
+
+xml_excerpt_bytes = 400  # most bytes of the XML file written to the INVALID_XML row
+xml_excerpt_chunk = 1 << 20  # bytes searched for line breaks at a time, finding the line of a parse error
+
+
+# raised by xml_diagnose's start block handler at the start of the Tx block it's looking for, with its (line, column)
+class XmlTxFound(Exception):
+    pass
+
+
+# streams an XML file up to its first parse error with expat (the parser under ElementTree, so the errors are the
+# same), building no blocks at all so memory use does not grow with the file size. Returns the parse error message &
+# its (line, column), or None & (None, None) if the file parses, and the number of the last FinInstrmRptgTxRpt/Tx
+# block started before the error (or in the file if it parses). With stop_tx_no it stops at the start of that Tx
+# block instead, returning None, the (line, column) the block starts at & stop_tx_no.
+def xml_diagnose(xml_file, stop_tx_no=None):
+
+    xml_parser = expat.ParserCreate(namespace_separator='}')
+    xml_path = []  # tags of the open blocks (without their namespace), from the root down to the current one
+    tx_no = 0
+
+    def start_block(tag, attributes):
+
+        nonlocal tx_no
+
+        tag = tag.rpartition('}')[2]
+        if tag == 'Tx' and len(xml_path) > 0 and xml_path[-1] == 'FinInstrmRptgTxRpt':
+            tx_no += 1
+            if tx_no == stop_tx_no:
+                raise XmlTxFound(xml_parser.CurrentLineNumber, xml_parser.CurrentColumnNumber)
+        xml_path.append(tag)
+
+    def end_block(tag):
+
+        xml_path.pop()
+
+    xml_parser.StartElementHandler = start_block
+    xml_parser.EndElementHandler = end_block
+
+    try:
+        with open(xml_file, 'rb') as in_xml_file:
+            xml_parser.ParseFile(in_xml_file)
+
+    except expat.ExpatError as error:
+        return str(error), (error.lineno, error.offset), tx_no
+    except XmlTxFound as tx_found:
+        return None, tx_found.args, tx_no
+
+    return None, (None, None), tx_no
+
+
+# returns up to xml_excerpt_bytes of an XML file from before bytes before column (from 0) of line (from 1), as a parse
+# error gives them (centred on them by default), or from the start of the file if line is None, with each run of white
+# space & line breaks made one space
+def xml_excerpt(xml_file, line=None, column=0, before=xml_excerpt_bytes // 2):
+
+    with open(xml_file, 'rb') as in_xml_file:
+        if os.fstat(in_xml_file.fileno()).st_size == 0:
+            return ''
+        xml_bytes = mmap.mmap(in_xml_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with xml_bytes:
+        offset = 0
+
+        if line is not None:
+            # skip whole chunks of lines before the line, then the lines left in the chunk it starts in
+            lines_left = line - 1
+            while lines_left > 0 and offset < len(xml_bytes):
+                chunk_lines = xml_bytes[offset:offset + xml_excerpt_chunk].count(b'\n')
+                if chunk_lines < lines_left:
+                    lines_left -= chunk_lines
+                    offset += xml_excerpt_chunk
+                    continue
+
+                for _ in range(lines_left):
+                    offset = xml_bytes.find(b'\n', offset) + 1
+                lines_left = 0
+
+            offset = max(0, min(offset + column, len(xml_bytes)) - before)
+
+        xml_excerpt_text = xml_bytes[offset:offset + xml_excerpt_bytes].decode('utf-8', 'replace')
+
+    return ' '.join(xml_excerpt_text.split())
+
+
+# writes the INVALID_XML output file for an XML file that can't be converted, with the header row & one diagnostic
+# row (its layout is in the docstring at the top): INVALID_XML, an excerpt of the XML around its first parse error (or
+# from the start of the Tx block at fault, or of the file), the error message, the line & column of the parse error or
+# of the Tx block and the number of the Tx block at fault. error_tx_no is the number of the Tx block at fault if it's
+# known, otherwise the file is streamed to find its first parse error, so a bad file never has to fit into memory.
+# Returns the error message written, error with the parse error's message added.
+def output_bad_xml(xml_file, error, error_tx_no=None):
 
     global output_csv_file
     global out_row
 
-    # Slurp in XML file
-    with codecs.open(args.in_xml, 'r', 'utf-8') as in_xml_file:
-        xml_single_line = ''.join(line.strip() for line in in_xml_file)
+    close_parquet_output()
+
+    if error_tx_no is None:
+        parse_error, (line, column), error_tx_no = xml_diagnose(xml_file)
+        if parse_error is not None:
+            error += ': ' + parse_error
+        excerpt = xml_excerpt(xml_file, line, column or 0)
+    else:
+        # the file parses as far as the Tx block at fault, so the excerpt starts where that block does
+        parse_error, (line, column), _ = xml_diagnose(xml_file, error_tx_no)
+        excerpt = xml_excerpt(xml_file, line, column or 0, 0 if parse_error is None else xml_excerpt_bytes // 2)
 
     # Write output CSV file
     if output_csv_file is not None:
@@ -3456,148 +3716,392 @@ def output_bad_xml():
 
     output_csv_rows.writerow(out_row)
 
+    out_row = [''] * number_of_columns
     out_row[0] = 'INVALID_XML'
-    out_row[1] = xml_single_line
+    out_row[1] = excerpt
+    out_row[2] = error
+    out_row[3] = '' if line is None else str(line)
+    out_row[4] = '' if column is None else str(column)
+    out_row[5] = str(error_tx_no) if error_tx_no else ''
 
     output_csv_rows.writerow(out_row)
     output_csv_file.close()
 
+    return error
 
-# run code specific to the client - read from the configuration table input
-client_mode = 'LGT'
-mode = 'single'
-counter = 0
-filter_counter = 0
-
-time_tag = datetime.datetime.today().strftime('%H%M%S')
-year_tag = datetime.datetime.today().strftime('%Y%m%d')
-output_filename = 'python_processed_' + year_tag + time_tag + '.csv'
-
-path_name, file_name = os.path.split(args.out_csv)
-output_file_path = os.path.join(path_name, output_filename)
-
-# Create output file
-output_csv_file = codecs.open(output_file_path, 'w', 'utf-8')
-output_csv_rows = csv.writer(output_csv_file)
-out_row = [''] * number_of_columns
-get_output_header_row()
-output_csv_rows.writerow(out_row)
-
-if mode == 'single':
-    #  Open & parse a single XML file
-    xml_file = args.in_xml
-    xml = ElemTree.parse(xml_file).getroot()
-    xml_tag = re.match(r'({.*})UVMiFIRDocument$', xml.tag)
-
-    if xml_tag is None:
-        print('Unrecognised XML!')
-        output_bad_xml()
-        exit(0)
-
-    xml_namespace_tag = xml_tag[1]
-    tx_no = 0
-    xml_doc_outer = xml_find(xml, 'Document')  # outer document block
 
-    for xml_node in xml_doc_outer.iter():
-        mm = re.match(r'({urn:iso.*})Document', xml_node.tag)
-        if mm is not None:
-            xml_namespace_tag = mm[1]
-            break
+# converts a sequence of Tx blocks, returning the output rows, the number of transactions filtered out, an error
+# message if a block has neither a New nor a Cxl block & that block's number, or None (tx_no is the number of Tx
+# blocks before the first)
+def get_output_rows(xml_rpt_txs, xml_file, filter_trades, tx_no=0):
 
-    xml_doc_outer = xml_find(xml_doc_outer, 'Document')  # inner document block
-    xml_rpt = xml_find(xml_doc_outer, 'FinInstrmRptgTxRpt')
+    rows = []
+    rows_filter_counter = 0
+    out_row = [''] * number_of_columns  # one row buffer, filled for each Tx & copied into rows
 
-    for xml_rpt_tx in xml_findall(xml_rpt, 'Tx'):
+    for xml_rpt_tx in xml_rpt_txs:
 
         tx_no += 1
-        out_row = [''] * number_of_columns
         xml_rpt_tx_new = xml_find(xml_rpt_tx, 'New')
 
         if xml_rpt_tx_new is not None:
-            get_output_row_new(xml_rpt_tx_new, xml_file)
+            if filter_trades and filter_ext_trades(xml_rpt_tx_new):
+                rows_filter_counter += 1
+                continue
+            out_row[:] = empty_row
+            get_output_row_new(out_row, xml_rpt_tx_new, xml_file)
+
         else:
             xml_rpt_tx_cxl = xml_find(xml_rpt_tx, 'Cxl')
 
             if xml_rpt_tx_cxl is not None:
-                get_output_row_cxl(xml_rpt_tx_cxl)
+                get_output_row_cxl(out_row, xml_rpt_tx_cxl)
             else:
-                print('TX block number ' + str(tx_no) + ' has no NEW or CXL blocks!')
-                output_bad_xml()
-                exit(0)
+                return rows, rows_filter_counter, 'TX block number ' + str(tx_no) + ' has no NEW or CXL blocks', tx_no
 
-        output_csv_rows.writerow(out_row)
+        rows.append(tuple(out_row))
 
-# run multiple xml files from a folder
-elif mode == 'multi':
-    #  Open & parse input XML files
-    xml_files = [os.path.join(args.in_xml, f) for f in os.listdir(args.in_xml) if os.path.isfile(os.path.join(args.in_xml, f))]
+    return rows, rows_filter_counter, None, None
 
-    for xml_file in xml_files:
-        xml = ElemTree.parse(xml_file).getroot()
-        xml_tag = re.match(r'({.*})UVMiFIRDocument$', xml.tag)
 
-        if xml_tag is None:
-            print('Unrecognised XML')
-            output_bad_xml()
-            exit(0)
+# converts the Tx blocks of one XML file in multi mode, returning its output rows, the number of transactions
+# filtered out, an error message if the file can't be converted & the number of the Tx block at fault (None if it
+# isn't known, e.g. the XML doesn't parse) and the profile taken by profile_take (runs in a worker process if
+# -workers > 1)
+def get_output_rows_multi(xml_file):
 
-        xml_namespace_tag = xml_tag[1]
-        tx_no = 0
-        xml_doc_outer = xml_find(xml, 'Document')  # outer document block
+    uv_namespace_tag, iso_namespace_tag, error = xml_precheck(xml_file)
+    if error is not None:
+        return [], 0, error, None, profile_take()
 
-        for xml_node in xml_doc_outer.iter():
-            mm = re.match(r'({urn:iso.*})Document', xml_node.tag)
-            if mm is not None:
-                xml_namespace_tag = mm[1]
-                break
+    namespace_tags = (uv_namespace_tag, iso_namespace_tag)
 
-        xml_doc_outer = xml_find(xml_doc_outer, 'Document')  # inner document block
-        xml_rpt = xml_find(xml_doc_outer, 'FinInstrmRptgTxRpt')
+    try:
+        xml_rpt_txs = xml_iter_tx(xml_file, namespace_tags) if args.stream else xml_parse_tx(xml_file, namespace_tags)
+        return get_output_rows(xml_rpt_txs, xml_file, True) + (profile_take(),)
+    except XmlTree.ParseError:
+        return [], 0, 'Invalid XML', None, profile_take()
 
-        for xml_rpt_tx in xml_findall(xml_rpt, 'Tx'):
 
-            tx_no += 1
-            out_row = [''] * number_of_columns
-            xml_rpt_tx_new = xml_find(xml_rpt_tx, 'New')
+# converts the Tx blocks in one byte range of a single XML file, as found by xml_scan_tx_ranges, returning the
+# same as get_output_rows_multi (runs in a worker process)
+def get_output_rows_range(xml_file, xml_wrapper, namespace_tag, xml_range):
 
-            if xml_rpt_tx_new is not None:
-                if filter_ext_trades(xml_rpt_tx_new):
-                    filter_counter += 1
-                    continue
-                get_output_row_new(xml_rpt_tx_new, xml_file)
+    range_start, range_end, range_tx_no = xml_range
 
-            else:
-                xml_rpt_tx_cxl = xml_find(xml_rpt_tx, 'Cxl')
+    with open(xml_file, 'rb') as in_xml_file:
+        in_xml_file.seek(range_start)
+        xml_fragment = in_xml_file.read(range_end - range_start)
 
-                if xml_rpt_tx_cxl is not None:
-                    get_output_row_cxl(xml_rpt_tx_cxl)
-                else:
-                    print('TX block number ' + str(tx_no) + ' has no NEW or CXL blocks')
-                    output_bad_xml()
-                    exit(0)
+    # NOTE: a parse error's line & column are in the wrapped range, so output_bad_xml finds them in the file instead
+    try:
+        xml_rpt = XmlTree.fromstring(xml_wrapper[0] + xml_fragment + xml_wrapper[1])
+    except XmlTree.ParseError:
+        return [], 0, 'Invalid XML', None, profile_take()
 
-            output_csv_rows.writerow(out_row)
-            counter += 1
-    print('Client: ', client_mode)
-    print('Mode: ', mode)
-    print('Number of transactions: ', counter)
-    print('Number of transactions filtered out: ', filter_counter)
+    set_xml_namespace_tag(namespace_tag)
+
+    return get_output_rows(xml_findall(xml_rpt, 'Tx'), xml_file, False, range_tx_no) + (profile_take(),)
+
+
+# Run report (-report), the seconds spent parsing, mapping & writing in this process (parse None when the XML is
+# parsed as it is converted) & when the run started, set by convert
+run_times = {'parse': 0.0, 'map': 0.0, 'write': 0.0}
+run_start = (None, 0.0)  # (date & time, time.perf_counter())
+
+
+# yields the items of an iterable, adding the time taken to get each to run_times[run_time]
+def timed_iter(items, run_time):
+
+    items = iter(items)
+
+    while True:
+        start = time.perf_counter()
+        item = next(items, run_times)  # run_times, which isn't an item, marks the end
+        run_times[run_time] += time.perf_counter() - start
+
+        if item is run_times:
+            return
+        yield item
+
+
+# returns the peak memory of this process & its worker processes in MB, or None where it isn't known (Windows)
+def get_peak_memory():
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak_memory = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
 
-output_csv_file.close()
+    # ru_maxrss is in KB, but in bytes on macOS
+    return peak_memory / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
 
 
+# writes the run report of the conversion, as a line of JSON, to the console or appended to the file args.report,
+# with the error message if the input couldn't be converted
+def output_run_report(output_file, error=None):
 
+    if os.path.isdir(args.in_xml):
+        input_bytes = sum(os.path.getsize(os.path.join(args.in_xml, f)) for f in os.listdir(args.in_xml)
+                          if os.path.isfile(os.path.join(args.in_xml, f)))
+    else:
+        input_bytes = os.path.getsize(args.in_xml)
 
+    seconds = time.perf_counter() - run_start[1]
 
+    report = json.dumps({
+        'tool': 'unavista_mifid2_xml2csv', 'client': client_mode, 'started': run_start[0], 'input': args.in_xml,
+        'input_bytes': input_bytes, 'output': output_file, 'tx': counter + filter_counter,
+        'newt': counter - canc_counter, 'canc': canc_counter, 'filtered': filter_counter,
+        'parse_seconds': run_times['parse'], 'map_seconds': run_times['map'], 'write_seconds': run_times['write'],
+        'seconds': seconds, 'peak_memory_mb': get_peak_memory(), 'rows_per_sec': counter / seconds if seconds else None,
+        'error': error})
 
+    if args.report == '-':
+        print(report)
+    else:
+        with open(args.report, 'a', encoding='utf-8') as report_file:
+            report_file.write(report + '\n')
 
 
+# run code specific to the client - read from the configuration table input
+client_mode = 'LGT'
+counter = 0
+filter_counter = 0
+canc_counter = 0
+
+# converts in_xml, an XML file or a folder of them, into an output file in the folder of out_csv & returns the path of
+# the file written. options are the command line options by name (e.g. workers=4), the rest take their defaults.
+# counter & filter_counter are left holding the number of transactions converted & filtered out, canc_counter the
+# number of those converted that are cancellations.
+def convert(in_xml, out_csv, **options):
+
+    global counter
+    global filter_counter
+    global canc_counter
+    global run_start
+    global out_row
+    global output_csv_file
+    global output_parquet_writer
+    global pyarrow
+
+    # the options are put back into a command line, so they're checked just as the command line options are
+    argv = []
+    for name, value in dict(options, in_xml=in_xml, out_csv=out_csv).items():
+        if isinstance(value, bool):
+            argv.append(('-' if value else '-no-') + name)
+        elif value is not None:
+            argv.append('-' + name.replace('_', '-') + '=' + str(value))
 
+    run_start = (datetime.datetime.now().isoformat(timespec='seconds'), time.perf_counter())
+    run_times.update(parse=0.0, map=0.0, write=0.0)
 
+    set_options(parser.parse_args(argv))
+    profile_take()  # each conversion is profiled from scratch
 
+    # the output of a conversion that stopped part way is never carried into this one
+    if output_csv_file is not None:
+        output_csv_file.close()
+    output_csv_file = None
+    discard_parquet_output()
+
+    # NOTE: pyarrow takes a while to import, so it's only imported for Parquet output
+    if args.out_format == 'parquet':
+        try:
+            import pyarrow
+            import pyarrow.compute
+            import pyarrow.parquet
+        except ImportError:
+            parser.error('-out-format parquet needs the pyarrow package, pip install pyarrow')
+
+    mode = 'multi' if os.path.isdir(args.in_xml) else 'single'
+    counter = 0
+    filter_counter = 0
+    canc_counter = 0
+
+    time_tag = datetime.datetime.today().strftime('%H%M%S')
+    year_tag = datetime.datetime.today().strftime('%Y%m%d')
+    output_filename = 'python_processed_' + year_tag + time_tag + '.' + args.out_format
+
+    path_name, file_name = os.path.split(args.out_csv)
+    output_file_path = os.path.join(path_name, output_filename)
+
+    # Create output file, csv.writer writes its own \r\n line ends so none are translated
+    out_row = [''] * number_of_columns
+
+    try:
+        if args.out_format == 'parquet':
+            output_csv_file = None
+            output_parquet_writer = pyarrow.parquet.ParquetWriter(output_file_path, get_parquet_schema())
+            write_output_rows = write_parquet_rows
+        else:
+            output_csv_file = open(output_file_path, 'w', encoding='utf-8', newline='', buffering=output_buffer_size)
+            output_csv_rows = csv.writer(output_csv_file)
+            get_output_header_row()
+            output_csv_rows.writerow(out_row)
+            write_output_rows = output_csv_rows.writerows
 
+        write_rows = write_output_rows
 
+        # writes rows to the output file, counting the cancellations & timing the writing for the run report
+        def write_output_rows(rows):
 
+            global canc_counter
 
+            start = time.perf_counter()
+            write_rows(rows)
+            run_times['write'] += time.perf_counter() - start
+            canc_counter += sum(1 for row in rows if row[ind_report_status] == 'CANC')
 
+        if mode == 'single':
+            xml_file = args.in_xml
+            tx_no = 0
 
+            #  Check the raw bytes of the file before parsing any of it
+            start = time.perf_counter()
+            uv_namespace_tag, iso_namespace_tag, error = xml_precheck(xml_file)
+            run_times['parse'] += time.perf_counter() - start
+
+            if error is not None:
+                error = output_bad_xml(xml_file, error)
+                print(error + '!')
+                if args.report is not None:
+                    output_run_report(args.out_csv, error)
+                return args.out_csv
+
+            namespace_tags = (uv_namespace_tag, iso_namespace_tag)
+
+            if args.workers > 1:
+                #  Split a single XML file into byte ranges of Tx blocks, converted in parallel & written in order
+                xml_wrapper, namespace_tag, xml_ranges = xml_scan_tx_ranges(xml_file, args.workers * 4)
+                run_times['parse'] = None
+
+                with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=set_options,
+                                                          initargs=(args,)) as executor:
+                    range_results = executor.map(get_output_rows_range, [xml_file] * len(xml_ranges),
+                                                 [xml_wrapper] * len(xml_ranges), [namespace_tag] * len(xml_ranges),
+                                                 xml_ranges)
+
+                    for rows, rows_filter_counter, error, error_tx_no, profile in timed_iter(range_results, 'map'):
+
+                        profile_merge(profile)
+                        if error is not None:
+                            executor.shutdown(wait=False, cancel_futures=True)
+                            error = output_bad_xml(xml_file, error, error_tx_no)
+                            print(error + '!')
+                            if args.report is not None:
+                                output_run_report(args.out_csv, error)
+                            return args.out_csv
+
+                        write_output_rows(rows)
+                        counter += len(rows)
+
+            else:
+                start = time.perf_counter()
+                error = None
+
+                try:
+                    if args.stream:
+                        #  Stream a single XML file, one Tx block at a time
+                        xml_rpt_txs = xml_iter_tx(xml_file, namespace_tags)
+                    else:
+                        #  Open & parse a single XML file
+                        xml_rpt_txs = xml_parse_tx(xml_file, namespace_tags)
+
+                    run_times['parse'] += time.perf_counter() - start
+
+                    #  Convert the Tx blocks in batches of output_batch_rows, each batch written in one go
+                    xml_rpt_txs = timed_iter(xml_rpt_txs, 'parse')
+
+                    while True:
+                        start = time.perf_counter()
+                        parse_seconds = run_times['parse']
+                        rows, rows_filter_counter, error, error_tx_no = get_output_rows(
+                            itertools.islice(xml_rpt_txs, output_batch_rows), xml_file, False, tx_no)
+                        run_times['map'] += time.perf_counter() - start - (run_times['parse'] - parse_seconds)
+                        write_output_rows(rows)
+                        counter += len(rows)
+
+                        if error is not None or len(rows) < output_batch_rows:
+                            break
+                        tx_no += len(rows)
+
+                except XmlTree.ParseError:
+                    error, error_tx_no = 'Invalid XML', None
+
+                if error is not None:
+                    error = output_bad_xml(xml_file, error, error_tx_no)
+                    print(error + '!')
+                    if args.report is not None:
+                        output_run_report(args.out_csv, error)
+                    return args.out_csv
+
+        # run multiple xml files from a folder
+        elif mode == 'multi':
+            #  Open & parse input XML files, in a fixed order so the output is the same from run to run
+            xml_files = sorted(os.path.join(args.in_xml, f) for f in os.listdir(args.in_xml) if os.path.isfile(os.path.join(args.in_xml, f)))
+
+            # fan the files out to a pool of worker processes, results still come back in file order. The pool is
+            # always shut down, even when a file fails or the conversion is interrupted, so no worker is left running
+            if args.workers > 1:
+                executor = concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=set_options,
+                                                                  initargs=(args,))
+                file_results = executor.map(get_output_rows_multi, xml_files)
+            else:
+                executor = None
+                file_results = map(get_output_rows_multi, xml_files)
+
+            run_times['parse'] = None
+
+            try:
+                for xml_file, (rows, file_filter_counter, error, error_tx_no, profile) in \
+                        zip(xml_files, timed_iter(file_results, 'map')):
+
+                    profile_merge(profile)
+                    if error is not None:
+                        if executor is not None:
+                            executor.shutdown(wait=False, cancel_futures=True)
+                        error = output_bad_xml(xml_file, error, error_tx_no)
+                        print(xml_file + ': ' + error)
+                        if args.report is not None:
+                            output_run_report(args.out_csv, error)
+                        return args.out_csv
+
+                    write_output_rows(rows)
+                    counter += len(rows)
+                    filter_counter += file_filter_counter
+
+            finally:
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
+
+            if args.report is None:
+                print('Client: ', client_mode)
+                print('Mode: ', mode)
+                print('Number of transactions: ', counter)
+                print('Number of transactions filtered out: ', filter_counter)
+
+        start = time.perf_counter()
+        if output_csv_file is not None:
+            output_csv_file.close()
+        close_parquet_output()
+        run_times['write'] += time.perf_counter() - start
+
+    finally:
+        if output_csv_file is not None:
+            output_csv_file.close()
+        discard_parquet_output()
+
+    if args.profile is not None:
+        output_profile(counter)
+    if args.report is not None:
+        output_run_report(output_file_path)
+
+    return output_file_path
+
+
+if __name__ == '__main__':
+    convert(**vars(parser.parse_args()))